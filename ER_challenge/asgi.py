@@ -9,8 +9,10 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ER_challenge.settings')
 
+# django.core.asgi.get_asgi_application() with the list and detail requests
+# of the API answered in a pool of threads
+from api.asgi import get_asgi_application  # noqa: E402
+
 application = get_asgi_application()
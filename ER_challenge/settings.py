@@ -1,6 +1,6 @@
 import os
 
-from decouple import config
+from decouple import Csv, config
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -22,11 +22,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    'core',
-    'api',
+    'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.querycheck.QueryCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -34,6 +36,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replicas.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'ER_challenge.urls'
@@ -58,13 +61,151 @@ WSGI_APPLICATION = 'ER_challenge.wsgi.application'
 
 # Database
 
+# 'production' keeps the connections open across requests and tunes SQLite
+# for concurrent access, 'development' keeps the defaults
+DB_PROFILE = config('DB_PROFILE', default='development')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # django.db.backends.sqlite3 with the OPTIONS of Django 5.1
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': config('DB_NAME', default=os.path.join(BASE_DIR, 'db.sqlite3')),
+        # seconds a connection is reused for, 0 to open one per request
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600 if DB_PROFILE == 'production' else 0,
+                               cast=int),
+        'OPTIONS': {},
+    }
+}
+
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS = {
+        # ms to wait for a lock before "database is locked", set first as
+        # the next statements may wait for one
+        'busy_timeout': config('DB_BUSY_TIMEOUT', default=5000, cast=int),
+        # readers do not block the writer nor the writer the readers
+        'journal_mode': 'WAL',
+        # safe with WAL: only a power loss may roll back the last commits
+        'synchronous': 'NORMAL',
+        'mmap_size': config('DB_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    }
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join('PRAGMA %s = %s' % item for item in SQLITE_PRAGMAS.items()),
+        # take the write lock at BEGIN: a transaction that read first fails
+        # at once, without waiting, when it writes while another one does
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+# SQLite files of the read replicas, copies of the primary kept up to date
+# outside of Django: the API reads from them on safe methods (see
+# core.routers), as the replica1, replica2... aliases
+for index, name in enumerate(config('DB_REPLICAS', default='', cast=Csv()), 1):
+    DATABASES['replica%d' % index] = dict(DATABASES['default'], NAME=name, TEST={'MIRROR': 'default'})
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# seconds the replicas may lag behind the primary: a client reads from the
+# primary that long after its writes, and responses read from a replica are
+# cached that long at most
+DB_REPLICA_LAG = config('DB_REPLICA_LAG', default=5, cast=int)
+
+# Django REST framework
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=100, cast=int),
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# 'orjson' to encode and decode JSON with it when it is installed, 'json'
+# for the standard library
+API_JSON_BACKEND = config('API_JSON_BACKEND', default='orjson')
+
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=1000, cast=int)
+
+API_EXPORT_CHUNK_SIZE = config('API_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+API_BULK_BATCH_SIZE = config('API_BULK_BATCH_SIZE', default=500, cast=int)
+
+API_CHANGES_BATCH_SIZE = config('API_CHANGES_BATCH_SIZE', default=500, cast=int)
+
+# products repriced per transaction, see core.pricing
+API_REPRICE_CHUNK_SIZE = config('API_REPRICE_CHUNK_SIZE', default=10000, cast=int)
+
+API_SEARCH_LIMIT = config('API_SEARCH_LIMIT', default=20, cast=int)
+
+# serialize the list pages from values() rows, see core.fastpath
+API_FAST_LIST = config('API_FAST_LIST', default=True, cast=bool)
+
+# threads answering the list and detail requests under ASGI, see api.asgi
+API_READ_THREADS = config('API_READ_THREADS', default=16, cast=int)
+
+# serve the analytics from the rollups, refreshed by a job the order writes
+# queue or by the refresh_sales_rollups command, see api.analytics
+API_ANALYTICS_ROLLUPS = config('API_ANALYTICS_ROLLUPS', default=False, cast=bool)
+
+API_ANALYTICS_LIMIT = config('API_ANALYTICS_LIMIT', default=10, cast=int)
+
+# Server-Timing headers and the metrics/ endpoint, see api.metrics
+API_METRICS_ENABLED = config('API_METRICS_ENABLED', default=True, cast=bool)
+
+# log the N+1 patterns and slow queries of each request, see api.querycheck
+API_QUERY_CHECK = config('API_QUERY_CHECK', default=False, cast=bool)
+
+# times a query shape may run in a request before it is an N+1 pattern
+API_QUERY_REPEAT_LIMIT = config('API_QUERY_REPEAT_LIMIT', default=10, cast=int)
+
+API_SLOW_QUERY_MS = config('API_SLOW_QUERY_MS', default=100, cast=float)
+
+# worker processes of the run_jobs command, see core.jobs
+API_JOB_WORKERS = config('API_JOB_WORKERS', default=2, cast=int)
+
+# seconds a worker waits before looking for jobs again when none is due
+API_JOB_POLL_INTERVAL = config('API_JOB_POLL_INTERVAL', default=1, cast=float)
+
+API_JOB_MAX_ATTEMPTS = config('API_JOB_MAX_ATTEMPTS', default=3, cast=int)
+
+# seconds before the second attempt of a failed job, doubled for each next one
+API_JOB_RETRY_DELAY = config('API_JOB_RETRY_DELAY', default=10, cast=int)
+
+# seconds between the saves of the progress of a running job
+API_JOB_HEARTBEAT = config('API_JOB_HEARTBEAT', default=5, cast=float)
+
+# seconds without heartbeat after which a running job is run again
+API_JOB_TIMEOUT = config('API_JOB_TIMEOUT', default=60, cast=int)
+
+# directory of the files written by the export jobs
+API_JOB_RESULTS_DIR = config('API_JOB_RESULTS_DIR', default=os.path.join(BASE_DIR, 'job_results'))
+
+# Cache
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='er-challenge'),
     }
 }
 
+API_CACHE_ALIAS = config('API_CACHE_ALIAS', default='default')
+
+# the responses are invalidated in the process that writes, so they are only
+# cached by default in a cache all the processes share
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache')
+API_CACHE_ENABLED = config('API_CACHE_ENABLED', cast=bool,
+                           default=CACHES.get(API_CACHE_ALIAS, {}).get('BACKEND') not in LOCAL_CACHE_BACKENDS)
+
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=300, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
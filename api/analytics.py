@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.http import Http404
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.analytics import REPORTS, refresh_rollups, sales_report
+from core.jobs import enqueue_once, task
+
+REFRESH_TASK = 'refresh_sales_rollups'
+
+
+@task(REFRESH_TASK)
+def refresh_sales_rollups(job):
+    return {'changes': refresh_rollups()}
+
+
+def schedule_rollups_refresh():
+    """
+    Queue a refresh of the sales rollups, once for all the order writes
+    until a worker runs it, when the reports read them.
+    """
+    if settings.API_ANALYTICS_ROLLUPS:
+        enqueue_once(REFRESH_TASK)
+
+
+class SalesReportView(APIView):
+    """
+    Sales aggregates over the days from ``start`` to ``end`` included:
+    ``/analytics/<report>/[?start=<date>][&end=<date>][&limit=n]``, where
+    report is ``daily`` or ``monthly`` (orders and revenue per day or
+    month), ``clients``, ``families`` or ``products`` (best revenue first,
+    the first ``limit`` clients and products only). Read from the rollups
+    when ``API_ANALYTICS_ROLLUPS`` is set: the order writes queue their
+    refresh, so a report is as fresh as the last job run, and the reads
+    never write.
+    """
+    limited = ('clients', 'products')
+
+    def get_date_param(self, request, name):
+        value = request.query_params.get(name)
+        if value is None:
+            return None
+        try:
+            date = parse_date(value)
+        except ValueError:
+            date = None
+        if date is None:
+            raise ValidationError({name: ['Date has wrong format. Use YYYY-MM-DD.']})
+        return date
+
+    def get(self, request, report):
+        if report not in REPORTS:
+            raise Http404
+        start = self.get_date_param(request, 'start')
+        end = self.get_date_param(request, 'end')
+        limit = None
+        if report in self.limited:
+            try:
+                limit = int(request.query_params.get('limit', settings.API_ANALYTICS_LIMIT))
+            except ValueError:
+                raise ValidationError({'limit': ['A valid integer is required.']})
+            limit = max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+        rollups = settings.API_ANALYTICS_ROLLUPS
+        return Response({'results': sales_report(report, start, end, limit, rollups)})
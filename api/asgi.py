@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import Resolver404, get_resolver
+
+# viewset actions answered in the read pool
+READ_ACTIONS = ('list', 'retrieve')
+
+
+class ReadPoolASGIHandler(ASGIHandler):
+    """
+    ``ASGIHandler`` running the list and detail requests of the viewsets
+    in a pool of ``API_READ_THREADS`` threads.
+
+    Django 3.0 has no async views nor async ORM: its handler runs every
+    view in the one thread shared by all synchronous code, so concurrent
+    requests wait for each other. Reads are independent and can run side
+    by side; the request body is still received and the response sent
+    asynchronously, so a slow client holds no thread.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.read_executor = ThreadPoolExecutor(
+            max_workers=settings.API_READ_THREADS, thread_name_prefix='api-read'
+        )
+
+    def is_read(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        try:
+            match = get_resolver().resolve(request.path_info)
+        except Resolver404:
+            return False
+        actions = getattr(match.func, 'actions', None) or {}
+        return actions.get('get') in READ_ACTIONS
+
+    async def get_response(self, request):
+        if not self.is_read(request):
+            return await sync_to_async(super().get_response)(request)
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.read_executor, functools.partial(context.run, self.get_read_response, request)
+        )
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # as ASGIHandler.send_response(), but the parts of a streaming
+        # response, e.g. an export read from the database as it is sent, are
+        # pulled in the thread of the synchronous code that opened its cursor
+        headers = [
+            (header.encode('ascii') if isinstance(header, str) else header,
+             value.encode('latin1') if isinstance(value, str) else value)
+            for header, value in response.items()
+        ]
+        headers.extend((b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+                       for cookie in response.cookies.values())
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        parts = iter(response)
+        pull = sync_to_async(next)
+        while True:
+            part = await pull(parts, None)
+            if part is None:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        # sends request_finished, closing the connections of that thread
+        await sync_to_async(response.close)()
+
+    def get_read_response(self, request):
+        # the request signals only manage the connections of the shared thread
+        close_old_connections()
+        try:
+            return super().get_response(request)
+        finally:
+            close_old_connections()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ReadPoolASGIHandler()
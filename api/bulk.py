@@ -0,0 +1,46 @@
+from django.conf import settings
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .cache import invalidate_all
+
+INVALID = 'invalid'
+
+
+class BulkUpsertMixin:
+    """
+    Add a ``bulk/`` list route accepting a list of objects: new codes are
+    created, existing ones updated, and the status of every item is
+    reported in the order it was sent.
+    """
+    bulk_serializer_class = None
+    bulk_upsert = None
+
+    def get_bulk_batch_size(self):
+        return settings.API_BULK_BATCH_SIZE
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = self.bulk_serializer_class(
+            data=request.data, many=True, context=self.get_serializer_context()
+        )
+        # only a payload that is not a list fails as a whole
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data
+        statuses = iter(self.bulk_upsert(
+            [item for item in items if item is not None], self.get_bulk_batch_size()
+        ))
+        # bulk writes send no model signals
+        invalidate_all(self.basename)
+
+        results = []
+        counts = {}
+        for index, (data, item, errors) in enumerate(zip(request.data, items, serializer.item_errors)):
+            if item is None:
+                code = data.get('code') if isinstance(data, dict) else None
+                result = {'index': index, 'code': code, 'status': INVALID, 'errors': errors}
+            else:
+                result = {'index': index, 'code': item['code'], 'status': next(statuses)}
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            results.append(result)
+        return Response({'counts': counts, 'results': results})
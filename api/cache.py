@@ -0,0 +1,195 @@
+import hashlib
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import parse_http_date
+
+from core.routers import get_read_replica
+
+from .metrics import measure
+
+# headers stored with the rendered content, and set again on a hit
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Vary', 'Allow')
+
+HITS_KEY = 'api:stats:hits'
+MISSES_KEY = 'api:stats:misses'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def generation_key(basename):
+    return 'api:version:%s' % basename
+
+
+def list_version_key(basename):
+    return 'api:version:%s:list' % basename
+
+
+def object_version_key(basename, pk):
+    return 'api:version:%s:%s' % (basename, pk)
+
+
+def _bump(keys):
+    # versions are random tokens rather than counters, so a version evicted
+    # from the cache can never come back to a value used by stale entries
+    get_cache().set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def bump_versions(keys):
+    """
+    Invalidate the responses that depend on ``keys``, now and again once
+    the current transaction commits, so a response cached from data read
+    before the commit does not outlive it.
+    """
+    keys = list(keys)
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_objects(basename, pks):
+    """
+    Invalidate the listings of ``basename`` and the details of ``pks``.
+    """
+    bump_versions([list_version_key(basename)] + [object_version_key(basename, pk) for pk in pks])
+
+
+def invalidate_all(basename):
+    """
+    Invalidate every cached response of ``basename``, e.g. after a bulk
+    write that sent no model signals.
+    """
+    bump_versions([generation_key(basename)])
+
+
+def _increment(key):
+    cache = get_cache()
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_stats():
+    stats = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': stats.get(HITS_KEY, 0), 'misses': stats.get(MISSES_KEY, 0)}
+
+
+def _get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+class CacheResponseMixin:
+    """
+    Cache the rendered ``list`` and ``retrieve`` responses of a viewset.
+
+    Entries are keyed on the URL, its query params and the renderer, and
+    on version tokens that core model signals replace when the underlying
+    rows change (see ``api.signals``). Entries keep the ``ETag`` and
+    ``Last-Modified`` of the response, so conditional requests get a ``304``
+    on a hit, and its ``Vary`` and ``Allow``, so shared caches keep telling
+    the renderings of a URL apart.
+    """
+    cache_timeout = None
+
+    def get_cache_timeout(self):
+        timeout = self.cache_timeout or settings.API_CACHE_TIMEOUT
+        if get_read_replica() is not None:
+            # a stale replica read must not outlive the replica lag
+            timeout = min(timeout, settings.DB_REPLICA_LAG)
+        return timeout
+
+    def get_cache_dependencies(self):
+        """
+        Return the basenames of the other models the response shows, e.g.
+        the expanded relations: any change to them invalidates it.
+        """
+        return []
+
+    def get_cache_key(self, request, lookup=None):
+        if lookup is None:
+            version_keys = [generation_key(self.basename), list_version_key(self.basename)]
+        else:
+            version_keys = [generation_key(self.basename), object_version_key(self.basename, lookup)]
+        for basename in self.get_cache_dependencies():
+            version_keys += [generation_key(basename), list_version_key(basename)]
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        fingerprint = hashlib.md5('|'.join([
+            request.path, query, request.accepted_media_type,
+        ] + _get_versions(version_keys)).encode()).hexdigest()
+        return 'api:response:%s:%s' % (self.basename, fingerprint)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, None, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached(request, lookup, super().retrieve, *args, **kwargs)
+
+    def cached(self, request, lookup, view, *args, **kwargs):
+        if not settings.API_CACHE_ENABLED:
+            return view(request, *args, **kwargs)
+        key = self.get_cache_key(request, lookup)
+        entry = get_cache().get(key)
+        if entry is None:
+            _increment(MISSES_KEY)
+            response = view(request, *args, **kwargs)
+            # stored by finalize_response() once it is rendered
+            response.cache_key = key
+            return response
+
+        _increment(HITS_KEY)
+        content_type, headers, content = entry
+        last_modified = headers.get('Last-Modified')
+        response = get_conditional_response(
+            request._request,
+            etag=headers['ETag'],
+            last_modified=last_modified and parse_http_date(last_modified),
+        )
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        for header, value in headers.items():
+            if header == 'Vary':
+                # merged with the ones set since, as finalize_response() does
+                patch_vary_headers(response, [name.strip() for name in value.split(',')])
+            else:
+                response[header] = value
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(response, 'cache_key', None)
+        if key is None or response.status_code != 200:
+            return response
+
+        with measure(request, 'render'):
+            response.render()
+        if not response.has_header('ETag'):
+            response['ETag'] = quote_etag(hashlib.md5(response.content).hexdigest())
+        headers = {
+            header: response[header]
+            for header in CACHED_HEADERS if response.has_header(header)
+        }
+        get_cache().set(
+            key, (response['Content-Type'], headers, response.content), self.get_cache_timeout()
+        )
+        last_modified = headers.get('Last-Modified')
+        return get_conditional_response(
+            request._request,
+            etag=headers['ETag'],
+            last_modified=last_modified and parse_http_date(last_modified),
+            response=response,
+        )
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.http import Http404
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.models import Product, Client, Order, Change
+from core.serializers import ProductSerializer, ClientSerializer, OrderSerializer
+
+
+class ChangeFeedView(APIView):
+    """
+    Return the rows of a model changed since the ``since`` cursor, at most
+    ``limit`` entries at a time, so a sync costs work proportional to the
+    delta. Deleted rows come back as tombstones without ``data``; resume
+    from the returned ``cursor`` while ``has_more`` is true.
+    """
+    feeds = {
+        'product': (Product.objects.all(), ProductSerializer),
+        'client': (Client.objects.all(), ClientSerializer),
+        'order': (Order.objects.prefetch_related('products', 'lines'), OrderSerializer),
+    }
+
+    def get_int_param(self, request, name, default):
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: ['A valid integer is required.']})
+        if value < 0:
+            raise ValidationError({name: ['Ensure this value is greater than or equal to 0.']})
+        return value
+
+    def get(self, request, model):
+        if model not in self.feeds:
+            raise Http404
+        queryset, serializer_class = self.feeds[model]
+        since = self.get_int_param(request, 'since', 0)
+        limit = min(
+            self.get_int_param(request, 'limit', settings.API_CHANGES_BATCH_SIZE) or 1,
+            settings.API_MAX_PAGE_SIZE,
+        )
+
+        entries = list(
+            Change.objects.filter(model=model, pk__gt=since).order_by('pk')
+            .values_list('pk', 'object_pk', 'action')[:limit + 1]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # keep the last entry of each row, in sequence order
+        latest = {}
+        for seq, object_pk, action in entries:
+            latest.pop(object_pk, None)
+            latest[object_pk] = (seq, action)
+        upserted = [pk for pk, (_, action) in latest.items() if action == Change.UPSERT]
+        objects = {obj.pk: obj for obj in queryset.filter(pk__in=upserted)}
+        data = dict(zip(objects, serializer_class(
+            list(objects.values()), many=True, context={'request': request}
+        ).data))
+
+        results = []
+        for object_pk, (seq, action) in latest.items():
+            if object_pk not in data:
+                # deleted since, its tombstone comes in a later batch
+                action = Change.DELETE
+            results.append({'seq': seq, 'action': action, 'id': object_pk,
+                            'data': data.get(object_pk)})
+        return Response({
+            'results': results,
+            'cursor': entries[-1][0] if entries else since,
+            'has_more': has_more,
+        })
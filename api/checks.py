@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get(settings.API_CACHE_ALIAS, {}).get('BACKEND')
+    if settings.API_CACHE_ENABLED and backend in settings.LOCAL_CACHE_BACKENDS:
+        return [Warning(
+            'API_CACHE_ENABLED is set with a cache local to each process.',
+            hint='The other processes keep serving the responses a write invalidated, for up to '
+                 'API_CACHE_TIMEOUT seconds: set CACHE_BACKEND to a shared cache.',
+            id='api.W001',
+        )]
+    return []
@@ -0,0 +1,103 @@
+import csv
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.relations import RelatedField
+from rest_framework.utils.encoders import JSONEncoder
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo:
+    """
+    File-like object whose ``write`` returns the value, so ``csv.writer``
+    can be used to format rows one at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ndjson_stream(fields, chunks):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for chunk in chunks:
+        yield ''.join(encoder.encode(dict(zip(fields, row))) + '\n' for row in chunk)
+
+
+def csv_stream(fields, chunks):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for chunk in chunks:
+        # nested values, like the lines of an order, are written as JSON
+        yield ''.join(
+            writer.writerow([encoder.encode(v) if isinstance(v, (list, dict)) else v for v in row])
+            for row in chunk
+        )
+
+
+class ExportMixin:
+    """
+    Add ``export/ndjson/`` and ``export/csv/`` list routes streaming the
+    filtered queryset without loading it in memory: rows are read with
+    ``QuerySet.iterator()`` and written ``export_chunk_size`` at a time.
+    """
+    export_chunk_size = None
+
+    def get_export_chunk_size(self):
+        return self.export_chunk_size or settings.API_EXPORT_CHUNK_SIZE
+
+    def get_export_fields(self):
+        """
+        Return ``(name, source, converter)`` for each exported column, based
+        on the fields of the serializer so rows look like the API ones.
+        """
+        columns = []
+        for name, field in self.get_serializer().fields.items():
+            if isinstance(field, RelatedField):
+                columns.append((name, field.source + '_id', None))
+            else:
+                columns.append((name, field.source, field.to_representation))
+        return columns
+
+    def get_export_chunks(self, queryset, columns, chunk_size):
+        sources = [source for _, source, _ in columns]
+        converters = [converter for _, _, converter in columns]
+        rows = queryset.values_list(*sources).iterator(chunk_size=chunk_size)
+        for chunk in iter_chunks(rows, chunk_size):
+            yield [
+                [value if converter is None or value is None else converter(value)
+                 for converter, value in zip(converters, row)]
+                for row in chunk
+            ]
+
+    @action(detail=False, url_path=r'export/(?P<export_format>ndjson|csv)')
+    def export(self, request, export_format):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        columns = self.get_export_fields()
+        fields = [name for name, _, _ in columns]
+        chunks = self.get_export_chunks(queryset, columns, self.get_export_chunk_size())
+        stream = ndjson_stream if export_format == 'ndjson' else csv_stream
+        response = StreamingHttpResponse(
+            stream(fields, chunks), content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+            self.basename, export_format
+        )
+        return response
@@ -0,0 +1,43 @@
+from django.conf import settings
+from rest_framework.response import Response
+
+from api.metrics import measure
+from core.fastpath import compile_serializer
+
+
+class FastListMixin:
+    """
+    Serialize the ``list`` pages from ``values()`` rows with the compiled
+    serializer of ``core.fastpath``, which renders the same bytes without
+    building model instances. Views fall back to the serializer when it
+    cannot be compiled, e.g. with expanded relations.
+    """
+    fast_list = True
+
+    def get_fast_serializer(self):
+        if not (self.fast_list and settings.API_FAST_LIST):
+            return None
+        return compile_serializer(self.get_serializer())
+
+    def get_keyset_columns(self, queryset):
+        # the cursor pagination reads its position from the ordering fields
+        get_ordering = getattr(self.paginator, 'get_ordering', None)
+        if get_ordering is None:
+            return []
+        return [name.lstrip('-') for name in get_ordering(self.request, queryset, self)]
+
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = fast.values(queryset, *self.get_keyset_columns(queryset))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            with measure(request, 'serialize'):
+                data = fast.serialize(page)
+            return self.get_paginated_response(data)
+        with measure(request, 'serialize'):
+            data = fast.serialize(rows)
+        return Response(data)
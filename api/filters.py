@@ -0,0 +1,27 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class LookupFilterBackend(BaseFilterBackend):
+    """
+    Filter the queryset with the ORM lookups listed in ``view.filter_lookups``
+    and passed as query params, e.g. ``?price__gte=1000``.
+    """
+
+    def get_filters(self, request, view):
+        lookups = getattr(view, 'filter_lookups', ())
+        return {
+            lookup: request.query_params[lookup]
+            for lookup in lookups
+            if lookup in request.query_params
+        }
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.get_filters(request, view)
+        if not filters:
+            return queryset
+        try:
+            return queryset.filter(**filters)
+        except (ValueError, TypeError, DjangoValidationError) as exc:
+            raise ValidationError({'filters': [str(exc)]})
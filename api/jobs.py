@@ -0,0 +1,66 @@
+import os
+
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from api.exports import EXPORT_CONTENT_TYPES
+from core.jobs import enqueue
+from core.models import Job
+from core.serializers import JobSerializer
+
+
+def export_path(job, export_format):
+    return os.path.join(settings.API_JOB_RESULTS_DIR, 'job-%d.%s' % (job.pk, export_format))
+
+
+class JobSubmitMixin:
+    """
+    Add ``jobs/bulk/`` and ``jobs/export/ndjson|csv/`` list routes running
+    the ``bulk/`` and ``export/`` ones in the background, see ``api.tasks``:
+    they answer 202 with the job, whose progress and result are read from
+    ``/jobs/<id>/``.
+    """
+
+    def accepted(self, job):
+        data = JobSerializer(job, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['url']})
+
+    @action(detail=False, methods=['post'], url_path='jobs/bulk')
+    def bulk_job(self, request):
+        # the items are validated by the job, only a payload that is not a list fails now
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': [
+                'Expected a list of items but got type "%s".' % type(request.data).__name__
+            ]})
+        return self.accepted(enqueue('bulk', {'model': self.basename, 'items': request.data}))
+
+    @action(detail=False, methods=['post'], url_path=r'jobs/export/(?P<export_format>ndjson|csv)')
+    def export_job(self, request, export_format):
+        # raises on invalid filters
+        self.filter_queryset(self.get_queryset())
+        return self.accepted(enqueue('export', {
+            'model': self.basename, 'format': export_format, 'query': dict(request.query_params.lists()),
+        }))
+
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+    @action(detail=True)
+    def result(self, request, pk):
+        job = self.get_object()
+        result = job.get_result()
+        if job.task != 'export' or job.status != Job.SUCCEEDED:
+            raise NotFound('The job has no file to download.')
+        path = export_path(job, result['format'])
+        if not os.path.exists(path):
+            raise NotFound('The file of the job was deleted.')
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=result['filename'],
+            content_type=EXPORT_CONTENT_TYPES[result['format']],
+        )
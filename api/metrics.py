@@ -0,0 +1,279 @@
+"""
+Request metrics: the queries, the time spent in the database, in
+serializing the data, in rendering the response and in total, and the
+response size of each request, sent back in a ``Server-Timing`` header and added up in
+histograms per route, served in the Prometheus text format by
+``metrics_view``.
+
+The histograms are kept in the memory of the process: with several
+worker processes, each one is scraped separately.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_labels(names, values, **extra):
+    pairs = [*zip(names, values), *extra.items()]
+    return '{%s}' % ','.join('%s="%s"' % (name, escape(value)) for name, value in pairs)
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        yield '# HELP %s %s' % (self.name, self.documentation)
+        yield '# TYPE %s counter' % self.name
+        for labels, value in sorted(self.series.items()):
+            yield '%s%s %s' % (self.name, format_labels(self.labels, labels), format_value(value))
+
+
+class Histogram(Counter):
+    """
+    Histogram with the given upper bounds of ``buckets``: the series hold
+    the count of each bucket, the ``+Inf`` one last, then the sum.
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield '# HELP %s %s' % (self.name, self.documentation)
+        yield '# TYPE %s histogram' % self.name
+        for labels, series in sorted(self.series.items()):
+            count = 0
+            for bound, bucket in zip([*self.buckets, '+Inf'], series):
+                count += bucket
+                yield '%s_bucket%s %d' % (self.name, format_labels(self.labels, labels, le=bound), count)
+            yield '%s_sum%s %s' % (self.name, format_labels(self.labels, labels), format_value(series[-1]))
+            yield '%s_count%s %d' % (self.name, format_labels(self.labels, labels), count)
+
+
+class Registry:
+    """
+    The metrics of all the requests served by the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        labels = ('route', 'method')
+        with self.lock:
+            self.requests = Counter('api_requests_total', 'Requests answered.', (*labels, 'status'))
+            self.histograms = {
+                'total': Histogram('api_request_duration_seconds', 'Time to answer a request.',
+                                   labels, DURATION_BUCKETS),
+                'db': Histogram('api_request_db_duration_seconds', 'Time spent in the database queries.',
+                                labels, DURATION_BUCKETS),
+                'serialize': Histogram('api_request_serialize_duration_seconds',
+                                       'Time spent in serializing the data.', labels, DURATION_BUCKETS),
+                'render': Histogram('api_request_render_duration_seconds',
+                                    'Time spent in rendering the response.', labels, DURATION_BUCKETS),
+                'queries': Histogram('api_request_queries', 'Database queries run.', labels, QUERY_BUCKETS),
+                'size': Histogram('api_response_size_bytes', 'Size of the response body.', labels, SIZE_BUCKETS),
+            }
+
+    def observe(self, metrics):
+        labels = (metrics.route, metrics.method)
+        with self.lock:
+            self.requests.inc((*labels, metrics.status))
+            for name, histogram in self.histograms.items():
+                histogram.observe(labels, getattr(metrics, name))
+
+    def render(self):
+        with self.lock:
+            lines = [*self.requests.render()]
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """
+    Metrics of a request, and the ``execute_wrapper()`` counting its
+    queries. The durations are in seconds.
+    """
+
+    def __init__(self, method):
+        self.method = method
+        self.route = 'unmatched'
+        self.status = None
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.total = 0.0
+        self.size = 0
+        self.started = time.perf_counter()
+        self.rendering = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - start
+
+    def wrap_queries(self):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    @contextmanager
+    def measure(self, name):
+        """
+        Add the time spent in the block to the ``name`` duration.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, name, getattr(self, name) + time.perf_counter() - start)
+
+    def start_rendering(self, response):
+        self.rendering = time.perf_counter()
+        response.add_post_render_callback(self.end_rendering)
+
+    def end_rendering(self, response):
+        self.render += time.perf_counter() - self.rendering
+
+    def server_timing(self):
+        return 'db;dur=%.3f;desc="%d queries", serialize;dur=%.3f, render;dur=%.3f, total;dur=%.3f' % (
+            self.db * 1000, self.queries, self.serialize * 1000, self.render * 1000, self.total * 1000,
+        )
+
+
+def measure(request, name):
+    """
+    Add the time spent in the block to the ``name`` duration of the
+    metrics of ``request``, if measured.
+    """
+    metrics = getattr(request, 'metrics', None)
+    return nullcontext() if metrics is None else metrics.measure(name)
+
+
+class SerializeTimingMixin:
+    """
+    Measure ``serializer.data`` in the ``list`` and ``retrieve`` views, see
+    ``measure()``.
+    """
+
+    def list(self, request, *args, **kwargs):
+        # as ListModelMixin.list()
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            with measure(request, 'serialize'):
+                data = serializer.data
+            return self.get_paginated_response(data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        with measure(request, 'serialize'):
+            data = serializer.data
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        # as RetrieveModelMixin.retrieve()
+        serializer = self.get_serializer(self.get_object())
+        with measure(request, 'serialize'):
+            data = serializer.data
+        return Response(data)
+
+
+class MetricsMiddleware:
+    """
+    Measure each request, see ``RequestMetrics``, when ``API_METRICS_ENABLED``
+    is set. Streaming responses are added to the histograms once sent, so
+    their ``Server-Timing`` header only covers the time to the first byte.
+
+    Registered first in ``MIDDLEWARE``, so the time of the other ones counts.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.API_METRICS_ENABLED:
+            return self.get_response(request)
+
+        metrics = request.metrics = RequestMetrics(request.method)
+        with metrics.wrap_queries():
+            response = self.get_response(request)
+
+        if request.resolver_match is not None:
+            metrics.route = request.resolver_match.view_name
+        metrics.status = response.status_code
+        metrics.total = time.perf_counter() - metrics.started
+        response['Server-Timing'] = metrics.server_timing()
+        if response.streaming:
+            response.streaming_content = self.sent(metrics, response.streaming_content)
+        else:
+            metrics.size = len(response.content)
+            registry.observe(metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # called just before rendering, on the responses of the DRF views
+        # not rendered by the view already, see CacheResponseMixin
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None and not response.is_rendered:
+            metrics.start_rendering(response)
+        return response
+
+    def sent(self, metrics, content):
+        # the content is usually read from the database as it is sent
+        try:
+            with metrics.wrap_queries():
+                for chunk in content:
+                    metrics.size += len(chunk)
+                    yield chunk
+        finally:
+            metrics.total = time.perf_counter() - metrics.started
+            registry.observe(metrics)
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,111 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on all the ordering fields: the cursor holds the
+    values of each one for the last row, and a page is fetched with a
+    tuple comparison, e.g. ``WHERE date < d OR (date = d AND id < i)``, so
+    deep pages cost the same as the first one even over many equal dates.
+
+    The ordering is ``ordering`` below, or the ``ordering`` of the view
+    when it uses ``OrderingFilter``, completed by the PK so every position
+    is unique and the cursors never need DRF's offset.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id',)
+        return ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(str(value))
+        return json.dumps(values)
+
+    def filter_after(self, queryset, position, reverse):
+        """
+        Keep the rows after ``position`` in the order of the page.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = '__lt' if reverse != field.startswith('-') else '__gt'
+            condition |= Q(**equal, **{name + lookup: value})
+            equal[name] = value
+        try:
+            return queryset.filter(condition)
+        except (ValueError, TypeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_position(self, request):
+        """
+        Return the offset, direction and position of the cursor of
+        ``request``, the first page having no position.
+        """
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            return 0, False, None
+        return self.cursor
+
+    def set_page_links(self, reverse, offset, current_position, following_position):
+        # the rows are fetched backwards for the previous pages
+        has_current = current_position is not None or offset > 0
+        if reverse:
+            self.has_next, self.has_previous = has_current, following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next, self.has_previous = following_position is not None, has_current
+            self.next_position, self.previous_position = following_position, current_position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # as CursorPagination.paginate_queryset(), filtering on every
+        # ordering field; the positions are unique, so there is no offset
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        offset, reverse, current_position = self.get_cursor_position(request)
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = self.filter_after(queryset, current_position, reverse)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        if reverse:
+            self.page = list(reversed(self.page))
+        self.set_page_links(reverse, offset, current_position, following_position)
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
@@ -0,0 +1,29 @@
+import codecs
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson, use_orjson
+
+
+class FastJSONParser(JSONParser):
+    """
+    ``JSONParser`` decoding UTF-8 bodies with orjson, when enabled (see
+    ``api.renderers.use_orjson()``). The bodies it rejects are parsed
+    again by the stdlib, which raises the same errors as ``JSONParser``
+    or accepts what orjson does not (e.g. lone surrogate escapes).
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not use_orjson() or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(BytesIO(body), media_type, parser_context)
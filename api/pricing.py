@@ -0,0 +1,30 @@
+from django.conf import settings
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.pricing import reprice
+from core.serializers import RepriceSerializer
+
+
+class RepriceMixin:
+    """
+    Add a ``reprice/`` list route changing the price of the products the
+    filters select by a ``percent`` or an ``amount``, see ``core.pricing``,
+    and reporting the throughput.
+    """
+
+    @action(detail=False, methods=['post'])
+    def reprice(self, request):
+        serializer = RepriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = reprice(
+                self.filter_queryset(self.get_queryset()), chunk_size=settings.API_REPRICE_CHUNK_SIZE,
+                **serializer.validated_data
+            )
+        except ValueError as exc:
+            raise ValidationError({'non_field_errors': [str(exc)]})
+        result['products_per_second'] = round(result['products'] / result['seconds']) if result['seconds'] else None
+        result['seconds'] = round(result['seconds'], 3)
+        return Response(result)
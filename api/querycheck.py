@@ -0,0 +1,80 @@
+import logging
+import threading
+
+from django.conf import settings
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from core.querycheck import QueryRecorder, fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class QueryReport:
+    """
+    The N+1 patterns and slow queries found in the requests served by the
+    process, per route and query shape.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, recorder):
+        with self.lock:
+            shapes = self.routes.setdefault(route, {})
+            for shape in recorder.repeated():
+                entry = shapes.setdefault(('n+1', shape.fingerprint), {
+                    'kind': 'n+1', 'sql': shape.sql, 'origin': shape.origin, 'requests': 0, 'max_count': 0,
+                })
+                entry['requests'] += 1
+                entry['max_count'] = max(entry['max_count'], shape.count)
+            for duration, sql, origin in recorder.slow_queries:
+                entry = shapes.setdefault(('slow', fingerprint(sql)), {
+                    'kind': 'slow', 'sql': sql, 'origin': origin, 'requests': 0, 'max_ms': 0,
+                })
+                entry['requests'] += 1
+                entry['max_ms'] = max(entry['max_ms'], round(duration * 1000, 3))
+
+    def get(self):
+        with self.lock:
+            return {route: list(shapes.values()) for route, shapes in self.routes.items() if shapes}
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+
+
+report = QueryReport()
+
+
+class QueryCheckMiddleware:
+    """
+    Find the N+1 patterns and slow queries of each request when
+    ``API_QUERY_CHECK`` is set, see ``core.querycheck``: each one is logged
+    as a warning and added to the report of ``query_report``. Meant for
+    staging, as reading the stack of the reported queries is slow.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.API_QUERY_CHECK:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(settings.API_QUERY_REPEAT_LIMIT, settings.API_SLOW_QUERY_MS)
+        with recorder.wrap():
+            response = self.get_response(request)
+        issues = recorder.issues()
+        if issues:
+            route = request.resolver_match.view_name if request.resolver_match else request.path_info
+            for issue in issues:
+                logger.warning('%s %s: %s', request.method, route, issue)
+            report.add(route, recorder)
+        return response
+
+
+@api_view(['GET'])
+def query_report(request):
+    return Response(report.get())
@@ -0,0 +1,48 @@
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def use_orjson():
+    """
+    Whether JSON is encoded and decoded with orjson: ``API_JSON_BACKEND``
+    asks for it and it is installed.
+    """
+    return settings.API_JSON_BACKEND == 'orjson' and orjson is not None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` encoding with orjson, when enabled (see ``use_orjson()``),
+    to the same JSON text: compact, UTF-8, with the date, time and other
+    values orjson does not handle itself converted by the DRF encoder. Only
+    the exponents of floats may be written differently (``1e-7`` rather
+    than ``1e-07``), for the same value.
+
+    Indented output, ASCII output and the values orjson refuses (e.g. the
+    integers over 64 bits) go through the stdlib encoder. Unlike it, NaN
+    and infinite floats are rendered as ``null`` rather than rejected.
+    """
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (not use_orjson() or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped like JSONRenderer does, see its render()
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
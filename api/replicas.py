@@ -0,0 +1,39 @@
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from core.routers import use_primary, use_replicas
+
+PRIMARY_COOKIE = 'use_primary'
+
+
+class ReplicaReadMixin:
+    """
+    Read from the replicas on safe methods, see ``core.routers``.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with use_replicas():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class PrimaryPinMiddleware:
+    """
+    Pin the reads of unsafe requests to the primary, and the ones of the
+    next requests of the same client for ``DB_REPLICA_LAG`` seconds with a
+    cookie, so a client reads its own writes whatever the replica lag.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS and PRIMARY_COOKIE not in request.COOKIES:
+            return self.get_response(request)
+
+        with use_primary():
+            response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and settings.DATABASE_REPLICAS:
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=settings.DB_REPLICA_LAG, httponly=True)
+        return response
@@ -0,0 +1,39 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.models import Product, Client
+from core.search import search
+from core.serializers import ProductSerializer, ClientSerializer
+
+
+class SearchView(APIView):
+    """
+    Ranked prefix search of products (name, remark) and clients (names,
+    company, address): ``/search/?q=<text>[&type=product|client][&limit=n]``.
+    """
+    targets = {
+        'product': ('products', Product, ProductSerializer),
+        'client': ('clients', Client, ClientSerializer),
+    }
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ['This query param is required.']})
+        kind = request.query_params.get('type')
+        if kind is not None and kind not in self.targets:
+            raise ValidationError({'type': ['Expected one of: %s.' % ', '.join(self.targets)]})
+        try:
+            limit = int(request.query_params.get('limit', settings.API_SEARCH_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': ['A valid integer is required.']})
+        limit = max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+        results = {}
+        for name, (key, model, serializer_class) in self.targets.items():
+            if kind in (None, name):
+                objects = search(model, query, limit)
+                results[key] = serializer_class(objects, many=True, context={'request': request}).data
+        return Response(results)
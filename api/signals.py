@@ -0,0 +1,57 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Product, Client, Order
+from core.pricing import products_repriced
+
+from .analytics import schedule_rollups_refresh
+from .cache import invalidate_all, invalidate_objects
+
+BASENAMES = {
+    Product: 'product',
+    Client: 'client',
+    Order: 'order',
+}
+
+
+# only for the models served, as a post_delete receiver turns off the fast
+# delete of its sender; the lines of an order are written with the order
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Order)
+def object_changed(sender, instance, **kwargs):
+    invalidate_objects(BASENAMES[sender], [instance.pk])
+    if sender is Order:
+        schedule_rollups_refresh()
+
+
+def orders_changed(pks):
+    invalidate_objects('order', pks)
+    if pks:
+        schedule_rollups_refresh()
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # the orders that lost their lines of the product, see core.signals
+    invalidate_objects('product', [instance.pk])
+    orders_changed(getattr(instance, '_deleted_order_pks', ()))
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def order_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'post_clear':
+        # read before the clear, see core.signals
+        orders_changed(getattr(instance, '_cleared_order_pks', ()))
+    elif not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        orders_changed([instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        orders_changed(pk_set)
+
+
+@receiver(products_repriced)
+def products_price_changed(sender, orders, **kwargs):
+    invalidate_all(BASENAMES[sender])
+    orders_changed(orders)
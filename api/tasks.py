@@ -0,0 +1,99 @@
+"""
+Tasks of the jobs submitted with ``api.jobs.JobSubmitMixin``. They call
+the views of the API with a request built like the one the job replaces,
+so a job gives the same result as the synchronous route.
+
+The workers invalidate the cached responses like the API processes do,
+which reaches those only when the cache is shared, see ``API_CACHE_ENABLED``.
+"""
+import json
+import os
+
+from django.conf import settings
+from django.test import RequestFactory
+
+from api import views
+from api.jobs import export_path
+from core.jobs import task
+
+VIEWSETS = {
+    'product': views.ProductViewSet,
+    'client': views.ClientViewSet,
+    'order': views.OrderViewSet,
+}
+
+factory = RequestFactory()
+
+
+def check_response(response):
+    if response.status_code != 200:
+        raise RuntimeError('The view answered %s: %s' % (response.status_code, getattr(response, 'data', '')))
+    return response
+
+
+@task('bulk')
+def bulk(job):
+    """
+    Upsert the items ``API_BULK_BATCH_SIZE`` at a time, as ``bulk/`` does.
+    Items are keyed on their code, so a retry writes the same rows again.
+    """
+    params = job.get_params()
+    items = params['items']
+    view = VIEWSETS[params['model']].as_view({'post': 'bulk'}, basename=params['model'])
+    chunk_size = settings.API_BULK_BATCH_SIZE
+    counts = {}
+    results = []
+    job.set_progress(0, len(items))
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        request = factory.post('/', data=json.dumps(chunk), content_type='application/json')
+        response = check_response(view(request))
+        for result in response.data['results']:
+            result['index'] += start
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            results.append(result)
+        job.set_progress(start + len(chunk))
+    return {'counts': counts, 'results': results}
+
+
+class ExportProgressMixin:
+    """
+    Report the rows exported as the progress of ``job``.
+    """
+    job = None
+
+    def get_export_chunks(self, queryset, columns, chunk_size):
+        self.job.set_progress(0, queryset.count())
+        done = 0
+        for chunk in super().get_export_chunks(queryset, columns, chunk_size):
+            yield chunk
+            done += len(chunk)
+            self.job.set_progress(done)
+
+
+@task('export')
+def export(job):
+    """
+    Write the export of the filtered rows, as ``export/`` streams it, to a
+    file of ``API_JOB_RESULTS_DIR``.
+    """
+    params = job.get_params()
+    model, export_format = params['model'], params['format']
+    viewset = type(VIEWSETS[model].__name__, (ExportProgressMixin, VIEWSETS[model]), {})
+    view = viewset.as_view({'get': 'export'}, basename=model, job=job)
+    response = check_response(view(factory.get('/', params['query']), export_format=export_format))
+
+    path = export_path(job, export_format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # the file only appears once complete
+    partial = path + '.part'
+    with open(partial, 'wb') as file:
+        for content in response.streaming_content:
+            file.write(content)
+    os.replace(partial, path)
+    return {
+        'format': export_format,
+        'filename': '%s.%s' % (model, export_format),
+        'rows': job.progress,
+        'bytes': os.path.getsize(path),
+    }
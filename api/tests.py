@@ -1,11 +1,51 @@
+import base64
+import csv
+import datetime
+import decimal
 import json
-
-from django.test import TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO, StringIO
+from unittest import skipIf
+from urllib.parse import urlencode
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models.signals import post_delete, post_save
+from django.core.management.base import CommandError
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework import status
-from rest_framework.test import APIClient
-
-from core.models import Product, Client, Order
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.asgi import ReadPoolASGIHandler
+from api.cache import get_cache
+from api.checks import check_response_cache
+from api.metrics import registry
+from api.querycheck import report
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson, use_orjson
+from api.views import ProductViewSet, ClientViewSet, OrderViewSet
+from core.analytics import rebuild_rollups, sales_report
+from core.backends.sqlite3.base import DatabaseWrapper
+from core.fastpath import compile_serializer
+from core.jobs import TASKS, claim, enqueue, requeue_stale, task
+from core.routers import get_read_replica, use_primary, use_replicas
+from core.models import Product, Client, Order, OrderLine, Change, ClientSales, Job
+from core.querycheck import QueryCheckMixin, fingerprint
 from core.serializers import ProductSerializer, ClientSerializer, OrderSerializer
 
 PRODUCTS_URL = reverse("product-list")
@@ -19,7 +59,7 @@ ORDER_DETAIL = "order-detail"
 
 
 # products
-class ProductApiTest(TestCase):
+class ProductApiTest(QueryCheckMixin, TestCase):
     """
     test the Product
     """
@@ -41,11 +81,12 @@ class ProductApiTest(TestCase):
             family="F001",
             price=200,
         )
-        response = self.client.get(PRODUCTS_URL)
+        with self.assertQueryBudget():
+            response = self.client.get(PRODUCTS_URL)
         products = Product.objects.all().order_by("id")
         serializer = ProductSerializer(products, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
 
     def test_create_product(self):
         # test creating a new product
@@ -165,7 +206,7 @@ class DeleteSingleProductTest(TestCase):
 
 
 # clients
-class ClientApiTest(TestCase):
+class ClientApiTest(QueryCheckMixin, TestCase):
     """
     test the Client
     """
@@ -191,11 +232,12 @@ class ClientApiTest(TestCase):
             date_of_birth="1990-01-01",
             mobile_phone1="0123456789",
         )
-        response = self.client.get(CLIENTS_URL)
+        with self.assertQueryBudget():
+            response = self.client.get(CLIENTS_URL)
         clients = Client.objects.all().order_by("id")
         serializer = ClientSerializer(clients, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
 
     def test_create_client(self):
         # test creating a new client
@@ -328,7 +370,7 @@ class DeleteSingleClientTest(TestCase):
 
 
 # orders
-class OrderApiTest(TestCase):
+class OrderApiTest(QueryCheckMixin, TestCase):
     """
     test the Order
     """
@@ -378,11 +420,12 @@ class OrderApiTest(TestCase):
         order1.products.set([self.product1, self.product2])
         order2.products.set([self.product1])
         order3.products.set([self.product2])
-        response = self.client.get(ORDERS_URL)
-        orders = Order.objects.all().order_by("id")
+        with self.assertQueryBudget():
+            response = self.client.get(ORDERS_URL)
+        orders = Order.objects.all().order_by("-date", "-id")
         serializer = OrderSerializer(orders, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
 
     def test_create_order(self):
         # test creating a new order
@@ -401,7 +444,7 @@ class OrderApiTest(TestCase):
         self.assertTrue(exists)
 
 
-class GetSingleOrder(TestCase):
+class GetSingleOrder(QueryCheckMixin, TestCase):
     """
      test module for GET single order API
     """
@@ -436,9 +479,10 @@ class GetSingleOrder(TestCase):
             client=client,
         )
         order.products.set([product1, product2])
-        response = self.client.get(
-            reverse(ORDER_DETAIL, kwargs={"pk": order.pk})
-        )
+        with self.assertQueryBudget():
+            response = self.client.get(
+                reverse(ORDER_DETAIL, kwargs={"pk": order.pk})
+            )
         serializer = OrderSerializer(order)
         self.assertEqual(response.data, serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -606,3 +650,2215 @@ class GetTotalPriceTest(TestCase):
     def test_total_price(self):
         self.assertEqual(self.order1.total_price(), 650.0)
         self.assertEqual(self.order2.total_price(), 0)
+
+
+class OrderLineTest(TestCase):
+    """
+    Test module for order lines quantities and unit prices
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F001",
+            price=450,
+        )
+
+    def test_create_order_with_lines(self):
+        order = {
+            "code": "O001",
+            "date": "2021-01-12T22:39:37+01:00",
+            "client": self.client1.pk,
+            "lines": [
+                {"product": self.product1.pk, "quantity": 50},
+                {"product": self.product2.pk, "quantity": 2},
+            ]
+        }
+        response = self.client.post(ORDERS_URL, data=json.dumps(order), content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["price"], 10900.0)
+        self.assertEqual(response.data["products"], [self.product1.pk, self.product2.pk])
+        self.assertEqual(
+            [(line["quantity"], line["unit_price"]) for line in response.data["lines"]],
+            [(50, 200.0), (2, 450.0)]
+        )
+
+    def test_update_keeps_unit_prices(self):
+        order = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        order.products.set([self.product1])
+        Product.objects.filter(pk=self.product1.pk).update(price=300)
+        updated_order = {
+            "code": "O001",
+            "date": "2021-01-12T22:39:37+01:00",
+            "client": self.client1.pk,
+            "lines": [{"product": self.product1.pk, "quantity": 3}]
+        }
+        response = self.client.put(
+            reverse(ORDER_DETAIL, kwargs={"pk": order.pk}),
+            data=json.dumps(updated_order),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["price"], 600.0)
+
+    def test_invalid_quantity(self):
+        order = {
+            "code": "O001",
+            "date": "2021-01-12T22:39:37+01:00",
+            "client": self.client1.pk,
+            "lines": [{"product": self.product1.pk, "quantity": 0}]
+        }
+        response = self.client.post(ORDERS_URL, data=json.dumps(order), content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_products(self):
+        order = {
+            "code": "O001",
+            "date": "2021-01-12T22:39:37+01:00",
+            "client": self.client1.pk,
+        }
+        response = self.client.post(ORDERS_URL, data=json.dumps(order), content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderQueryCountTest(QueryCheckMixin, TestCase):
+    """
+    Test module for the number of queries used to list and retrieve orders
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.products = [
+            Product.objects.create(
+                code="PR%03d" % i,
+                name="Product %d" % i,
+                family="F001",
+                price=100 + i,
+            )
+            for i in range(3)
+        ]
+
+    def create_orders(self, count):
+        start = Order.objects.count()
+        for i in range(start, start + count):
+            order = Order.objects.create(
+                code="O%03d" % i,
+                date="2021-01-12T22:39:37+01:00",
+                client=self.client1,
+            )
+            order.products.set(self.products)
+
+    def test_list_query_count_is_constant(self):
+        # one query for the version stamp, one for the orders, one for their
+        # products and one for their lines
+        self.create_orders(1)
+        with self.assertQueryBudget(4):
+            response = self.client.get(ORDERS_URL)
+        self.assertEqual(len(response.data["results"]), 1)
+
+        self.create_orders(20)
+        with self.assertQueryBudget(4):
+            response = self.client.get(ORDERS_URL)
+        self.assertEqual(len(response.data["results"]), 21)
+
+    def test_retrieve_query_count(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        with self.assertQueryBudget(4):
+            response = self.client.get(
+                reverse(ORDER_DETAIL, kwargs={"pk": order.pk})
+            )
+        self.assertEqual(response.data["price"], 303.0)
+
+    def test_create_query_count(self):
+        # unique code, client, products, savepoint, order, change record,
+        # lines and savepoint release, whatever the number of products
+        Product.objects.bulk_create([
+            Product(code="PB%03d" % i, name="Product %d" % i, price=i) for i in range(100)
+        ])
+        products = Product.objects.filter(code__startswith="PB")
+        order = {
+            "code": "O100",
+            "date": "2021-01-12T22:39:37+01:00",
+            "client": self.client1.pk,
+            "lines": [{"product": product.pk, "quantity": 2} for product in products],
+        }
+        with self.assertQueryBudget(8):
+            response = self.client.post(ORDERS_URL, data=json.dumps(order), content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["price"], 2 * sum(range(100)))
+        self.assertEqual(len(response.data["lines"]), 100)
+        self.assertEqual(Order.objects.get(code="O100").total, 2 * sum(range(100)))
+        self.assertFalse(Order.objects.mismatched_totals().exists())
+
+    def test_update_query_count(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        data = {
+            "code": order.code,
+            "date": "2021-01-12T22:39:37+01:00",
+            "client": self.client1.pk,
+            "products": [product.pk for product in self.products[1:]],
+        }
+        # the order with its products and lines, unique code, client,
+        # products, savepoint, old lines and their delete, order, change
+        # record, new lines and savepoint release
+        with self.assertQueryBudget(13):
+            response = self.client.put(
+                reverse(ORDER_DETAIL, kwargs={"pk": order.pk}),
+                data=json.dumps(data),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["products"], [product.pk for product in self.products[1:]])
+        self.assertEqual(response.data["price"], 203.0)
+        self.assertFalse(Order.objects.mismatched_totals().exists())
+
+    def test_unknown_products(self):
+        data = {
+            "code": "O001",
+            "date": "2021-01-12T22:39:37+01:00",
+            "client": self.client1.pk,
+            "products": [self.products[0].pk, 999, "x"],
+        }
+        response = self.client.post(ORDERS_URL, data=json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("999", str(response.data["products"]))
+        data["lines"] = [{"product": 999, "quantity": 1}]
+        del data["products"]
+        response = self.client.post(ORDERS_URL, data=json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("999", str(response.data["lines"]))
+
+
+class OrderPriceFilterTest(TestCase):
+    """
+    Test module for filtering and ordering orders by their total price
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F001",
+            price=900,
+        )
+        self.order1 = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        self.order1.products.set([self.product1])
+        self.order2 = Order.objects.create(
+            code="O002",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        self.order2.products.set([self.product1, self.product2])
+        self.order3 = Order.objects.create(
+            code="O003",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        self.order3.products.set([self.product2])
+
+    def test_annotated_price(self):
+        prices = dict(Order.objects.with_price().values_list("code", "price"))
+        self.assertEqual(prices, {"O001": 200.0, "O002": 1100.0, "O003": 900.0})
+
+    def test_filter_by_price(self):
+        response = self.client.get(ORDERS_URL, {"price__gte": 900})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(o["code"] for o in response.data["results"]), ["O002", "O003"])
+
+    def test_order_by_price(self):
+        response = self.client.get(ORDERS_URL, {"ordering": "-price"})
+        results = response.data["results"]
+        self.assertEqual([o["code"] for o in results], ["O002", "O003", "O001"])
+        self.assertEqual([o["price"] for o in results], [1100.0, 900.0, 200.0])
+
+    def test_invalid_price_filter(self):
+        response = self.client.get(ORDERS_URL, {"price__gte": "cheap"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderTotalTest(TestCase):
+    """
+    Test module for maintaining the stored total of orders
+    """
+
+    def setUp(self):
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F001",
+            price=450,
+        )
+        self.order1 = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        self.order2 = Order.objects.create(
+            code="O002",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+
+    def totals(self):
+        return dict(Order.objects.values_list("code", "total"))
+
+    def test_products_changes(self):
+        self.order1.products.set([self.product1, self.product2])
+        self.assertEqual(self.order1.total, 650.0)
+        self.order1.products.remove(self.product2)
+        self.assertEqual(self.totals()["O001"], 200.0)
+        self.order1.products.clear()
+        self.assertEqual(self.totals()["O001"], 0.0)
+
+    def test_reverse_products_changes(self):
+        self.product2.products.add(self.order1, self.order2)
+        self.assertEqual(self.totals(), {"O001": 450.0, "O002": 450.0})
+        self.product2.products.clear()
+        self.assertEqual(self.totals(), {"O001": 0.0, "O002": 0.0})
+
+    def test_product_price_change(self):
+        # orders keep the price the products had when they were ordered
+        self.order1.products.set([self.product1, self.product2])
+        self.order2.products.set([self.product1])
+        product = Product.objects.get(pk=self.product2.pk)
+        product.price = 500
+        product.save()
+        self.assertEqual(self.totals(), {"O001": 650.0, "O002": 200.0})
+        self.order2.products.add(product)
+        self.assertEqual(self.totals(), {"O001": 650.0, "O002": 700.0})
+
+    def test_product_delete(self):
+        self.order1.products.set([self.product1, self.product2])
+        self.product1.delete()
+        self.assertEqual(self.totals()["O001"], 450.0)
+
+    def test_recompute_command(self):
+        self.order1.products.set([self.product1, self.product2])
+        self.order2.products.set([self.product1])
+        Order.objects.update(total=0)
+        with self.assertRaises(CommandError):
+            call_command("recompute_order_totals", check=True, stdout=StringIO())
+
+        call_command("recompute_order_totals", chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.totals(), {"O001": 650.0, "O002": 200.0})
+        call_command("recompute_order_totals", check=True, stdout=StringIO())
+
+
+class PaginationTest(TestCase):
+    """
+    Test module for walking the cursor paginated listings
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL000",
+            first_name="client0",
+            last_name="client0",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+
+    def walk(self, url, page_size):
+        # follow the next links and return the results of every page
+        results = []
+        pages = 0
+        while url:
+            response = self.client.get(url, {"page_size": page_size} if "?" not in url else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), page_size)
+            results.extend(response.data["results"])
+            url = response.data["next"]
+            pages += 1
+        return results, pages
+
+    def test_walk_products(self):
+        for i in range(7):
+            Product.objects.create(code="PR%03d" % i, name="Product %d" % i, price=i)
+        results, pages = self.walk(PRODUCTS_URL, 3)
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            [p["id"] for p in results],
+            list(Product.objects.order_by("id").values_list("id", flat=True))
+        )
+
+    def test_walk_clients(self):
+        for i in range(1, 6):
+            Client.objects.create(
+                code="CL%03d" % i,
+                first_name="client%d" % i,
+                last_name="client%d" % i,
+                address="Batna, Algeria",
+                date_of_birth="1990-01-01",
+                mobile_phone1="0123456789",
+            )
+        results, pages = self.walk(CLIENTS_URL, 2)
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            [c["id"] for c in results],
+            list(Client.objects.order_by("id").values_list("id", flat=True))
+        )
+
+    def test_walk_orders(self):
+        for i in range(8):
+            Order.objects.create(
+                code="O%03d" % i,
+                date="2021-01-%02dT22:39:37+01:00" % (i % 3 + 1),
+                client=self.client1,
+            )
+        results, pages = self.walk(ORDERS_URL, 3)
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            [o["code"] for o in results],
+            list(Order.objects.order_by("-date", "-id").values_list("code", flat=True))
+        )
+
+    def test_walk_equal_prices(self):
+        for i in range(8):
+            Order.objects.create(code="O%03d" % i, date="2021-01-01T22:39:37+01:00", client=self.client1)
+        Order.objects.filter(code__in=["O002", "O005"]).update(total=10)
+        expected = list(Order.objects.order_by("-total", "-id").values_list("code", flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            results, pages = self.walk(ORDERS_URL + "?ordering=-price&page_size=3", 3)
+        self.assertEqual(pages, 3)
+        self.assertEqual([o["code"] for o in results], expected)
+        # the rows with equal prices are skipped by their PK, not with an offset
+        self.assertFalse([q["sql"] for q in queries.captured_queries if "OFFSET" in q["sql"]])
+
+        # and back from the last page
+        url = ORDERS_URL + "?ordering=-price&page_size=3"
+        for _ in range(2):
+            url = self.client.get(url).data["next"]
+        backwards = []
+        while url:
+            response = self.client.get(url)
+            backwards[:0] = response.data["results"]
+            url = response.data["previous"]
+        self.assertEqual([o["code"] for o in backwards], expected)
+
+    def test_invalid_cursor(self):
+        for position in ("nope", '["1"]', '["x", "y", "z"]'):
+            cursor = base64.b64encode(urlencode({"p": position}).encode()).decode()
+            response = self.client.get(ORDERS_URL, {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+
+class ExportTest(TestCase):
+    """
+    Test module for the streaming NDJSON and CSV exports
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F001",
+            price=450,
+            remark="a, \"quoted\" remark",
+        )
+        for i in range(5):
+            order = Order.objects.create(
+                code="O%03d" % i,
+                date="2021-01-12T22:39:37+01:00",
+                client=self.client1,
+            )
+            order.products.set([self.product1, self.product2][:i % 2 + 1])
+
+    def export(self, basename, export_format, **params):
+        response = self.client.get(
+            reverse("%s-export" % basename, kwargs={"export_format": export_format}), params
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_products_ndjson(self):
+        content = self.export("product", "ndjson")
+        rows = [json.loads(line) for line in content.splitlines()]
+        serializer = ProductSerializer(Product.objects.order_by("id"), many=True)
+        self.assertEqual(rows, serializer.data)
+
+    def test_export_clients_csv(self):
+        content = self.export("client", "csv")
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], list(ClientSerializer().fields))
+        self.assertEqual(rows[1][1], "CL001")
+        self.assertEqual(len(rows), 2)
+
+    def test_export_products_csv_quoting(self):
+        content = self.export("product", "csv")
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(rows[1]["remark"], "a, \"quoted\" remark")
+
+    def test_export_orders_ndjson(self):
+        with self.settings(API_EXPORT_CHUNK_SIZE=2):
+            with self.assertNumQueries(1 + 3):
+                content = self.export("order", "ndjson")
+        rows = [json.loads(line) for line in content.splitlines()]
+        orders = Order.objects.with_price().order_by("-date", "-id")
+        serializer = OrderSerializer(orders, many=True)
+        self.assertEqual(rows, serializer.data)
+
+    def test_export_ignores_sparse_fields(self):
+        # fields and expand only shape the list and detail responses
+        content = self.export("order", "ndjson", fields="code", expand="client")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(list(rows[0]), list(OrderSerializer().fields))
+        self.assertEqual(rows[0]["client"], self.client1.pk)
+
+
+class BulkUpsertTest(QueryCheckMixin, TestCase):
+    """
+    Test module for the bulk create/update routes
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+
+    def post_bulk(self, basename, items):
+        return self.client.post(
+            reverse("%s-bulk" % basename),
+            data=json.dumps(items),
+            content_type="application/json"
+        )
+
+    def test_bulk_products(self):
+        order = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        order.products.set([self.product1])
+        items = [
+            {"code": "PR001", "name": "Product 1", "family": "F001", "price": 250},
+            {"code": "PR002", "name": "Product 2", "price": 100},
+            {"code": "PR003", "price": 100},
+            {"code": "PR002", "name": "Product 2 again", "price": 100},
+        ]
+        with self.settings(API_BULK_BATCH_SIZE=1):
+            response = self.post_bulk("product", items)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["counts"], {"updated": 1, "created": 1, "invalid": 2})
+        self.assertEqual(
+            [r["status"] for r in response.data["results"]],
+            ["updated", "created", "invalid", "invalid"]
+        )
+        self.assertIn("name", response.data["results"][2]["errors"])
+        self.assertEqual(Product.objects.get(code="PR001").price, 250)
+        self.assertEqual(Product.objects.get(code="PR002").name, "Product 2")
+        # the order keeps the price the product was ordered at
+        self.assertEqual(Order.objects.get(code="O001").total, 200)
+
+    def test_bulk_products_mixed_fields(self):
+        Product.objects.create(code="PR002", name="Product 2", remark="old", price=100)
+        items = [
+            {"code": "PR001", "name": "Product 1", "price": 300},
+            {"code": "PR002", "name": "Product 2", "price": 150, "remark": "new"},
+        ]
+        with self.assertQueryBudget(repeat_limit=2):
+            response = self.post_bulk("product", items)
+        self.assertEqual(response.data["counts"], {"updated": 2})
+        self.assertEqual(Product.objects.get(code="PR002").remark, "new")
+        self.assertEqual(Product.objects.get(code="PR002").price, 150)
+        # the fields an item omits keep their value
+        self.assertEqual(Product.objects.get(code="PR001").family, "F001")
+        self.assertEqual(Product.objects.get(code="PR001").price, 300)
+
+    def test_bulk_clients(self):
+        items = [
+            {
+                "code": "CL001",
+                "first_name": "client1",
+                "last_name": "client1",
+                "address": "11 Algiers, Algeria",
+                "date_of_birth": "1990-01-01",
+                "mobile_phone1": "0123456789",
+            },
+            {
+                "code": "CL002",
+                "first_name": "client2",
+                "last_name": "client2",
+                "address": "Batna, Algeria",
+                "date_of_birth": "1990-01-01",
+                "mobile_phone1": "0123456789",
+            },
+        ]
+        with self.assertQueryBudget():
+            response = self.post_bulk("client", items)
+        self.assertEqual(response.data["counts"], {"updated": 1, "created": 1})
+        self.assertEqual(Client.objects.get(code="CL001").address, "11 Algiers, Algeria")
+        self.assertTrue(Client.objects.filter(code="CL002").exists())
+
+    def test_bulk_orders(self):
+        product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F001",
+            price=450,
+        )
+        order = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        order.products.set([self.product1])
+        items = [
+            {
+                "code": "O001",
+                "date": "2021-01-13T10:00:00+01:00",
+                "client": self.client1.pk,
+                "products": [product2.pk],
+            },
+            {
+                "code": "O002",
+                "date": "2021-01-12T22:39:37+01:00",
+                "client": self.client1.pk,
+                "lines": [{"product": self.product1.pk, "quantity": 1}, {"product": product2.pk, "quantity": 1}],
+            },
+            {
+                "code": "O003",
+                "date": "2021-01-12T22:39:37+01:00",
+                "client": 55,
+                "products": [self.product1.pk],
+            },
+        ]
+        # the clients, products and products of the lines of all the orders
+        # are read at once
+        with self.assertQueryBudget(repeat_limit=2):
+            response = self.post_bulk("order", items)
+        self.assertEqual(response.data["counts"], {"updated": 1, "created": 1, "invalid": 1})
+        self.assertEqual(
+            list(Order.objects.get(code="O001").products.values_list("code", flat=True)),
+            ["PR002"]
+        )
+        self.assertEqual(
+            dict(Order.objects.values_list("code", "total")),
+            {"O001": 450.0, "O002": 650.0}
+        )
+
+    def test_bulk_not_a_list(self):
+        response = self.post_bulk("product", {"code": "PR009"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(API_CACHE_ENABLED=True)
+class ResponseCacheTest(TestCase):
+    """
+    Test module for caching the list and detail responses
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F001",
+            price=450,
+        )
+        self.order = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        self.order.products.set([self.product1])
+
+    def stats(self):
+        return self.client.get(reverse("cache-stats")).data
+
+    def test_hit_without_queries(self):
+        url = reverse(PRODUCT_DETAIL, kwargs={"pk": self.product1.pk})
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(self.stats(), {"hits": 1, "misses": 1})
+
+    def test_hit_keeps_vary_and_allow(self):
+        url = reverse(PRODUCT_DETAIL, kwargs={"pk": self.product1.pk})
+        first = self.client.get(url)
+        self.assertIn("Accept", first["Vary"])
+        for headers in ({}, {"HTTP_IF_NONE_MATCH": first["ETag"]}):
+            response = self.client.get(url, **headers)
+            self.assertEqual(response["Vary"], first["Vary"])
+            self.assertEqual(response["Allow"], first["Allow"])
+        self.assertEqual(self.stats(), {"hits": 2, "misses": 1})
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get(PRODUCTS_URL, {"page_size": 1})
+        response = self.client.get(PRODUCTS_URL, {"page_size": 2})
+        self.assertEqual(len(json.loads(response.content)["results"]), 2)
+        self.assertEqual(self.stats(), {"hits": 0, "misses": 2})
+
+    def test_if_none_match(self):
+        url = reverse(PRODUCT_DETAIL, kwargs={"pk": self.product1.pk})
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+    def test_save_invalidates_detail_and_list(self):
+        url = reverse(PRODUCT_DETAIL, kwargs={"pk": self.product1.pk})
+        other_url = reverse(PRODUCT_DETAIL, kwargs={"pk": self.product2.pk})
+        self.client.get(url)
+        self.client.get(other_url)
+        self.client.get(PRODUCTS_URL)
+        self.product1.name = "Renamed"
+        self.product1.save()
+        self.assertEqual(json.loads(self.client.get(url).content)["name"], "Renamed")
+        self.assertEqual(json.loads(self.client.get(PRODUCTS_URL).content)["results"][0]["name"], "Renamed")
+        # the detail of an unchanged product is still served from the cache
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+
+    def test_products_change_invalidates_order(self):
+        url = reverse(ORDER_DETAIL, kwargs={"pk": self.order.pk})
+        self.client.get(url)
+        self.order.products.add(self.product2)
+        self.assertEqual(json.loads(self.client.get(url).content)["price"], 650.0)
+        self.product2.products.remove(self.order)
+        self.assertEqual(json.loads(self.client.get(url).content)["price"], 200.0)
+
+    def test_product_delete_invalidates_order(self):
+        url = reverse(ORDER_DETAIL, kwargs={"pk": self.order.pk})
+        self.client.get(url)
+        self.product1.delete()
+        self.assertEqual(json.loads(self.client.get(url).content)["price"], 0.0)
+
+    def test_reverse_clear_invalidates_orders(self):
+        url = reverse(ORDER_DETAIL, kwargs={"pk": self.order.pk})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.product1.products.clear()
+        # the orders of the product are read once, before the clear
+        selects = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), len(set(selects)))
+        self.assertEqual(json.loads(self.client.get(url).content)["price"], 0.0)
+
+    def test_lines_deleted_without_signals(self):
+        # the lines are fast deleted with a single DELETE
+        self.assertFalse(post_delete.has_listeners(OrderLine))
+        self.assertFalse(post_save.has_listeners(OrderLine))
+        OrderLine.objects.create(order=self.order, product=self.product2)
+        with self.assertNumQueries(1):
+            OrderLine.objects.filter(order=self.order).delete()
+
+    def test_bulk_invalidates(self):
+        url = reverse(PRODUCT_DETAIL, kwargs={"pk": self.product1.pk})
+        self.client.get(url)
+        self.client.post(
+            reverse("product-bulk"),
+            data=json.dumps([{"code": "PR001", "name": "Bulk", "price": 1}]),
+            content_type="application/json"
+        )
+        self.assertEqual(json.loads(self.client.get(url).content)["name"], "Bulk")
+
+    def test_local_cache_warning(self):
+        self.assertEqual([error.id for error in check_response_cache(None)], ["api.W001"])
+        with self.settings(API_CACHE_ENABLED=False):
+            self.assertEqual(check_response_cache(None), [])
+
+    def test_disabled(self):
+        url = reverse(PRODUCT_DETAIL, kwargs={"pk": self.product1.pk})
+        with self.settings(API_CACHE_ENABLED=False):
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(self.stats(), {"hits": 0, "misses": 0})
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class ConditionalGetTest(TestCase):
+    """
+    Test module for conditional GET driven by the updated_at stamps
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.order = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=self.client1,
+        )
+        self.order.products.set([self.product1])
+        self.order_url = reverse(ORDER_DETAIL, kwargs={"pk": self.order.pk})
+
+    def test_if_none_match_detail(self):
+        response = self.client.get(self.order_url)
+        self.assertTrue(response.has_header("Last-Modified"))
+        # only the version stamp is read
+        with self.assertNumQueries(1):
+            response = self.client.get(self.order_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_modified_since_detail(self):
+        last_modified = self.client.get(self.order_url)["Last-Modified"]
+        response = self.client.get(self.order_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalid_pk_not_found(self):
+        for name in (PRODUCT_DETAIL, CLIENT_DETAIL, ORDER_DETAIL):
+            response = self.client.get(reverse(name, kwargs={"pk": "abc"}))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, name)
+
+    def test_order_change_changes_etag(self):
+        etag = self.client.get(self.order_url)["ETag"]
+        self.order.lines.update(quantity=2)
+        self.assertEqual(self.client.get(self.order_url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        Order.objects.filter(pk=self.order.pk).refresh_totals()
+        response = self.client.get(self.order_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["price"], 400.0)
+
+    def test_list_etag(self):
+        Product.objects.create(code="PR002", name="Product 2", price=1)
+        etag = self.client.get(PRODUCTS_URL)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(PRODUCTS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # deleting a row changes the count, so the collection ETag
+        Product.objects.filter(code="PR002").delete()
+        response = self.client.get(PRODUCTS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_without_last_modified(self):
+        Product.objects.create(code="PR002", name="Product 2", price=1)
+        response = self.client.get(PRODUCTS_URL)
+        self.assertFalse(response.has_header("Last-Modified"))
+        Product.objects.filter(code="PR002").delete()
+        response = self.client.get(PRODUCTS_URL, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_list_etag_depends_on_query(self):
+        etag = self.client.get(PRODUCTS_URL)["ETag"]
+        response = self.client.get(PRODUCTS_URL, {"page_size": 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ChangeFeedTest(TestCase):
+    """
+    Test module for the change feed
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F001",
+            price=450,
+        )
+
+    def changes(self, model, **params):
+        response = self.client.get(reverse("change-feed", kwargs={"model": model}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_changes_since_cursor(self):
+        feed = self.changes("product")
+        self.assertEqual([c["id"] for c in feed["results"]], [self.product1.pk, self.product2.pk])
+        self.assertEqual(feed["results"][0]["data"], ProductSerializer(self.product1).data)
+
+        # nothing changed since the cursor
+        cursor = feed["cursor"]
+        self.assertEqual(self.changes("product", since=cursor)["results"], [])
+
+        self.product1.name = "Renamed"
+        self.product1.save()
+        self.product1.save()
+        product2_pk = self.product2.pk
+        self.product2.delete()
+        feed = self.changes("product", since=cursor)
+        self.assertEqual(
+            [(c["id"], c["action"]) for c in feed["results"]],
+            [(self.product1.pk, "upsert"), (product2_pk, "delete")]
+        )
+        self.assertEqual(feed["results"][0]["data"]["name"], "Renamed")
+        self.assertIsNone(feed["results"][1]["data"])
+
+    def test_batches(self):
+        for i in range(3, 8):
+            Product.objects.create(code="PR%03d" % i, name="Product %d" % i, price=i)
+        seen = []
+        cursor = 0
+        while True:
+            feed = self.changes("product", since=cursor, limit=3)
+            seen.extend(c["id"] for c in feed["results"])
+            cursor = feed["cursor"]
+            if not feed["has_more"]:
+                break
+        self.assertEqual(seen, list(Product.objects.order_by("pk").values_list("pk", flat=True)))
+
+    def test_bulk_and_order_changes(self):
+        client = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        order = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37+01:00",
+            client=client,
+        )
+        cursor = self.changes("order")["cursor"]
+        order.products.set([self.product1])
+        feed = self.changes("order", since=cursor)
+        self.assertEqual(feed["results"][0]["data"]["price"], 200.0)
+
+        cursor = self.changes("product")["cursor"]
+        self.client.post(
+            reverse("product-bulk"),
+            data=json.dumps([{"code": "PR003", "name": "Product 3", "price": 1}]),
+            content_type="application/json"
+        )
+        feed = self.changes("product", since=cursor)
+        self.assertEqual([c["data"]["code"] for c in feed["results"]], ["PR003"])
+
+    def test_unknown_model(self):
+        response = self.client.get(reverse("change-feed", kwargs={"model": "user"}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class SalesReportTest(TestCase):
+    """
+    Test module for the sales analytics and their rollups
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.clients = [
+            Client.objects.create(
+                code="CL%03d" % i,
+                first_name="client%d" % i,
+                last_name="client%d" % i,
+                address="Batna, Algeria",
+                date_of_birth="1990-01-01",
+                mobile_phone1="0123456789",
+            )
+            for i in range(2)
+        ]
+        self.products = [
+            Product.objects.create(code="PR%03d" % i, name="Product %d" % i, family=family, price=price)
+            for i, (family, price) in enumerate([("F1", 100), ("F1", 200), ("F2", 50)])
+        ]
+        self.order1 = self.create_order("O001", "2021-01-12T10:00:00+01:00", 0, [0, 1])
+        # past midnight in Algiers, still the 12th in UTC
+        self.order2 = self.create_order("O002", "2021-01-13T00:30:00+01:00", 1, [1, 2])
+        self.order3 = self.create_order("O003", "2021-01-13T12:00:00+01:00", 0, [2])
+
+    def create_order(self, code, date, client, products):
+        order = Order.objects.create(code=code, date=date, client=self.clients[client])
+        order.products.set([self.products[i] for i in products])
+        return order
+
+    def report(self, report, **params):
+        response = self.client.get(reverse("sales-report", kwargs={"report": report}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def all_reports(self):
+        reports = {}
+        for report in ("daily", "monthly", "clients", "families", "products"):
+            for start, end in [(None, None), ("2020-12-15", "2021-01-12"), ("2021-01-13", None),
+                               ("2021-01-01", "2021-01-31"), ("2021-01-13", "2021-01-14"),
+                               ("2020-01-01", "2021-12-31"), (None, "2021-02-01")]:
+                params = {key: value for key, value in [("start", start), ("end", end)] if value}
+                reports[report, start, end] = self.report(report, **params)
+        return reports
+
+    def test_reports(self):
+        self.assertEqual(self.report("daily"), [
+            {"day": datetime.date(2021, 1, 12), "orders": 1, "revenue": 300.0},
+            {"day": datetime.date(2021, 1, 13), "orders": 2, "revenue": 300.0},
+        ])
+        self.assertEqual(self.report("daily", start="2021-01-13"), [
+            {"day": datetime.date(2021, 1, 13), "orders": 2, "revenue": 300.0},
+        ])
+        self.assertEqual(self.report("monthly"), [
+            {"month": datetime.date(2021, 1, 1), "orders": 3, "revenue": 600.0},
+        ])
+        self.assertEqual(self.report("clients", limit=1), [
+            {"client": self.clients[0].pk, "client_code": "CL000", "orders": 2, "revenue": 350.0},
+        ])
+        self.assertEqual(self.report("families", end="2021-01-12"), [
+            {"family": "F1", "quantity": 2, "revenue": 300.0},
+        ])
+        self.assertEqual(
+            [row["product_code"] for row in self.report("products")], ["PR001", "PR000", "PR002"]
+        )
+
+    def test_invalid_params(self):
+        url = reverse("sales-report", kwargs={"report": "daily"})
+        self.assertEqual(self.client.get(url, {"start": "2021-02-30"}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"end": "yesterday"}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        url = reverse("sales-report", kwargs={"report": "clients"})
+        self.assertEqual(self.client.get(url, {"limit": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+        url = reverse("sales-report", kwargs={"report": "weekly"})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rollups_match_live_reports(self):
+        live = self.all_reports()
+        call_command("refresh_sales_rollups", stdout=StringIO())
+        with override_settings(API_ANALYTICS_ROLLUPS=True):
+            self.assertEqual(self.all_reports(), live)
+            self.assertEqual(ClientSales.objects.get(period="month", client=None).orders, 3)
+
+            # moved to another day, repriced and deleted orders
+            # past midnight in Algiers, still January in UTC
+            self.order1.date = "2021-02-01T00:30:00+01:00"
+            self.order1.save()
+            self.order2.products.set([self.products[0]])
+            self.order3.delete()
+            # one refresh queued for all the writes, the reports wait for it
+            self.assertEqual(Job.objects.filter(task="refresh_sales_rollups", status=Job.QUEUED).count(), 1)
+            self.assertEqual(self.all_reports(), live)
+            call_command("run_jobs", "--workers=1", "--burst", stdout=StringIO())
+            self.assertEqual(Job.objects.get(task="refresh_sales_rollups").get_result(), {"changes": 4})
+            rollups = self.all_reports()
+        self.assertEqual(rollups, self.all_reports())
+        self.assertEqual(rollups["daily", None, None], [
+            {"day": datetime.date(2021, 1, 13), "orders": 1, "revenue": 100.0},
+            {"day": datetime.date(2021, 2, 1), "orders": 1, "revenue": 300.0},
+        ])
+        self.assertEqual([row["month"] for row in rollups["monthly", None, None]],
+                         [datetime.date(2021, 1, 1), datetime.date(2021, 2, 1)])
+
+    def test_bulk_orders_queue_refresh(self):
+        rebuild_rollups()
+        items = [{"code": "O004", "date": "2021-01-14T10:00:00+01:00", "client": self.clients[1].pk,
+                  "products": [self.products[0].pk]}]
+        with override_settings(API_ANALYTICS_ROLLUPS=True):
+            for _ in range(2):
+                response = self.client.post(reverse("order-bulk"), data=json.dumps(items),
+                                            content_type="application/json")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(Job.objects.filter(task="refresh_sales_rollups").count(), 1)
+            call_command("run_jobs", "--workers=1", "--burst", stdout=StringIO())
+            self.assertEqual(self.report("daily"), sales_report("daily"))
+
+    def test_rollups_read_query_count(self):
+        rebuild_rollups()
+        self.order3.delete()
+        with override_settings(API_ANALYTICS_ROLLUPS=True):
+            # the report only, the pending change is left to the jobs
+            with self.assertNumQueries(1):
+                self.assertEqual(len(self.report("daily")), 2)
+        self.assertFalse(Job.objects.exists())
+
+    def test_rebuild_command(self):
+        call_command("refresh_sales_rollups", "--full", stdout=StringIO())
+        self.assertEqual(sales_report("families", rollups=True), sales_report("families"))
+        self.order3.delete()
+        out = StringIO()
+        call_command("refresh_sales_rollups", stdout=out)
+        self.assertIn("1 changes", out.getvalue())
+        self.assertEqual(sales_report("families", rollups=True), sales_report("families"))
+
+
+class FilterTest(TestCase):
+    """
+    Test module for filtering the listings with query params
+    """
+
+    # a value for the field of each lookup supported by the viewsets
+    sample_values = {
+        "code": "X001",
+        "family": "F001",
+        "price": 100,
+        "last_name": "client1",
+        "company": "company",
+        "date": "2021-01-12T22:39:37+01:00",
+        "client": 1,
+        "client__code": "CL001",
+        "products__code": "PR001",
+    }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+            company="company",
+        )
+        self.product1 = Product.objects.create(
+            code="PR001",
+            name="Product 1",
+            family="F001",
+            price=200,
+        )
+        self.product2 = Product.objects.create(
+            code="PR002",
+            name="Product 2",
+            family="F002",
+            price=450,
+        )
+        self.order1 = Order.objects.create(
+            code="O001",
+            date="2021-01-10T10:00:00+01:00",
+            client=self.client1,
+        )
+        self.order1.products.set([self.product1])
+        self.order2 = Order.objects.create(
+            code="O002",
+            date="2021-01-20T10:00:00+01:00",
+            client=self.client1,
+        )
+        self.order2.products.set([self.product2])
+
+    def codes(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(row["code"] for row in response.data["results"])
+
+    def test_product_filters(self):
+        self.assertEqual(self.codes(PRODUCTS_URL, {"family": "F002"}), ["PR002"])
+        self.assertEqual(self.codes(PRODUCTS_URL, {"price__gte": 100, "price__lt": 300}), ["PR001"])
+
+    def test_client_filters(self):
+        self.assertEqual(self.codes(CLIENTS_URL, {"company": "company"}), ["CL001"])
+        self.assertEqual(self.codes(CLIENTS_URL, {"last_name": "other"}), [])
+
+    def test_order_filters(self):
+        self.assertEqual(
+            self.codes(ORDERS_URL, {"date__gte": "2021-01-15T00:00:00+01:00"}), ["O002"]
+        )
+        self.assertEqual(self.codes(ORDERS_URL, {"client__code": "CL001"}), ["O001", "O002"])
+        self.assertEqual(self.codes(ORDERS_URL, {"products__code": "PR001"}), ["O001"])
+
+    def test_unknown_params_are_ignored(self):
+        self.assertEqual(self.codes(PRODUCTS_URL, {"name": "Product 1"}), ["PR001", "PR002"])
+
+    def test_filters_use_indexes(self):
+        for viewset in (ProductViewSet, ClientViewSet, OrderViewSet):
+            for lookup in viewset.filter_lookups:
+                field = lookup.rsplit("__", 1)[0] if lookup.endswith(("__gte", "__lte", "__gt", "__lt")) \
+                    else lookup
+                queryset = viewset.queryset.filter(**{lookup: self.sample_values[field]}).order_by()
+                plan = queryset.explain()
+                self.assertNotIn("SCAN", plan, "%s ?%s= does not use an index:\n%s" % (
+                    viewset.__name__, lookup, plan))
+
+
+class SearchTest(TestCase):
+    """
+    Test module for the full-text search
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        Product.objects.create(code="PR001", name="Blue chair", price=10, remark="wooden")
+        Product.objects.create(code="PR002", name="Red table", price=20, remark="chairs not included")
+        Product.objects.create(code="PR003", name="Lamp", price=30)
+        Client.objects.create(
+            code="CL001",
+            first_name="Amine",
+            last_name="Mahamdi",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+            company="Easy Relay",
+        )
+
+    def search(self, **params):
+        response = self.client.get(reverse("search"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_prefix_search(self):
+        results = self.search(q="chai", type="product")
+        # the name match ranks before the remark one
+        self.assertEqual([p["code"] for p in results["products"]], ["PR001", "PR002"])
+        self.assertNotIn("clients", results)
+
+    def test_every_word_matches(self):
+        results = self.search(q="red chai")
+        self.assertEqual([p["code"] for p in results["products"]], ["PR002"])
+        self.assertEqual(results["clients"], [])
+
+    def test_clients(self):
+        results = self.search(q="relay batna", type="client")
+        self.assertEqual([c["code"] for c in results["clients"]], ["CL001"])
+
+    def test_index_follows_writes(self):
+        product = Product.objects.get(code="PR003")
+        product.name = "Desk lamp"
+        product.save()
+        Product.objects.filter(code="PR001").delete()
+        Product.objects.bulk_create([Product(code="PR004", name="Desk", price=5)])
+        results = self.search(q="desk", type="product")
+        self.assertEqual(sorted(p["code"] for p in results["products"]), ["PR003", "PR004"])
+        self.assertEqual(self.search(q="blue")["products"], [])
+
+    def test_other_columns_not_reindexed(self):
+        def changes():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT total_changes()")
+                return cursor.fetchone()[0]
+
+        before = changes()
+        Product.objects.filter(code="PR001").update(price=11)
+        # only the product row, the trigger does not rewrite the index row
+        self.assertEqual(changes() - before, 1)
+        before = changes()
+        Product.objects.filter(code="PR001").update(name="Green chair")
+        self.assertGreater(changes() - before, 1)
+        self.assertEqual([p["code"] for p in self.search(q="green")["products"]], ["PR001"])
+
+    def test_rebuild_command(self):
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.search(q="lamp")["products"]), 1)
+
+    def test_missing_query(self):
+        response = self.client.get(reverse("search"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FieldsetTest(TestCase):
+    """
+    Test module for the sparse fieldsets and the nested expansion
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.products = [
+            Product.objects.create(
+                code="PR%03d" % i,
+                name="Product %d" % i,
+                family="F001",
+                price=100 + i,
+            )
+            for i in range(3)
+        ]
+
+    def create_orders(self, count):
+        start = Order.objects.count()
+        for i in range(start, start + count):
+            order = Order.objects.create(
+                code="O%03d" % i,
+                date="2021-01-12T22:39:37+01:00",
+                client=self.client1,
+            )
+            order.products.set(self.products)
+
+    def test_sparse_fields(self):
+        response = self.client.get(PRODUCTS_URL, {"fields": "code,name"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [dict(p) for p in response.data["results"]],
+            [{"code": p.code, "name": p.name} for p in self.products],
+        )
+
+    def test_sparse_fields_select_only_their_columns(self):
+        request = APIRequestFactory().get(PRODUCTS_URL, {"fields": "code,name"})
+        view = ProductViewSet(action="list", format_kwarg=None, request=Request(request))
+        self.assertEqual(view.get_only_fields(), ["pk", "code", "name"])
+
+    def test_order_fields_skip_relations(self):
+        self.create_orders(2)
+        # one query for the version stamp and one for the orders
+        with self.assertNumQueries(2):
+            response = self.client.get(ORDERS_URL, {"fields": "code,price"})
+        self.assertEqual(
+            [dict(o) for o in response.data["results"]],
+            [{"code": "O001", "price": 303.0}, {"code": "O000", "price": 303.0}],
+        )
+
+    def test_expand_query_count_is_constant(self):
+        # the client is joined, the products and lines are prefetched
+        self.create_orders(1)
+        with self.assertNumQueries(4):
+            response = self.client.get(ORDERS_URL, {"expand": "client,products"})
+        order = response.data["results"][0]
+        self.assertEqual(order["client"]["code"], "CL001")
+        self.assertEqual([p["code"] for p in order["products"]], ["PR000", "PR001", "PR002"])
+
+        get_cache().clear()
+        self.create_orders(20)
+        with self.assertNumQueries(4):
+            response = self.client.get(ORDERS_URL, {"expand": "client,products"})
+        self.assertEqual(len(response.data["results"]), 21)
+
+    def test_expand_is_read_only(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        response = self.client.patch(
+            reverse(ORDER_DETAIL, kwargs={"pk": order.pk}) + "?expand=client",
+            data=json.dumps({"code": "O999"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["client"], self.client1.pk)
+
+    def test_expanded_change_invalidates_cache_and_etag(self):
+        self.create_orders(1)
+        url = reverse(ORDER_DETAIL, kwargs={"pk": Order.objects.get().pk})
+        first = self.client.get(url, {"expand": "client"})
+        self.client1.company = "Easy Relay"
+        self.client1.save()
+        second = self.client.get(url, {"expand": "client"})
+        self.assertEqual(second.data["client"]["company"], "Easy Relay")
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class FastListTest(TestCase):
+    """
+    Test module for the fast list path, which must render the same bytes
+    as the serializers
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="Amine",
+            last_name="Mahamdi",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.client2 = Client.objects.create(
+            code="CL002",
+            first_name="Zoé",
+            last_name="Ünal",
+            address="Alger",
+            date_of_birth="1985-12-31",
+            mobile_phone1="0123456780",
+            email="zoe@example.com",
+            company="Easy Relay",
+        )
+        self.products = [
+            Product.objects.create(code="PR001", name="Chaise \"bleue\"", price=0.1 + 0.2),
+            Product.objects.create(code="PR002", name="Table", family="F001", price=1e-7, remark="é"),
+            Product.objects.create(code="PR003", name="Lamp", family="F001", price=30),
+        ]
+        order1 = Order.objects.create(
+            code="O001",
+            date="2021-01-12T22:39:37.123456+01:00",
+            client=self.client1,
+        )
+        order1.products.set(self.products[:2])
+        order2 = Order.objects.create(
+            code="O002",
+            date="2021-01-13T08:00:00Z",
+            client=self.client2,
+        )
+        # a line without a snapshot price
+        OrderLine.objects.create(order=order2, product=self.products[2], quantity=3)
+        Order.objects.create(code="O003", date="2021-01-14T08:00:00Z", client=self.client2)
+
+    def assertSameContent(self, url, params=None):
+        with override_settings(API_FAST_LIST=False):
+            expected = self.client.get(url, params)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_products(self):
+        self.assertSameContent(PRODUCTS_URL)
+        self.assertSameContent(PRODUCTS_URL, {"fields": "price,code"})
+        self.assertSameContent(PRODUCTS_URL, {"family": "F001", "page_size": 1})
+
+    def test_clients(self):
+        self.assertSameContent(CLIENTS_URL)
+        self.assertSameContent(CLIENTS_URL, {"fields": "date_of_birth,email"})
+
+    def test_orders(self):
+        response = self.assertSameContent(ORDERS_URL)
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertSameContent(ORDERS_URL, {"fields": "code,lines"})
+        self.assertSameContent(ORDERS_URL, {"ordering": "price"})
+        self.assertSameContent(ORDERS_URL, {"ordering": "-code", "page_size": 2})
+
+    def test_cursor_pages(self):
+        params = {"ordering": "price", "page_size": 2}
+        first = self.assertSameContent(ORDERS_URL, params)
+        self.assertSameContent(first.data["next"])
+
+    def test_expanded_fields_fall_back(self):
+        request = Request(APIRequestFactory().get(ORDERS_URL, {"expand": "client"}))
+        serializer = OrderSerializer(context={"request": request})
+        self.assertIsNone(compile_serializer(serializer))
+        self.assertIsNotNone(compile_serializer(OrderSerializer()))
+        self.assertSameContent(ORDERS_URL, {"expand": "client,products"})
+
+    def test_serialize_values(self):
+        fast = compile_serializer(ProductSerializer(many=True))
+        products = Product.objects.order_by("pk")
+        self.assertEqual(
+            JSONRenderer().render(fast.serialize(fast.values(products))),
+            JSONRenderer().render(ProductSerializer(products, many=True).data),
+        )
+
+    def test_query_count(self):
+        # one query for the version stamp, one for the orders, one for their
+        # products and one for their lines
+        with self.assertNumQueries(4):
+            self.client.get(ORDERS_URL)
+
+
+class JSONBackendTest(TestCase):
+    """
+    Test module for the orjson renderer and parser
+    """
+
+    data = {
+        "name": "Chaise \"bleue\" é  ",
+        "price": 0.1 + 0.2,
+        "prices": [1.0, 30, -2.5, 1234.5678],
+        "date": datetime.date(2021, 1, 12),
+        "datetime": datetime.datetime(2021, 1, 12, 21, 39, 37, 123456, tzinfo=datetime.timezone.utc),
+        "local": datetime.datetime(2021, 1, 12, 22, 39, tzinfo=datetime.timezone(datetime.timedelta(hours=1))),
+        "time": datetime.time(22, 39),
+        "amount": decimal.Decimal("12.50"),
+        "uuid": uuid.UUID(int=1),
+        1: None,
+    }
+
+    def render(self, renderer, data, accepted_media_type=None):
+        return renderer().render(data, accepted_media_type)
+
+    @skipIf(orjson is None, "orjson is not installed")
+    def test_same_text_as_stdlib(self):
+        self.assertTrue(use_orjson())
+        self.assertEqual(self.render(FastJSONRenderer, self.data), self.render(JSONRenderer, self.data))
+
+    def test_big_integers_use_stdlib(self):
+        data = {"count": 123456789012345678901234567890}
+        self.assertEqual(self.render(FastJSONRenderer, data), b'{"count":123456789012345678901234567890}')
+
+    def test_floats_round_trip(self):
+        floats = [0.1, 1e-7, 1e16, 5e-324, 1.7976931348623157e308, -0.0]
+        self.assertEqual(json.loads(self.render(FastJSONRenderer, floats)), floats)
+
+    def test_indent_uses_stdlib(self):
+        media_type = "application/json; indent=4"
+        self.assertEqual(
+            self.render(FastJSONRenderer, self.data, media_type),
+            self.render(JSONRenderer, self.data, media_type),
+        )
+
+    @override_settings(API_JSON_BACKEND="json")
+    def test_stdlib_backend(self):
+        self.assertFalse(use_orjson())
+        self.assertEqual(self.render(FastJSONRenderer, self.data), self.render(JSONRenderer, self.data))
+
+    def parse(self, body):
+        return FastJSONParser().parse(BytesIO(body))
+
+    def test_parse(self):
+        body = '{"name": "é", "price": 0.30000000000000004, "codes": [1, 2]}'.encode()
+        self.assertEqual(self.parse(body), {"name": "é", "price": 0.1 + 0.2, "codes": [1, 2]})
+        # rejected by orjson, accepted by the stdlib
+        self.assertEqual(self.parse(b'["\\ud800"]'), ["\ud800"])
+
+    def test_parse_errors(self):
+        for body in (b'{"code": ', b'{"price": NaN}', b"\xff"):
+            with self.assertRaises(ParseError):
+                self.parse(body)
+
+    def test_api_round_trip(self):
+        response = APIClient().post(
+            PRODUCTS_URL,
+            data=json.dumps({"code": "PR001", "name": "Chaise é", "price": 0.1 + 0.2}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content)["price"], 0.1 + 0.2)
+        self.assertEqual(Product.objects.get().name, "Chaise é")
+
+
+class DatabaseProfileTest(TestCase):
+    """
+    Test module for the OPTIONS of the SQLite backend
+    """
+
+    def connect(self, **options):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        settings_dict = dict(connection.settings_dict, NAME=os.path.join(path, "db.sqlite3"), OPTIONS=options)
+        wrapper = DatabaseWrapper(settings_dict, alias="profile")
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        return wrapper.connection.execute("PRAGMA %s" % name).fetchone()[0]
+
+    def test_init_command(self):
+        wrapper = self.connect(
+            init_command="PRAGMA busy_timeout = 1234; PRAGMA journal_mode = WAL;"
+                         "PRAGMA synchronous = NORMAL; PRAGMA mmap_size = 1048576",
+        )
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 1234)
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        # NORMAL
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)
+        self.assertEqual(self.pragma(wrapper, "mmap_size"), 1048576)
+
+    def test_defaults(self):
+        wrapper = self.connect()
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "delete")
+
+    def test_immediate_transactions(self):
+        wrapper = self.connect(transaction_mode="IMMEDIATE")
+        other = sqlite3.connect(wrapper.settings_dict["NAME"], timeout=0)
+        self.addCleanup(other.close)
+        # what atomic() does to start a transaction
+        wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        # the write lock is taken before any statement
+        with self.assertRaisesMessage(sqlite3.OperationalError, "database is locked"):
+            other.execute("BEGIN IMMEDIATE")
+        wrapper.rollback()
+        wrapper.set_autocommit(True)
+        other.execute("BEGIN IMMEDIATE")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTest(TestCase):
+    """
+    Test module for the reads from a replica, another SQLite file here
+    """
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases["replica"] = dict(
+            connection.settings_dict, NAME=os.path.join(cls.directory, "replica.sqlite3"), TEST={}
+        )
+        with override_settings(DATABASE_REPLICAS=["replica"]):
+            call_command("migrate", database="replica", run_syncdb=True, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections.databases["replica"]
+        delattr(connections._connections, "replica")
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        # a row only the replica has, as if the primary had lost it
+        Product.objects.using("replica").create(code="PR001", name="Replica", price=10)
+
+    def codes(self, client):
+        response = client.get(PRODUCTS_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product["code"] for product in response.data["results"]]
+
+    def test_reads_from_replica(self):
+        self.assertEqual(self.codes(self.client), ["PR001"])
+        product = Product.objects.using("replica").get()
+        response = self.client.get(reverse(PRODUCT_DETAIL, kwargs={"pk": product.pk}))
+        self.assertEqual(response.data["name"], "Replica")
+
+    def test_writes_go_to_primary(self):
+        response = self.client.post(
+            PRODUCTS_URL, data={"code": "PR002", "name": "Primary", "price": 20}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Product.objects.using("default").filter(code="PR002").exists())
+        self.assertFalse(Product.objects.using("replica").filter(code="PR002").exists())
+
+    def test_read_after_write_from_primary(self):
+        self.client.post(PRODUCTS_URL, data={"code": "PR002", "name": "Primary", "price": 20}, format="json")
+        # the client that wrote is pinned to the primary by a cookie
+        self.assertEqual(self.codes(self.client), ["PR002"])
+        get_cache().clear()
+        self.assertEqual(self.codes(APIClient()), ["PR001"])
+
+    def test_cache_timeout(self):
+        view = ProductViewSet()
+        self.assertEqual(view.get_cache_timeout(), 300)
+        with use_replicas():
+            self.assertEqual(get_read_replica(), "replica")
+            self.assertEqual(view.get_cache_timeout(), 5)
+            with use_primary():
+                self.assertIsNone(get_read_replica())
+
+
+class AsyncReadTest(TransactionTestCase):
+    """
+    Test module for the ASGI handler answering reads in a pool of threads
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        self.handler = ReadPoolASGIHandler()
+        self.product = Product.objects.create(code="PR001", name="Product 1", price=10)
+
+    def request(self, path, method="GET", body=b""):
+        async def call():
+            communicator = ApplicationCommunicator(self.handler, {
+                "type": "http",
+                "method": method,
+                "path": path,
+                "query_string": b"",
+                "headers": [
+                    (b"host", b"testserver"),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await communicator.send_input({"type": "http.request", "body": body})
+            start = await communicator.receive_output(5)
+            content = b""
+            while True:
+                message = await communicator.receive_output(5)
+                content += message.get("body", b"")
+                if not message.get("more_body"):
+                    break
+            return start["status"], content
+        return async_to_sync(call)()
+
+    def test_same_responses_as_wsgi(self):
+        for path in (PRODUCTS_URL, reverse(PRODUCT_DETAIL, kwargs={"pk": self.product.pk})):
+            get_cache().clear()
+            status_code, content = self.request(path)
+            self.assertEqual(status_code, status.HTTP_200_OK)
+            get_cache().clear()
+            self.assertEqual(content, APIClient().get(path).content)
+
+    def test_streaming_export(self):
+        path = reverse("product-export", kwargs={"export_format": "ndjson"})
+        status_code, content = self.request(path)
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(content, b"".join(APIClient().get(path).streaming_content))
+        self.assertIn(b'"code":"PR001"', content)
+
+    def test_reads_run_in_the_pool(self):
+        threads = []
+        get_read_response = self.handler.get_read_response
+
+        def record(request):
+            threads.append(threading.current_thread().name)
+            return get_read_response(request)
+
+        self.handler.get_read_response = record
+        self.request(PRODUCTS_URL)
+        self.request(reverse(ORDER_DETAIL, kwargs={"pk": 1}))
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith("api-read") for name in threads))
+
+        # writes and the other views go through the shared thread
+        status_code, _ = self.request(
+            PRODUCTS_URL, "POST", json.dumps({"code": "PR002", "name": "Product 2", "price": 20}).encode()
+        )
+        self.assertEqual(status_code, status.HTTP_201_CREATED)
+        self.request(reverse("cache-stats"))
+        self.assertEqual(len(threads), 2)
+
+
+class SeedDataTest(TestCase):
+    """
+    Test module for the seed_data command
+    """
+
+    def seed(self, **options):
+        call_command("seed_data", stdout=StringIO(), **options)
+
+    def test_seed(self):
+        self.seed(lines=1000, products=20, clients=30, lines_per_order=4, days=30)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Client.objects.count(), 30)
+        self.assertEqual(OrderLine.objects.count(), 1000)
+        self.assertFalse(Order.objects.all().mismatched_totals().exists())
+        self.assertFalse(OrderLine.objects.exclude(unit_price__gt=0).exists())
+        self.assertFalse(Order.objects.filter(lines=None).exists())
+        self.assertFalse(Order.objects.filter(date__lt=timezone.now() - datetime.timedelta(days=30)).exists())
+        # the values fit the fields
+        for instance in [*Product.objects.all(), *Client.objects.all()]:
+            instance.full_clean()
+
+        # the new rows follow the existing ones
+        self.seed(lines=1000, products=5, lines_per_order=8, seed=1)
+        self.assertEqual(Product.objects.count(), 25)
+        self.assertEqual(OrderLine.objects.count(), 2000)
+        self.assertFalse(Order.objects.filter(lines=None).exists())
+        self.assertFalse(Order.objects.all().mismatched_totals().exists())
+
+    def test_positive_options(self):
+        with self.assertRaises(CommandError):
+            self.seed(lines=0)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class MetricsTest(TestCase):
+    """
+    Test module for the request metrics
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        registry.reset()
+        for i in range(3):
+            Product.objects.create(code="PR00%d" % i, name="Product %d" % i, price=10 + i)
+
+    def timing(self, response):
+        # Server-Timing metric -> its params
+        return {
+            name: dict(param.split("=", 1) for param in params)
+            for name, *params in (metric.split(";") for metric in response["Server-Timing"].split(", "))
+        }
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(PRODUCTS_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {"db", "serialize", "render", "total"})
+        self.assertEqual(timing["db"]["desc"], '"%d queries"' % len(queries))
+        self.assertGreater(float(timing["serialize"]["dur"]), 0)
+        self.assertGreater(float(timing["render"]["dur"]), 0)
+        self.assertGreaterEqual(
+            float(timing["total"]["dur"]),
+            sum(float(timing[name]["dur"]) for name in ("db", "serialize", "render")),
+        )
+
+    def test_server_timing_phases(self):
+        # the serializer, and the rendering by the cache before the middleware sees the response
+        get_cache().clear()
+        detail_url = reverse("product-detail", kwargs={"pk": Product.objects.first().pk})
+        for fast_list, cached, url in [(False, False, PRODUCTS_URL), (True, True, PRODUCTS_URL),
+                                       (True, True, detail_url)]:
+            with self.subTest(fast_list=fast_list, cached=cached, url=url), \
+                    self.settings(API_FAST_LIST=fast_list, API_CACHE_ENABLED=cached):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                timing = self.timing(response)
+                self.assertGreater(float(timing["serialize"]["dur"]), 0)
+                self.assertGreater(float(timing["render"]["dur"]), 0)
+        self.assertIn('api_request_render_duration_seconds_count{route="product-list",method="GET"} 2',
+                      self.client.get(reverse("metrics")).content.decode().splitlines())
+
+    def test_prometheus_endpoint(self):
+        for _ in range(2):
+            self.client.get(PRODUCTS_URL)
+        size = len(self.client.get(reverse("product-export", kwargs={"export_format": "csv"})).getvalue())
+        self.client.get(reverse("product-detail", kwargs={"pk": 0}))
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        lines = response.content.decode().splitlines()
+        self.assertIn('api_requests_total{route="product-list",method="GET",status="200"} 2', lines)
+        self.assertIn('api_requests_total{route="product-detail",method="GET",status="404"} 1', lines)
+        self.assertIn("# TYPE api_request_duration_seconds histogram", lines)
+        self.assertIn('api_request_duration_seconds_count{route="product-list",method="GET"} 2', lines)
+        self.assertIn('api_request_duration_seconds_bucket{route="product-list",method="GET",le="+Inf"} 2',
+                      lines)
+        # the export reads its rows while streaming them
+        self.assertIn('api_request_queries_sum{route="product-export",method="GET"} 1', lines)
+        self.assertIn('api_response_size_bytes_sum{route="product-export",method="GET"} %d' % size, lines)
+
+    @override_settings(API_METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(PRODUCTS_URL)
+        self.assertNotIn("Server-Timing", response)
+        self.assertNotIn("product-list", self.client.get(reverse("metrics")).content.decode())
+
+
+class QueryCheckTest(QueryCheckMixin, TestCase):
+    """
+    Test module for the N+1 and slow query detector
+    """
+
+    def setUp(self):
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        product = Product.objects.create(code="PR001", name="Product 1", price=10)
+        for i in range(3):
+            order = Order.objects.create(code="O00%d" % i, date="2021-01-12T22:39:37+01:00", client=self.client1)
+            order.products.set([product])
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT "a" FROM "t" WHERE "id" IN (%s, %s, %s) AND "code" = \'x\'\n LIMIT 21'),
+            'SELECT "a" FROM "t" WHERE "id" IN (...) AND "code" = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s)'),
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a") SELECT %s UNION ALL SELECT %s'),
+            fingerprint('INSERT INTO "t" ("a") SELECT %s'),
+        )
+
+    def test_n_plus_one(self):
+        # Order.total_price() reads the lines of each order without a prefetch
+        with self.assertRaises(AssertionError) as context:
+            with self.assertQueryBudget():
+                [order.total_price() for order in Order.objects.all()]
+        self.assertIn("N+1 query, 3 x", str(context.exception))
+        self.assertIn("from core/models.py:", str(context.exception))
+
+        with self.assertQueryBudget(queries=2):
+            [order.total_price() for order in Order.objects.prefetch_related("lines")]
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(queries=1):
+                list(Order.objects.prefetch_related("lines"))
+
+    def test_slow_query(self):
+        with self.assertRaises(AssertionError) as context:
+            with self.assertQueryBudget(slow_ms=0):
+                Order.objects.count()
+        self.assertIn("slow query", str(context.exception))
+
+    @override_settings(API_QUERY_CHECK=True, API_QUERY_REPEAT_LIMIT=1, API_BULK_BATCH_SIZE=1)
+    def test_middleware(self):
+        report.reset()
+        items = [{"code": "PR00%d" % i, "name": "Product", "price": 1} for i in range(2)]
+        with self.assertLogs("api.querycheck", "WARNING") as logs:
+            self.client.post(reverse("product-bulk"), data=json.dumps(items), content_type="application/json")
+        self.assertTrue(all(line.startswith("WARNING:api.querycheck:POST product-bulk: N+1 query, 2 x")
+                            for line in logs.output))
+
+        issues = self.client.get(reverse("query-report")).json()["product-bulk"]
+        self.assertEqual(len(issues), len(logs.output))
+        self.assertEqual({issue["kind"] for issue in issues}, {"n+1"})
+        self.assertTrue(all(issue["origin"].startswith("core/") for issue in issues))
+
+
+class RepriceTest(QueryCheckMixin, TestCase):
+    """
+    Test module for repricing products
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client1 = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        for i in range(10):
+            Product.objects.create(code="PR%03d" % i, name="Product %d" % i, family="F%d" % (i % 2), price=10 + i)
+        self.order = Order.objects.create(code="O001", date="2021-01-12T22:39:37+01:00", client=self.client1)
+        self.order.products.set(Product.objects.filter(code__in=["PR001", "PR002"]))
+
+    def prices(self):
+        return dict(Product.objects.values_list("code", "price"))
+
+    def reprice(self, data, **filters):
+        url = reverse("product-reprice")
+        if filters:
+            url += "?" + "&".join("%s=%s" % item for item in filters.items())
+        return self.client.post(url, data=json.dumps(data), content_type="application/json")
+
+    def test_reprice_percent(self):
+        before = self.prices()
+        # cached before the change
+        self.client.get(reverse(PRODUCT_DETAIL, kwargs={"pk": Product.objects.get(code="PR001").pk}))
+        with self.settings(API_REPRICE_CHUNK_SIZE=2), self.assertQueryBudget(queries=30, repeat_limit=4):
+            response = self.reprice({"percent": 10}, family="F1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["products"], 5)
+        self.assertEqual(response.data["chunks"], 3)
+        self.assertIn("products_per_second", response.data)
+        after = self.prices()
+        for code, price in before.items():
+            expected = round(price * 1.1, 2) if int(code[2:]) % 2 else price
+            self.assertEqual(after[code], expected)
+        response = self.client.get(reverse(PRODUCT_DETAIL, kwargs={"pk": Product.objects.get(code="PR001").pk}))
+        self.assertEqual(response.data["price"], after["PR001"])
+        # the orders keep the prices they were ordered at
+        self.assertEqual(Order.objects.get().total, 23)
+        self.assertFalse(Order.objects.mismatched_totals().exists())
+        self.assertEqual(
+            Change.objects.filter(model="product", object_pk__in=Product.objects.filter(family="F1")).count(),
+            5 * 2,
+        )
+
+    def test_reprice_amount(self):
+        response = self.reprice({"amount": -1.1}, price__gt=15)
+        self.assertEqual(response.data["products"], 4)
+        self.assertEqual(self.prices()["PR009"], 17.9)
+        self.assertEqual(self.prices()["PR005"], 15)
+
+    def test_invalid_changes(self):
+        for data in ({}, {"percent": 1, "amount": 1}, {"percent": -101}, {"amount": -11}):
+            response = self.reprice(data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+        self.assertEqual(self.prices()["PR000"], 10)
+
+    def test_lines_without_unit_price(self):
+        line = OrderLine.objects.create(order=self.order, product=Product.objects.get(code="PR005"))
+        self.assertIsNone(line.unit_price)
+        call_command("reprice_products", "--percent=100", "--filter=code=PR005", stdout=StringIO())
+        line.refresh_from_db()
+        self.assertEqual(line.unit_price, 15)
+        self.assertEqual(Product.objects.get(code="PR005").price, 30)
+        self.assertEqual(Order.objects.get().total, 38)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("reprice_products", "--amount=2", "--filter=family=F0", "--chunk-size=1", stdout=out)
+        self.assertIn("Repriced 5 products in 6 chunks", out.getvalue())
+        self.assertEqual(self.prices()["PR000"], 12)
+        with self.assertRaises(CommandError):
+            call_command("reprice_products", "--amount=-20", stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("reprice_products", "--amount=1", "--filter=family", stdout=StringIO())
+
+
+class JobTest(TestCase):
+    """
+    Test module for the background jobs
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir)
+        settings = override_settings(API_JOB_RESULTS_DIR=self.results_dir, API_JOB_RETRY_DELAY=10)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for i in range(5):
+            Product.objects.create(code="PR%03d" % i, name="Product %d" % i, family="F%d" % (i % 2), price=10 + i)
+
+    def submit(self, name, data=None, **kwargs):
+        return self.client.post(reverse(name, kwargs=kwargs), data=json.dumps(data), content_type="application/json")
+
+    def run_jobs(self):
+        call_command("run_jobs", "--workers=1", "--burst", stdout=StringIO())
+
+    def test_bulk_job(self):
+        items = [{"code": "PR%03d" % i, "name": "New %d" % i, "price": i} for i in range(3, 8)]
+        items.insert(2, {"code": "BAD", "name": "No price"})
+        with self.settings(API_BULK_BATCH_SIZE=2):
+            response = self.submit("client-bulk-job", items[:1])
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            response = self.submit("product-bulk-job", items)
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data["status"], "queued")
+            self.assertEqual(response["Location"], response.data["url"])
+            self.run_jobs()
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.data["status"], "succeeded")
+        self.assertEqual((response.data["progress"], response.data["total"]), (6, 6))
+        result = response.data["result"]
+        self.assertEqual(result["counts"], {"updated": 2, "created": 3, "invalid": 1})
+        self.assertEqual([item["index"] for item in result["results"]], list(range(6)))
+        self.assertEqual(result["results"][2]["status"], "invalid")
+        self.assertEqual(Product.objects.get(code="PR004").name, "New 4")
+        self.assertEqual(Product.objects.count(), 8)
+
+    def test_export_job(self):
+        response = self.submit("product-export-job", export_format="csv")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        url = reverse("product-export-job", kwargs={"export_format": "ndjson"}) + "?family=F0"
+        response = self.client.post(url)
+        self.run_jobs()
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.data["status"], "succeeded")
+        self.assertEqual(response.data["progress"], 3)
+        self.assertEqual(response.data["result"]["rows"], 3)
+        download = self.client.get(response.data["result"]["url"])
+        self.assertEqual(download["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="product.ndjson"', download["Content-Disposition"])
+        expected = self.client.get(reverse("product-export", kwargs={"export_format": "ndjson"}) + "?family=F0")
+        self.assertEqual(b"".join(download.streaming_content), b"".join(expected.streaming_content))
+
+    def test_invalid_submissions(self):
+        response = self.submit("product-bulk-job", {"code": "PR100"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        url = reverse("order-export-job", kwargs={"export_format": "csv"}) + "?date__gte=yesterday"
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Job.objects.exists())
+
+    def test_retries(self):
+        calls = []
+
+        @task("flaky")
+        def flaky(job):
+            calls.append(job.attempts)
+            if len(calls) < 3:
+                raise ValueError("attempt %d" % len(calls))
+            return {"calls": len(calls)}
+
+        self.addCleanup(TASKS.pop, "flaky")
+        job = enqueue("flaky", max_attempts=3)
+        with self.assertLogs("core.jobs", "ERROR"):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("queued", 1))
+        self.assertGreater(job.run_after, timezone.now() + datetime.timedelta(seconds=9))
+        response = self.client.get(reverse("job-detail", kwargs={"pk": job.pk}))
+        self.assertEqual(response.data["error"], "ValueError: attempt 1")
+        self.assertEqual(self.client.get(reverse("job-result", kwargs={"pk": job.pk})).status_code, 404)
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs("core.jobs", "ERROR"):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertGreater(job.run_after, timezone.now() + datetime.timedelta(seconds=19))
+        Job.objects.update(run_after=timezone.now())
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.get_result()), ("succeeded", 3, {"calls": 3}))
+        self.assertEqual(calls, [1, 2, 3])
+
+        calls.clear()
+        job = enqueue("flaky", max_attempts=1)
+        with self.assertLogs("core.jobs", "ERROR"):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_jobs(self):
+        old = timezone.now() - datetime.timedelta(hours=1)
+        stale = enqueue("bulk", {"model": "product", "items": []}, max_attempts=2)
+        lost = enqueue("bulk", {"model": "product", "items": []}, max_attempts=1)
+        Job.objects.update(status="running", attempts=1, heartbeat_at=old)
+        self.assertEqual(requeue_stale(), 2)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, "queued")
+        self.assertEqual(Job.objects.get(pk=lost.pk).status, "failed")
+        self.assertEqual(claim("worker").pk, stale.pk)
+        self.assertIsNone(claim("worker"))
+        with self.assertRaises(ValueError):
+            enqueue("unknown")
+
+
+class JobHeartbeatTest(TransactionTestCase):
+    """
+    Test module for the progress saved while a job runs
+    """
+
+    @override_settings(API_JOB_HEARTBEAT=0.01)
+    def test_progress_saved_while_running(self):
+        seen = []
+
+        @task("slow")
+        def slow(job):
+            job.set_progress(1, 2)
+            for _ in range(200):
+                saved = Job.objects.values_list("progress", "total").get(pk=job.pk)
+                if saved == (1, 2):
+                    break
+                time.sleep(0.01)
+            seen.append(saved)
+            job.set_progress(2)
+            return None
+
+        self.addCleanup(TASKS.pop, "slow")
+        job = enqueue("slow")
+        call_command("run_jobs", "--workers=1", "--burst", stdout=StringIO())
+        self.assertEqual(seen, [(1, 2)])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.total), ("succeeded", 2, 2))
+        self.assertIsNone(job.get_result())
+
+
+class ConvertOrderProductsTest(TestCase):
+    """
+    Test module for converting the orders of a database created before the order lines
+    """
+
+    def setUp(self):
+        client = Client.objects.create(
+            code="CL001",
+            first_name="client1",
+            last_name="client1",
+            address="Batna, Algeria",
+            date_of_birth="1990-01-01",
+            mobile_phone1="0123456789",
+        )
+        self.product1 = Product.objects.create(code="PR001", name="Product 1", price=200)
+        self.product2 = Product.objects.create(code="PR002", name="Product 2", price=450)
+        self.order1 = Order.objects.create(code="O001", date="2021-01-12T22:39:37+01:00", client=client)
+        self.order2 = Order.objects.create(code="O002", date="2021-01-12T22:39:37+01:00", client=client)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE core_order_products (id integer PRIMARY KEY, order_id integer, product_id integer)"
+            )
+            cursor.executemany("INSERT INTO core_order_products (order_id, product_id) VALUES (%s, %s)", [
+                (self.order1.pk, self.product1.pk),
+                (self.order1.pk, self.product2.pk),
+                (self.order2.pk, self.product2.pk),
+            ])
+
+    def convert(self, *args):
+        out = StringIO()
+        call_command("convert_order_products", *args, stdout=out)
+        return out.getvalue()
+
+    def test_convert(self):
+        # a line already converted keeps its quantity and price
+        OrderLine.objects.create(order=self.order2, product=self.product2, quantity=2, unit_price=400)
+        self.assertIn("Converted 2 order products to lines, 2 order totals", self.convert())
+        self.assertEqual(
+            sorted(OrderLine.objects.values_list("order__code", "product__code", "quantity", "unit_price")),
+            [("O001", "PR001", 1, 200), ("O001", "PR002", 1, 450), ("O002", "PR002", 2, 400)],
+        )
+        self.assertEqual(Order.objects.get(code="O001").total, 650)
+        self.assertEqual(Order.objects.get(code="O002").total, 800)
+        self.assertIn("Converted 0 order products", self.convert("--drop"))
+        self.assertNotIn("core_order_products", connection.introspection.table_names())
+        with self.assertRaises(CommandError):
+            self.convert()
@@ -3,14 +3,27 @@ from django.views.generic import RedirectView
 from rest_framework.routers import DefaultRouter
 
 from api import views
+from api.analytics import SalesReportView
+from api.changes import ChangeFeedView
+from api.jobs import JobViewSet
+from api.metrics import metrics_view
+from api.querycheck import query_report
+from api.search import SearchView
 
 router = DefaultRouter()
 
 router.register('product', views.ProductViewSet, basename='product')
 router.register('client', views.ClientViewSet, basename='client')
 router.register('order', views.OrderViewSet, basename='order')
+router.register('jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('', RedirectView.as_view(url="/admin/"), name='home'),
+    path('analytics/<str:report>/', SalesReportView.as_view(), name='sales-report'),
+    path('cache/stats/', views.cache_stats, name='cache-stats'),
+    path('changes/<str:model>/', ChangeFeedView.as_view(), name='change-feed'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('queries/report/', query_report, name='query-report'),
+    path('search/', SearchView.as_view(), name='search'),
     path('', include(router.urls)),
 ]
@@ -1,19 +1,209 @@
-from rest_framework import viewsets
+from collections import defaultdict
 
-from core.models import Product, Client, Order
-from core.serializers import ProductSerializer, ClientSerializer, OrderSerializer
+from django.db.models import Prefetch
+from rest_framework import filters, viewsets
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
 
+from api import cache
+from api.analytics import schedule_rollups_refresh
+from api.bulk import BulkUpsertMixin
+from api.conditional import ConditionalGetMixin
+from api.exports import ExportMixin
+from api.fastpath import FastListMixin
+from api.filters import LookupFilterBackend
+from api.jobs import JobSubmitMixin
+from api.metrics import SerializeTimingMixin
+from api.pricing import RepriceMixin
+from api.replicas import ReplicaReadMixin
+from core import bulk
+from core.models import Product, Client, Order, OrderLine
+from core.serializers import (
+    ProductSerializer, ClientSerializer, OrderSerializer,
+    ProductBulkSerializer, ClientBulkSerializer, OrderBulkSerializer,
+    query_param_set,
+)
 
-class ProductViewSet(viewsets.ModelViewSet):
+
+class QueryPlanMixin:
+    """
+    Load what the serializer needs, and only that, so a page costs a fixed
+    number of queries whatever its size: on reads, the columns of the
+    ``fields`` query param with ``only()``, and the relations it reads or
+    expands (``expand`` query param) with ``select_related()`` and
+    ``prefetch_related()``.
+    """
+    select_related = ()
+    prefetch_related = ()
+    # serializer field -> model field it reads, when their names differ
+    field_sources = {}
+
+    def is_read(self):
+        return self.action in ('list', 'retrieve')
+
+    def get_requested_fields(self):
+        return query_param_set(self.request, 'fields') if self.is_read() else None
+
+    def get_expanded_fields(self):
+        expand = query_param_set(self.request, 'expand') if self.is_read() else None
+        return expand or set()
+
+    def wants(self, name):
+        fields = self.get_requested_fields()
+        return not fields or name in fields
+
+    def get_only_fields(self):
+        fields = self.get_requested_fields()
+        if not fields:
+            return None
+        columns = {field.name for field in self.queryset.model._meta.concrete_fields}
+        sources = {self.field_sources.get(name, name) for name in fields}
+        return ['pk'] + sorted(sources & columns)
+
+    def get_select_related(self):
+        return self.select_related
+
+    def get_prefetch_related(self):
+        return self.prefetch_related
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'destroy':
+            # the relations are read again by the delete
+            return queryset
+        only = self.get_only_fields()
+        if only:
+            queryset = queryset.only(*only)
+        select_related = self.get_select_related()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        prefetch_related = self.get_prefetch_related()
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+class ProductViewSet(ReplicaReadMixin, cache.CacheResponseMixin, ConditionalGetMixin, FastListMixin,
+                     SerializeTimingMixin, QueryPlanMixin, BulkUpsertMixin, ExportMixin, JobSubmitMixin,
+                     RepriceMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
+    filter_backends = (LookupFilterBackend,)
+    filter_lookups = ('code', 'family', 'price', 'price__gte', 'price__lte', 'price__gt', 'price__lt')
+    bulk_serializer_class = ProductBulkSerializer
+    bulk_upsert = staticmethod(bulk.upsert_products)
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ReplicaReadMixin, cache.CacheResponseMixin, ConditionalGetMixin, FastListMixin,
+                    SerializeTimingMixin, QueryPlanMixin, BulkUpsertMixin, ExportMixin, JobSubmitMixin,
+                    viewsets.ModelViewSet):
     serializer_class = ClientSerializer
     queryset = Client.objects.all()
+    filter_backends = (LookupFilterBackend,)
+    filter_lookups = ('code', 'last_name', 'company')
+    bulk_serializer_class = ClientBulkSerializer
+    bulk_upsert = staticmethod(bulk.upsert_clients)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, cache.CacheResponseMixin, ConditionalGetMixin, FastListMixin,
+                   SerializeTimingMixin, QueryPlanMixin, BulkUpsertMixin, ExportMixin, JobSubmitMixin,
+                   viewsets.ModelViewSet):
     serializer_class = OrderSerializer
-    queryset = Order.objects.all()
+    bulk_serializer_class = OrderBulkSerializer
+    queryset = Order.objects.with_price()
+    field_sources = {'price': 'total'}
+    filter_backends = (LookupFilterBackend, filters.OrderingFilter)
+    filter_lookups = (
+        'code', 'price', 'price__gte', 'price__lte', 'price__gt', 'price__lt',
+        'date__gte', 'date__lte', 'date__gt', 'date__lt',
+        'client', 'client__code', 'products__code',
+    )
+    ordering_fields = ('code', 'date', 'price')
+    # also the keyset of the cursor pagination, see api.pagination
+    ordering = ('-date', '-id')
+
+    # expandable relation -> basename of its model
+    expanded_basenames = {'client': 'client', 'products': 'product'}
+
+    def get_expanded_basenames(self):
+        return [
+            basename for name, basename in self.expanded_basenames.items()
+            if name in self.get_expanded_fields() and self.wants(name)
+        ]
+
+    def get_cache_dependencies(self):
+        return self.get_expanded_basenames()
+
+    def bulk_upsert(self, items, batch_size):
+        # bulk writes send no model signals
+        statuses = bulk.upsert_orders(items, batch_size)
+        schedule_rollups_refresh()
+        return statuses
+
+    def get_version_fields(self):
+        stamps = ['%s__updated_at' % name for name, basename in self.expanded_basenames.items()
+                  if basename in self.get_expanded_basenames()]
+        return super().get_version_fields() + stamps
+
+    def update(self, request, *args, **kwargs):
+        # as UpdateModelMixin.update(), but keeping the prefetch cache the
+        # serializer filled with the saved lines instead of clearing it
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    def get_select_related(self):
+        if 'client' in self.get_expanded_fields() and self.wants('client'):
+            return ('client',)
+        return ()
+
+    def get_prefetch_related(self):
+        lookups = []
+        if self.wants('products'):
+            if 'products' in self.get_expanded_fields():
+                lookups.append('products')
+            else:
+                # only the PKs are shown
+                lookups.append(Prefetch('products', queryset=Product.objects.only('pk')))
+        if self.wants('lines'):
+            lookups.append('lines')
+        return lookups
+
+    def get_export_fields(self):
+        date = self.get_serializer().fields['date']
+        return [
+            ('code', 'code', None),
+            ('client', 'client_id', None),
+            # the order PK, replaced by its products and lines in get_export_chunks()
+            ('products', 'id', None),
+            ('lines', 'id', None),
+            ('date', 'date', date.to_representation),
+            ('price', 'total', None),
+        ]
+
+    def get_export_chunks(self, queryset, columns, chunk_size):
+        # one query per chunk for the lines of all its orders
+        names = [name for name, _, _ in columns]
+        products_index = names.index('products')
+        lines_index = names.index('lines')
+        for chunk in super().get_export_chunks(queryset, columns, chunk_size):
+            lines = defaultdict(list)
+            rows = OrderLine.objects.filter(
+                order_id__in=[row[lines_index] for row in chunk]
+            ).order_by('pk').values_list('order_id', 'product_id', 'quantity', 'unit_price')
+            for order_id, product_id, quantity, unit_price in rows:
+                lines[order_id].append(
+                    {'product': product_id, 'quantity': quantity, 'unit_price': unit_price}
+                )
+            for row in chunk:
+                order_lines = lines[row[lines_index]]
+                row[products_index] = [line['product'] for line in order_lines]
+                row[lines_index] = order_lines
+            yield chunk
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    return Response(cache.get_stats())
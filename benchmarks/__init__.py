@@ -0,0 +1,7 @@
+"""
+Benchmarks of the API and its queries, run as modules from the project
+root, e.g. ``python -m benchmarks.search --rows 1000000``.
+
+Each benchmark creates a throwaway database, fills it and prints its
+results as JSON.
+"""
@@ -0,0 +1,88 @@
+"""
+Compare the sales reports computed from the orders and their lines with
+the ones read from the rollups, and time the rollup refreshes.
+
+    python -m benchmarks.analytics --lines 1000000
+
+The orders of ``--clients`` clients have ``--lines-per-order`` lines of
+``--products`` products on average, and are spread over ``--days`` days,
+see ``core.seed``.
+"""
+import argparse
+import datetime
+import math
+import time
+
+from benchmarks.utils import report, setup, summary, temporary_database, timed
+
+
+def same(rows, other):
+    # the rollups add up per day sums, so the revenues may differ in the
+    # last digits, and so the order of equal revenues
+    key = sorted(rows[0]) if rows else None
+    rows, other = (sorted(items, key=lambda row: [row[name] for name in key]) for items in (rows, other))
+    return len(rows) == len(other) and all(
+        row.keys() == item.keys() and all(
+            math.isclose(value, item[key]) if isinstance(value, float) else value == item[key]
+            for key, value in row.items()
+        )
+        for row, item in zip(rows, other)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--lines-per-order', type=int, default=5)
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--changed', type=int, default=100,
+                        help='Orders changed before the incremental refresh.')
+    args = parser.parse_args()
+
+    setup()
+    from core.analytics import REPORTS, rebuild_rollups, refresh_rollups, sales_report
+    from core.models import Order
+    from core.seed import seed_data
+
+    with temporary_database():
+        counts = seed_data(args.lines, args.products, args.clients, args.lines_per_order, args.days)
+        results = {'orders': counts['orders'], 'lines': counts['lines'], 'reports': {}}
+
+        start = time.perf_counter()
+        rebuild_rollups()
+        results['full_rebuild_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+        last = Order.objects.order_by('-date').values_list('date', flat=True).first().date()
+        ranges = {'all': (None, None), 'last_30_days': (last - datetime.timedelta(days=29), last)}
+        for name in REPORTS:
+            for range_name, (first, end) in ranges.items():
+                limit = 10 if name in ('clients', 'products') else None
+                assert same(sales_report(name, first, end), sales_report(name, first, end, rollups=True))
+                results['reports']['%s_%s' % (name, range_name)] = {
+                    'live': summary(timed(lambda: sales_report(name, first, end, limit), args.repeat)),
+                    'rollups': summary(timed(
+                        lambda: sales_report(name, first, end, limit, rollups=True), args.repeat
+                    )),
+                }
+
+        # orders saved one by one, like the API does: the latest ones, in a
+        # couple of days, then ones scattered over all the days
+        results['incremental_refresh'] = {}
+        for name, orders in [('latest', Order.objects.order_by('-date')),
+                             ('scattered', Order.objects.order_by('?'))]:
+            for order in orders[:args.changed]:
+                order.save()
+            start = time.perf_counter()
+            read = refresh_rollups()
+            results['incremental_refresh'][name] = {
+                'changes': read, 'ms': round((time.perf_counter() - start) * 1000, 3),
+            }
+        results['fresh_check'] = summary(timed(refresh_rollups, args.repeat))
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
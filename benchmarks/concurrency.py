@@ -0,0 +1,141 @@
+"""
+Serve concurrent slow clients through the WSGI handler with a pool of
+threads, the stock Django ASGI handler and ``api.asgi.ReadPoolASGIHandler``.
+
+Every client asks for a page of products, then takes ``--delay`` seconds
+to receive each chunk of the response, like a slow network does: a WSGI
+thread is held while it writes to the client, an ASGI coroutine is not.
+``--query-latency`` adds a delay to every query, like a database server
+over the network does: the stock ASGI handler runs the views one at a time.
+
+    python -m benchmarks.concurrency --clients 2000 --delay 0.5 --query-latency 0.002
+"""
+import argparse
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.serializers import fill
+from benchmarks.utils import report, setup, temporary_database
+
+PATH = '/product/'
+QUERY = 'page_size=50'
+
+
+def wsgi_environ():
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': PATH, 'QUERY_STRING': QUERY, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        'wsgi.version': (1, 0),
+    }
+
+
+def run_wsgi(clients, delay, threads):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    statuses = []
+
+    def serve():
+        response = handler(wsgi_environ(), lambda status, headers: statuses.append(status))
+        try:
+            for _ in response:
+                time.sleep(delay)
+        finally:
+            response.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(serve) for _ in range(clients)]:
+            future.result()
+    return statuses.count('200 OK')
+
+
+def run_asgi(handler, clients, delay):
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': PATH, 'query_string': QUERY.encode(),
+        'headers': [(b'host', b'localhost')],
+    }
+
+    async def serve():
+        status = []
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            else:
+                await asyncio.sleep(delay)
+
+        await handler(scope, receive, send)
+        return status[0]
+
+    async def main():
+        return await asyncio.gather(*[serve() for _ in range(clients)])
+
+    return asyncio.run(main()).count(200)
+
+
+def measure(function, clients):
+    start = time.perf_counter()
+    ok = function()
+    elapsed = time.perf_counter() - start
+    return {'ok': ok, 'seconds': round(elapsed, 3), 'requests_per_second': round(clients / elapsed, 1)}
+
+
+def add_query_latency(latency):
+    from django.db.backends.signals import connection_created
+
+    def execute(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def receiver(sender, connection, **kwargs):
+        connection.execute_wrappers.append(execute)
+
+    # weak=False: the receiver is a closure
+    connection_created.connect(receiver, weak=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--delay', type=float, default=0.05)
+    parser.add_argument('--wsgi-threads', type=int, default=32)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--query-latency', type=float, default=0)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test.utils import override_settings
+
+    from api.asgi import ReadPoolASGIHandler
+
+    # every request reaches the database
+    with temporary_database(), override_settings(API_CACHE_ENABLED=False, ALLOWED_HOSTS=['localhost']):
+        fill(args.rows)
+        if args.query_latency:
+            add_query_latency(args.query_latency)
+        results = {
+            'clients': args.clients,
+            'delay': args.delay,
+            'query_latency': args.query_latency,
+            'wsgi': measure(lambda: run_wsgi(args.clients, args.delay, args.wsgi_threads), args.clients),
+            'asgi': measure(lambda: run_asgi(ASGIHandler(), args.clients, args.delay), args.clients),
+            'asgi_read_pool': measure(
+                lambda: run_asgi(ReadPoolASGIHandler(), args.clients, args.delay), args.clients
+            ),
+        }
+        results['wsgi']['threads'] = args.wsgi_threads
+        results['asgi_read_pool']['threads'] = settings.API_READ_THREADS
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure the overhead of ``api.metrics.MetricsMiddleware``: the same
+requests with ``API_METRICS_ENABLED`` on and off, taken in turns so both
+see the same machine load.
+
+    python -m benchmarks.metrics --lines 100000 --repeat 500
+"""
+import argparse
+import time
+
+from benchmarks.utils import report, setup, summary, temporary_database
+
+ROUTES = [
+    ('product-detail', {'pk': 1}),
+    ('product-list', {}),
+    ('order-detail', {'pk': 1}),
+    ('order-list', {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    from core.seed import seed_data
+
+    results = {}
+    with temporary_database(), override_settings(API_CACHE_ENABLED=False, ALLOWED_HOSTS=['testserver']):
+        seed_data(args.lines)
+        client = Client()
+        for name, kwargs in ROUTES:
+            path = reverse(name, kwargs=kwargs)
+            durations = {True: [], False: []}
+            for run in range(args.repeat * 2 + 2):
+                enabled = bool(run % 2)
+                with override_settings(API_METRICS_ENABLED=enabled):
+                    start = time.perf_counter()
+                    client.get(path)
+                    # the first request of each is a warm up
+                    if run >= 2:
+                        durations[enabled].append((time.perf_counter() - start) * 1000)
+            off, on = summary(durations[False]), summary(durations[True])
+            results[name] = {
+                'disabled': off,
+                'enabled': on,
+                'overhead_ms': round(on['p50_ms'] - off['p50_ms'], 3),
+                'overhead_percent': round((on['p50_ms'] - off['p50_ms']) / off['p50_ms'] * 100, 1),
+            }
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Time repricing products with ``core.pricing.reprice()``, a family and
+then the whole catalog, against updating them one by one with a ``PATCH``
+request each, timed on a sample and extrapolated.
+
+    python -m benchmarks.pricing --products 1000000 --sample 200
+"""
+import argparse
+import json
+import time
+
+from benchmarks.utils import report, setup, summary, temporary_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--sample', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    from core.models import Product
+    from core.pricing import reprice
+    from core.seed import seed_data
+
+    results = {}
+    with temporary_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+        seed_data(args.lines, products=args.products)
+        family = Product.objects.values_list('family', flat=True).first()
+
+        for name, queryset in (('family', Product.objects.filter(family=family)), ('all', Product.objects.all())):
+            result = reprice(queryset, percent=5, chunk_size=args.chunk_size)
+            results['reprice_%s' % name] = {
+                'products': result['products'],
+                'chunks': result['chunks'],
+                'seconds': round(result['seconds'], 3),
+                'products_per_second': round(result['products'] / result['seconds']),
+            }
+
+        client = Client()
+        products = iter(Product.objects.values_list('pk', 'price')[:args.sample])
+
+        def patch():
+            pk, price = next(products)
+            client.patch(reverse('product-detail', kwargs={'pk': pk}),
+                         data=json.dumps({'price': round(price * 1.05, 2)}), content_type='application/json')
+
+        start = time.perf_counter()
+        durations = timed(patch, args.sample)
+        per_product = (time.perf_counter() - start) / args.sample
+        results['patch_each'] = {
+            **summary(durations),
+            'products_per_second': round(1 / per_product),
+            'extrapolated_seconds_all': round(per_product * args.products, 1),
+        }
+        results['speedup_all'] = round(per_product * args.products / results['reprice_all']['seconds'], 1)
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
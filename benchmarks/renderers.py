@@ -0,0 +1,60 @@
+"""
+Compare the stdlib and orjson encoding and decoding of product, client
+and order pages, as rendered by the API.
+
+    python -m benchmarks.renderers --page-size 1000
+"""
+import argparse
+from io import BytesIO
+
+from benchmarks.serializers import fill
+from benchmarks.utils import report, setup, summary, temporary_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from api.parsers import FastJSONParser
+    from api.renderers import FastJSONRenderer, use_orjson
+    from core.fastpath import compile_serializer
+    from core.models import Client, Order, Product
+    from core.serializers import ClientSerializer, OrderSerializer, ProductSerializer
+
+    if not use_orjson():
+        raise SystemExit('orjson is not installed or API_JSON_BACKEND is not orjson')
+
+    cases = {
+        'product': (ProductSerializer, Product),
+        'client': (ClientSerializer, Client),
+        'order': (OrderSerializer, Order),
+    }
+    with temporary_database():
+        fill(args.page_size)
+        results = {'page_size': args.page_size, 'pages': {}}
+        for name, (serializer_class, model) in cases.items():
+            fast = compile_serializer(serializer_class())
+            page = {'next': None, 'previous': None,
+                    'results': fast.serialize(fast.values(model.objects.all()))}
+            body = JSONRenderer().render(page)
+            assert JSONParser().parse(BytesIO(body)) == FastJSONParser().parse(BytesIO(body))
+
+            timings = {
+                'encode_stdlib': timed(lambda: JSONRenderer().render(page), args.repeat),
+                'encode_orjson': timed(lambda: FastJSONRenderer().render(page), args.repeat),
+                'decode_stdlib': timed(lambda: JSONParser().parse(BytesIO(body)), args.repeat),
+                'decode_orjson': timed(lambda: FastJSONParser().parse(BytesIO(body)), args.repeat),
+            }
+            results['pages'][name] = {key: summary(durations) for key, durations in timings.items()}
+            results['pages'][name]['bytes'] = len(body)
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
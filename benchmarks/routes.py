@@ -0,0 +1,200 @@
+"""
+Measure every route of the ``DefaultRouter`` of ``api.urls`` through the
+whole Django stack: latency percentiles, queries per request, peak
+memory allocated while serving a request and response size.
+
+    python -m benchmarks.routes --lines 100000 --repeat 50
+
+The database is filled by ``core.seed``. Reads go over random rows; the
+writes do not change the data: ``create`` adds rows that ``destroy``
+deletes, ``update``, ``partial_update`` and ``bulk`` write rows back as
+they were read and ``reprice`` changes the prices by 0 %. The ``jobs/``
+routes only queue their jobs, which no worker runs; the job routes read
+a product export job run before the measures. The response cache is
+disabled unless ``--cache`` is given.
+"""
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from benchmarks.utils import report, setup, summary, temporary_database
+
+# action -> the kwargs of its URL variants, besides the PK
+VARIANTS = {
+    'export': [{'export_format': 'ndjson'}, {'export_format': 'csv'}],
+    'export_job': [{'export_format': 'ndjson'}, {'export_format': 'csv'}],
+}
+# writes that need the rows of another one run after it
+LAST = ('destroy',)
+
+
+def router_routes(router):
+    """
+    Return ``(basename, url name, action, method, detail)`` for each route
+    of ``router``, the API root included.
+    """
+    routes = [(None, router.root_view_name, 'root', 'get', False)]
+    for _, viewset, basename in router.registry:
+        for route in router.get_routes(viewset):
+            for method, action in route.mapping.items():
+                if hasattr(viewset, action):
+                    routes.append((basename, route.name.format(basename=basename), action, method, route.detail))
+    return sorted(routes, key=lambda route: route[2] in LAST)
+
+
+class Requests:
+    """
+    The requests of the routes of ``model``: ``make()`` returns the next
+    ``(method, path, data)`` of a route.
+    """
+
+    def __init__(self, client, model, basename, bulk_size):
+        self.client = client
+        self.model = model
+        self.basename = basename
+        self.bulk_size = bulk_size
+        self.pks = [None] if model is None else list(model.objects.values_list('pk', flat=True))
+        self.created = []
+        self.counter = 0
+
+    def detail_path(self, pk):
+        return reverse('%s-detail' % self.basename, kwargs={'pk': pk})
+
+    def read(self, pk):
+        return self.client.get(self.detail_path(pk)).json()
+
+    def make(self, action, method, name, detail, kwargs):
+        pk = random.choice(self.pks)
+        path = reverse(name, kwargs=dict(kwargs, pk=pk) if detail else kwargs)
+        if action == 'create':
+            # a row as the API reads it, its read only fields being ignored
+            self.counter += 1
+            return method, path, dict(self.read(pk), code='B%09d' % self.counter)
+        if action == 'destroy':
+            return method, self.detail_path(self.created.pop()), None
+        if action == 'update':
+            return method, path, self.read(pk)
+        if action == 'partial_update':
+            return method, path, {'code': self.read(pk)['code']}
+        if action in ('bulk', 'bulk_job'):
+            page = self.client.get(reverse('%s-list' % self.basename), {'page_size': self.bulk_size}).json()
+            return method, path, page['results']
+        if action == 'reprice':
+            return method, path, {'percent': 0}
+        return method, path, None
+
+    def sent(self, action, response):
+        # the created rows are deleted by ``destroy``
+        if action == 'create' and response.status_code == 201:
+            self.created.append(self.model.objects.get(code=response.json()['code']).pk)
+
+
+def send(client, method, path, data):
+    """
+    Send a request and return the response and its size, the content of
+    streaming responses being read too.
+    """
+    if data is None:
+        response = getattr(client, method)(path)
+    else:
+        response = getattr(client, method)(path, json.dumps(data), content_type='application/json')
+    if response.streaming:
+        return response, sum(len(chunk) for chunk in response.streaming_content)
+    return response, len(response.content)
+
+
+def measure(client, requests, route, repeat, warmup):
+    action = route[0]
+    for _ in range(warmup):
+        response, _ = send(client, *requests.make(*route))
+        requests.sent(action, response)
+
+    durations, queries, sizes, statuses = [], [], [], {}
+    for run in range(repeat + 1):
+        request = requests.make(*route)
+        # the last run is traced only, as tracing slows everything down
+        traced = run == repeat
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            response, size = send(client, *request)
+            elapsed = (time.perf_counter() - start) * 1000
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        requests.sent(action, response)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if not traced:
+            durations.append(elapsed)
+            queries.append(sum(len(context) for context in captured))
+            sizes.append(size)
+
+    return dict(
+        summary(durations),
+        queries=max(queries),
+        queries_min=min(queries),
+        peak_memory_kb=round(peak / 1024, 1),
+        response_bytes=round(sum(sizes) / len(sizes)),
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--bulk-size', type=int, default=100, help='Rows of the bulk requests.')
+    parser.add_argument('--cache', action='store_true', help='Keep the response cache enabled.')
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.test import Client
+
+    from api.urls import router
+    from core.jobs import enqueue, work
+    from core.seed import seed_data
+
+    random.seed(0)
+    overrides = {'ALLOWED_HOSTS': ['testserver']}
+    if not args.cache:
+        overrides['API_CACHE_ENABLED'] = False
+    overrides['API_JOB_RESULTS_DIR'] = tempfile.mkdtemp()
+    with ExitStack() as stack:
+        stack.callback(shutil.rmtree, overrides['API_JOB_RESULTS_DIR'])
+        stack.enter_context(temporary_database())
+        stack.enter_context(override_settings(**overrides))
+        counts = seed_data(args.lines)
+        # the job read by the job routes, with a file to download
+        enqueue('export', {'model': 'product', 'format': 'csv', 'query': {}})
+        work(burst=True)
+        client = Client()
+        requests = {None: Requests(client, None, None, args.bulk_size)}
+        for _, viewset, basename in router.registry:
+            requests[basename] = Requests(client, viewset.queryset.model, basename, args.bulk_size)
+
+        results = {'rows': counts, 'cache': args.cache, 'page_size': settings.REST_FRAMEWORK['PAGE_SIZE'],
+                   'routes': {}}
+        for basename, name, action, method, detail in router_routes(router):
+            for kwargs in VARIANTS.get(action, [{}]):
+                key = ' '.join([method.upper(), name, *kwargs.values()])
+                results['routes'][key] = measure(
+                    client, requests[basename], (action, method, name, detail, kwargs), args.repeat, args.warmup,
+                )
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare the FTS5 search with ``icontains`` filters on a large catalog.
+
+    python -m benchmarks.search --rows 1000000
+"""
+import argparse
+import random
+
+from benchmarks.utils import report, setup, summary, temporary_database, timed
+
+WORDS = (
+    'chair table lamp desk sofa shelf cabinet mirror bed stool bench rug '
+    'wooden metal glass blue red green black white small large vintage modern'
+).split()
+
+
+def fill(rows, batch_size=10000):
+    from core.models import Product
+
+    rng = random.Random(0)
+    for start in range(0, rows, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                code='P%09d' % i,
+                name=' '.join(rng.sample(WORDS, 3)),
+                price=rng.randint(1, 1000),
+                remark=' '.join(rng.sample(WORDS, 5)),
+            )
+            for i in range(start, min(rows, start + batch_size))
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    from django.db.models import Q
+
+    from core.models import Product
+    from core.search import search
+
+    with temporary_database():
+        fill(args.rows)
+        queries = ['vint', 'blue chai', 'modern desk']
+        results = {'rows': args.rows, 'queries': {}}
+        for query in queries:
+            words = query.split()
+            condition = Q()
+            for word in words:
+                condition &= Q(name__icontains=word) | Q(remark__icontains=word)
+
+            def fts():
+                return search(Product, query, args.limit)
+
+            def icontains():
+                return list(Product.objects.filter(condition)[:args.limit])
+
+            def icontains_count():
+                return Product.objects.filter(condition).count()
+
+            results['queries'][query] = {
+                'fts5': summary(timed(fts, args.repeat)),
+                'icontains': summary(timed(icontains, args.repeat)),
+                # ranking needs every match, which icontains can only get by a full scan
+                'icontains_all_matches': summary(timed(icontains_count, args.repeat)),
+            }
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
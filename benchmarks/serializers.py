@@ -0,0 +1,91 @@
+"""
+Compare the serializers with the fast path of ``core.fastpath`` on pages
+read from the database, in rows serialized per second.
+
+    python -m benchmarks.serializers --rows 10000
+"""
+import argparse
+import datetime
+import random
+
+from benchmarks.utils import report, setup, summary, temporary_database, timed
+
+
+def fill(rows, batch_size=5000):
+    from core.models import Client, Order, OrderLine, Product
+
+    rng = random.Random(0)
+    for start in range(0, rows, batch_size):
+        stop = min(rows, start + batch_size)
+        Product.objects.bulk_create([
+            Product(code='P%07d' % i, name='Product %d' % i, family='F%03d' % (i % 100),
+                    price=rng.randint(100, 100000) / 100, remark='remark %d' % i)
+            for i in range(start, stop)
+        ])
+        Client.objects.bulk_create([
+            Client(code='C%07d' % i, first_name='First %d' % i, last_name='Last %d' % i,
+                   address='Address %d' % i, date_of_birth=datetime.date(1990, 1, 1),
+                   mobile_phone1='0123456789', email='client%d@example.com' % i)
+            for i in range(start, stop)
+        ])
+    clients = list(Client.objects.values_list('pk', flat=True))
+    products = list(Product.objects.values_list('pk', 'price'))
+    date = datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+    for start in range(0, rows, batch_size):
+        orders = Order.objects.bulk_create([
+            Order(code='O%07d' % i, client_id=rng.choice(clients),
+                  date=date + datetime.timedelta(minutes=i))
+            for i in range(start, min(rows, start + batch_size))
+        ])
+        OrderLine.objects.bulk_create([
+            OrderLine(order_id=order.pk, product_id=pk, quantity=rng.randint(1, 5), unit_price=price)
+            for order in Order.objects.filter(code__in=[o.code for o in orders])
+            for pk, price in rng.sample(products, 3)
+        ])
+    Order.objects.refresh_totals()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from django.db.models import Prefetch
+
+    from core.fastpath import compile_serializer
+    from core.models import Client, Order, Product
+    from core.serializers import ClientSerializer, OrderSerializer, ProductSerializer
+
+    cases = {
+        'product': (ProductSerializer, Product.objects.all()),
+        'client': (ClientSerializer, Client.objects.all()),
+        'order': (OrderSerializer, Order.objects.prefetch_related(
+            Prefetch('products', queryset=Product.objects.only('pk')), 'lines'
+        )),
+    }
+    with temporary_database():
+        fill(args.rows)
+        results = {'rows': args.rows, 'models': {}}
+        for name, (serializer_class, queryset) in cases.items():
+            fast = compile_serializer(serializer_class())
+
+            def drf():
+                return serializer_class(list(queryset.all()), many=True).data
+
+            def fast_path():
+                return fast.serialize(fast.values(queryset.all()))
+
+            assert drf() == fast_path()
+            paths = {'serializer': summary(timed(drf, args.repeat)),
+                     'fast_path': summary(timed(fast_path, args.repeat))}
+            for path in paths.values():
+                path['rows_per_second'] = round(args.rows / path['mean_ms'] * 1000)
+            paths['speedup'] = round(paths['serializer']['mean_ms'] / paths['fast_path']['mean_ms'], 2)
+            results['models'][name] = paths
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
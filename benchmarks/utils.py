@@ -0,0 +1,56 @@
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ER_challenge.settings')
+    django.setup()
+
+
+@contextmanager
+def temporary_database(keepdb=False):
+    """
+    Create and migrate a test database, like ``manage.py test`` does, and
+    destroy it on exit.
+    """
+    from django.db import connection
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def timed(function, repeat):
+    """
+    Call ``function`` ``repeat`` times and return the durations, in ms.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def summary(durations):
+    durations = sorted(durations)
+    return {
+        'runs': len(durations),
+        'mean_ms': round(statistics.mean(durations), 3),
+        'p50_ms': round(durations[len(durations) // 2], 3),
+        'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+        'max_ms': round(durations[-1], 3),
+    }
+
+
+def report(results):
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
@@ -0,0 +1,96 @@
+"""
+Load test of concurrent writes on a SQLite file, with the development and
+the production database profiles (see ``DB_PROFILE`` in the settings).
+
+Each worker process runs request-like units of work, closing its old
+connections after each one like Django does at the end of a request:
+create a product, then list the latest ones.
+
+    python -m benchmarks.writes --workers 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.utils import report, setup
+
+
+def configure(profile, path):
+    os.environ['DB_PROFILE'] = profile
+    os.environ['DB_NAME'] = path
+    setup()
+
+
+def migrate(profile, path):
+    configure(profile, path)
+    from django.core.management import call_command
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def work(profile, path, worker, seconds, results):
+    configure(profile, path)
+    from django.db import OperationalError, close_old_connections, transaction
+
+    from core.models import Product
+
+    writes = errors = 0
+    stop = time.monotonic() + seconds
+    try:
+        while time.monotonic() < stop:
+            try:
+                with transaction.atomic():
+                    Product.objects.create(code='W%02d%06d' % (worker, writes), name='Load test', price=1)
+                list(Product.objects.order_by('-pk')[:20])
+                writes += 1
+            except OperationalError:
+                # "database is locked"
+                errors += 1
+            close_old_connections()
+    finally:
+        results.put((writes, errors))
+
+
+def run(profile, workers, seconds):
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'db.sqlite3')
+        process = context.Process(target=migrate, args=(profile, path))
+        process.start()
+        process.join()
+
+        results = context.Queue()
+        processes = [
+            context.Process(target=work, args=(profile, path, worker, seconds, results))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        counts = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    writes = sum(count[0] for count in counts)
+    return {
+        'writes': writes,
+        'errors': sum(count[1] for count in counts),
+        'writes_per_second': round(writes / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    results = {'workers': args.workers, 'seconds': args.seconds, 'profiles': {}}
+    for profile in ('development', 'production'):
+        results['profiles'][profile] = run(profile, args.workers, args.seconds)
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,16 @@ from django.contrib import admin
 
 from . import models
 
+
+class OrderLineInline(admin.TabularInline):
+    model = models.OrderLine
+    extra = 0
+
+
+class OrderAdmin(admin.ModelAdmin):
+    inlines = (OrderLineInline,)
+
+
 admin.site.register(models.Product)
 admin.site.register(models.Client)
-admin.site.register(models.Order)
+admin.site.register(models.Order, OrderAdmin)
@@ -0,0 +1,278 @@
+"""
+Sales analytics: orders and revenue per day, per month and per client,
+quantities and revenue per product family and per product.
+
+Each report is a ``GROUP BY`` query, either over the orders and their
+lines, or over the ``ClientSales`` and ``ProductSales`` rollups, which
+hold the sums of each day, month and year. A range of days is read from
+the rows of the years it covers in full, then of the months, then of
+its other days, so a report reads at most a few dozen rows per client or
+product whatever the number of orders.
+
+The rollups are kept up to date from the change feed by
+``refresh_rollups()``: only the days the changed orders are or were in,
+and their months and years, are recomputed.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, IntegerField, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncYear
+from django.utils import timezone
+
+from .models import (
+    Order, OrderLine, Change, SalesRollup, ClientSales, ProductSales, RolledUpOrder, RollupCursor,
+)
+from .sql import insert_select
+
+DAY, MONTH, YEAR = SalesRollup.DAY, SalesRollup.MONTH, SalesRollup.YEAR
+
+# from the coarsest
+PERIODS = (YEAR, MONTH, DAY)
+
+# period -> the finer one its rows add up, and its truncation
+LEVELS = {
+    MONTH: (DAY, TruncMonth),
+    YEAR: (MONTH, TruncYear),
+}
+
+ONE_DAY = datetime.timedelta(days=1)
+
+ROLLUP = 'sales'
+
+# report -> ordering of its rows
+REPORTS = {
+    'daily': ('day',),
+    'monthly': ('month',),
+    'clients': ('-revenue', 'client'),
+    'families': ('-revenue', 'family'),
+    'products': ('-revenue', 'product'),
+}
+
+
+def _amount():
+    # to annotate before any ``quantity`` alias, which F('quantity') would name
+    return Coalesce(Sum(F('quantity') * F('unit_price'), output_field=FloatField()), Value(0.0))
+
+
+def period_start(period, day):
+    if period == YEAR:
+        return day.replace(month=1, day=1)
+    if period == MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def next_period(period, day):
+    """
+    Return the start of the period after the one starting on ``day``.
+    """
+    if period == YEAR:
+        return day.replace(year=day.year + 1)
+    if period == MONTH:
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return day + ONE_DAY
+
+
+def day_start(day):
+    """
+    Return the start of ``day`` in the current time zone, which is the one
+    the orders are grouped by.
+    """
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def date_range(lookup, start=None, end=None):
+    """
+    Return the condition on the datetime ``lookup`` selecting the days
+    from ``start`` to ``end`` included, either being optional.
+    """
+    condition = Q()
+    if start is not None:
+        condition &= Q(**{'%s__gte' % lookup: day_start(start)})
+    if end is not None:
+        condition &= Q(**{'%s__lt' % lookup: day_start(end + ONE_DAY)})
+    return condition
+
+
+def _rows_between(start, stop, periods=PERIODS):
+    # rows adding up to the days from start to stop excluded, with the
+    # rows of the coarsest of periods covered in full, then the finer ones
+    period, finer = periods[0], periods[1:]
+    if not finer:
+        condition = Q(period=period)
+        if start is not None:
+            condition &= Q(day__gte=start)
+        if stop is not None:
+            condition &= Q(day__lt=stop)
+        return condition
+
+    first = start
+    if start is not None and period_start(period, start) != start:
+        first = next_period(period, period_start(period, start))
+    last = None if stop is None else period_start(period, stop)
+    if first is not None and last is not None and first >= last:
+        return _rows_between(start, stop, finer)
+    condition = _rows_between(first, last, (period,))
+    if start is not None and start < first:
+        condition |= _rows_between(start, first, finer)
+    if stop is not None and last < stop:
+        condition |= _rows_between(last, stop, finer)
+    return condition
+
+
+def rollup_range(start=None, end=None, periods=PERIODS):
+    """
+    Return the condition selecting the rollup rows that add up to the days
+    from ``start`` to ``end`` included: the rows of the years they cover in
+    full, then of the months, then of the other days, taking the
+    ``periods`` given only.
+    """
+    return _rows_between(start, None if end is None else end + ONE_DAY, periods)
+
+
+def _live(report, start, end):
+    orders = Order.objects.filter(date_range('date', start, end))
+    lines = OrderLine.objects.filter(date_range('order__date', start, end))
+    order_totals = {'orders': Count('pk'), 'revenue': Sum('total')}
+    line_totals = {'revenue': _amount(), 'quantity': Sum('quantity')}
+    if report == 'daily':
+        return orders.values(day=TruncDate('date')).annotate(**order_totals)
+    if report == 'monthly':
+        # of the local day, TruncMonth() would truncate the UTC date to a date
+        return orders.values(month=TruncMonth(TruncDate('date'))).annotate(**order_totals)
+    if report == 'clients':
+        return orders.values('client', client_code=F('client__code')).annotate(**order_totals)
+    if report == 'families':
+        return lines.values(family=F('product__family')).annotate(**line_totals)
+    return lines.values('product', product_code=F('product__code')).annotate(**line_totals)
+
+
+def _rolled_up(report, start, end):
+    order_totals = {'orders': Sum('orders'), 'revenue': Sum('revenue')}
+    line_totals = {'quantity': Sum('quantity'), 'revenue': Sum('revenue')}
+    totals = ClientSales.objects.filter(client=None)
+    if report == 'daily':
+        return totals.filter(rollup_range(start, end, (DAY,))).values('day').annotate(**order_totals)
+    if report == 'monthly':
+        rows = totals.filter(rollup_range(start, end, (MONTH, DAY)))
+        return rows.values(month=TruncMonth('day')).annotate(**order_totals)
+    if report == 'clients':
+        return ClientSales.objects.filter(rollup_range(start, end), client__isnull=False).values(
+            'client', client_code=F('client__code'),
+        ).annotate(**order_totals)
+    rows = ProductSales.objects.filter(rollup_range(start, end))
+    if report == 'families':
+        return rows.values(family=F('product__family')).annotate(**line_totals)
+    return rows.values('product', product_code=F('product__code')).annotate(**line_totals)
+
+
+def sales_report(report, start=None, end=None, limit=None, rollups=False):
+    """
+    Return the rows of ``report``, one of ``REPORTS``, over the days from
+    ``start`` to ``end`` included, read from the rollups when ``rollups``
+    is true. ``limit`` keeps the first rows only, the best ones except
+    for the ``daily`` and ``monthly`` reports.
+    """
+    rows = (_rolled_up if rollups else _live)(report, start, end).order_by(*REPORTS[report])
+    if limit is not None:
+        rows = rows[:limit]
+    return list(rows)
+
+
+def _rebuild(days=None):
+    """
+    Recompute the rollup rows of ``days`` and of their months and years,
+    or all of them when None, from the days ``RolledUpOrder`` holds.
+    """
+    orders, lines = Order.objects.all(), OrderLine.objects.all()
+    client_sales, product_sales = ClientSales.objects.all(), ProductSales.objects.all()
+    stale = {DAY: days}
+    if days is not None:
+        if not days:
+            return
+        rolled_up = RolledUpOrder.objects.filter(day__in=days).values('order_id')
+        orders = orders.filter(pk__in=rolled_up)
+        lines = lines.filter(order__in=rolled_up)
+        condition = Q(period=DAY, day__in=days)
+        for period, (finer, _) in LEVELS.items():
+            stale[period] = {period_start(period, day) for day in stale[finer]}
+            condition |= Q(period=period, day__in=stale[period])
+        client_sales, product_sales = client_sales.filter(condition), product_sales.filter(condition)
+    # no signal is sent for the rollups, so no need to load the rows first
+    client_sales._raw_delete(client_sales.db)
+    product_sales._raw_delete(product_sales.db)
+
+    order_totals = {'orders': Count('pk'), 'revenue': Sum('total')}
+    insert_select(ClientSales, orders.values('client', day=TruncDate('date')).annotate(**order_totals),
+                  values={'period': DAY})
+    insert_select(ClientSales, orders.values(day=TruncDate('date')).annotate(**order_totals),
+                  values={'period': DAY})
+    insert_select(ProductSales, lines.values('product', day=TruncDate('order__date')).annotate(
+        revenue=_amount(), quantity=Sum('quantity'),
+    ), values={'period': DAY})
+
+    # the months add up their days and the years their months, totals included
+    for period, (finer, trunc) in LEVELS.items():
+        for model, field, totals in [
+            (ClientSales, 'client', {'orders': Sum('orders'), 'revenue': Sum('revenue')}),
+            (ProductSales, 'product', {'revenue': Sum('revenue'), 'quantity': Sum('quantity')}),
+        ]:
+            rows = model.objects.filter(period=finer)
+            if days is not None:
+                periods = Q(pk__in=[])
+                for start in stale[period]:
+                    periods |= Q(day__gte=start, day__lt=next_period(period, start))
+                rows = rows.filter(periods)
+            rows = rows.values(field, start=trunc('day')).annotate(**totals)
+            insert_select(model, rows, columns={'start': 'day'}, values={'period': period})
+
+
+def refresh_rollups(batch_size=500):
+    """
+    Bring the rollups up to date with the orders changed since the last
+    refresh, ``batch_size`` change feed entries at a time, and return the
+    number of entries read.
+    """
+    changes = Change.objects.filter(model=Order._meta.model_name)
+    # one query, outside of any transaction, when the rollups are fresh
+    seq = RollupCursor.objects.filter(name=ROLLUP).values('seq')
+    if not changes.filter(pk__gt=Coalesce(Subquery(seq, output_field=IntegerField()), Value(0))).exists():
+        return 0
+
+    read = 0
+    with transaction.atomic():
+        cursor, _ = RollupCursor.objects.select_for_update().get_or_create(name=ROLLUP)
+        while True:
+            entries = list(
+                changes.filter(pk__gt=cursor.seq).order_by('pk').values_list('pk', 'object_pk')[:batch_size]
+            )
+            if not entries:
+                break
+            pks = {pk for _, pk in entries}
+            rolled_up = RolledUpOrder.objects.filter(order_id__in=pks)
+            # the days the orders were counted in, and the ones they are in
+            days = set(rolled_up.values_list('day', flat=True))
+            current = list(Order.objects.filter(pk__in=pks).values_list('pk', TruncDate('date')))
+            days.update(day for _, day in current)
+            rolled_up._raw_delete(rolled_up.db)
+            RolledUpOrder.objects.bulk_create([RolledUpOrder(order_id=pk, day=day) for pk, day in current])
+            _rebuild(days)
+            cursor.seq = entries[-1][0]
+            read += len(entries)
+        cursor.save()
+    return read
+
+
+def rebuild_rollups():
+    """
+    Recompute the rollups of all the days from scratch.
+    """
+    with transaction.atomic():
+        cursor, _ = RollupCursor.objects.select_for_update().get_or_create(name=ROLLUP)
+        cursor.seq = Change.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        rolled_up = RolledUpOrder.objects.all()
+        rolled_up._raw_delete(rolled_up.db)
+        insert_select(RolledUpOrder, Order.objects.values(order_id=F('pk'), day=TruncDate('date')))
+        _rebuild()
+        cursor.save()
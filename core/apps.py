@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search_index(sender, using, **kwargs):
+    from .search import install_search_index
+    install_search_index(using)
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search_index, sender=self)
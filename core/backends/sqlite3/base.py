@@ -0,0 +1,34 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend taking the ``OPTIONS`` the one of Django 5.1 adds:
+
+    - ``init_command``: ``;`` separated statements run on every new
+      connection, e.g. ``PRAGMA journal_mode = WAL``;
+    - ``transaction_mode``: ``DEFERRED``, ``IMMEDIATE`` or ``EXCLUSIVE``,
+      the ``BEGIN`` of ``atomic()`` blocks.
+    """
+    extra_options = ('init_command', 'transaction_mode')
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for name in self.extra_options:
+            kwargs.pop(name, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        init_command = self.settings_dict['OPTIONS'].get('init_command')
+        for statement in (init_command or '').split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        transaction_mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute('BEGIN %s' % transaction_mode)
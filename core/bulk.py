@@ -0,0 +1,146 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product, Client, Order, OrderLine, Change
+
+CREATED = 'created'
+UPDATED = 'updated'
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def build_lines(order_pk, data, unit_prices=None):
+    """
+    Return the unsaved lines of an order from its validated data: ``lines``
+    when given, one unit of each of ``products`` otherwise.
+
+    Unit prices are taken from ``unit_prices``, a ``{product pk: price}``
+    dict of the snapshots to keep, then from the current product prices.
+    """
+    unit_prices = unit_prices or {}
+    lines = data.get('lines')
+    if lines is None:
+        lines = [{'product': product, 'quantity': 1} for product in data.get('products', ())]
+    quantities = {}
+    for line in lines:
+        quantities[line['product']] = quantities.get(line['product'], 0) + line['quantity']
+    return [
+        OrderLine(
+            order_id=order_pk,
+            product=product,
+            quantity=quantity,
+            unit_price=unit_prices.get(product.pk, product.price),
+        )
+        for product, quantity in quantities.items()
+    ]
+
+
+def _upsert_batch(model, batch, record=True):
+    """
+    Insert or update, keyed on ``code``, the rows described by ``batch``, a
+    list of validated data dicts. Return the status of each item and the
+    ``{code: pk}`` of the batch rows.
+
+    The writes send no signal, so the change feed entries are recorded
+    here unless ``record`` is false.
+    """
+    now = timezone.now()
+    existing = {
+        row['code']: row
+        for row in model.objects.filter(code__in=[data['code'] for data in batch]).values('pk', 'code')
+    }
+    statuses = []
+    to_create = []
+    # fields sent -> rows to update, as the optional fields an item omits keep their value
+    to_update = defaultdict(list)
+    for data in batch:
+        previous = existing.get(data['code'])
+        if previous is None:
+            to_create.append(model(**data))
+            statuses.append(CREATED)
+        else:
+            fields = tuple(sorted(name for name in data if name != 'code'))
+            to_update[fields].append(model(pk=previous['pk'], updated_at=now, **data))
+            statuses.append(UPDATED)
+    # Django 3.0 has no bulk_create(update_conflicts=...): existing codes are
+    # looked up in one query and written with bulk_update()
+    model.objects.bulk_create(to_create)
+    for fields, objs in to_update.items():
+        # bulk_update() skips auto_now
+        model.objects.bulk_update(objs, [*fields, 'updated_at'])
+    # SQLite does not return the PKs of bulk_create(), read them back
+    pks = {code: row['pk'] for code, row in existing.items()}
+    if to_create:
+        pks.update(model.objects.filter(code__in=[obj.code for obj in to_create])
+                   .values_list('code', 'pk'))
+    if record:
+        Change.objects.record(model, pks.values())
+    return statuses, pks
+
+
+def upsert_products(items, batch_size):
+    """
+    Insert or update products keyed on ``code``, one transaction per
+    ``batch_size`` items, and return the status of each item.
+    """
+    statuses = []
+    for batch in _batches(items, batch_size):
+        with transaction.atomic():
+            batch_statuses, _ = _upsert_batch(Product, batch)
+        statuses.extend(batch_statuses)
+    return statuses
+
+
+def upsert_clients(items, batch_size):
+    """
+    Insert or update clients keyed on ``code``, one transaction per
+    ``batch_size`` items, and return the status of each item.
+    """
+    statuses = []
+    for batch in _batches(items, batch_size):
+        with transaction.atomic():
+            batch_statuses, _ = _upsert_batch(Client, batch)
+        statuses.extend(batch_statuses)
+    return statuses
+
+
+def upsert_orders(items, batch_size):
+    """
+    Insert or update orders keyed on ``code``, one transaction per
+    ``batch_size`` items, and return the status of each item.
+
+    The lines of each order replace its current ones; all the lines of a
+    batch are written with a single ``bulk_create()``.
+    """
+    statuses = []
+    for batch in _batches(items, batch_size):
+        rows = [
+            {k: v for k, v in data.items() if k not in ('products', 'lines')}
+            for data in batch
+        ]
+        with transaction.atomic():
+            # the change feed entries are recorded by refresh_totals()
+            batch_statuses, pks = _upsert_batch(Order, rows, record=False)
+            # the unit prices of the products an updated order keeps are kept
+            previous_lines = OrderLine.objects.filter(order_id__in=[
+                pks[row['code']] for row, batch_status in zip(rows, batch_statuses)
+                if batch_status == UPDATED
+            ])
+            unit_prices = defaultdict(dict)
+            for order_pk, product_pk, unit_price in previous_lines.values_list(
+                    'order_id', 'product_id', 'unit_price'):
+                unit_prices[order_pk][product_pk] = unit_price
+            previous_lines.delete()
+            OrderLine.objects.bulk_create([
+                line
+                for data in batch
+                for line in build_lines(pks[data['code']], data, unit_prices.get(pks[data['code']]))
+            ])
+            Order.objects.filter(pk__in=pks.values()).refresh_totals()
+        statuses.extend(batch_statuses)
+    return statuses
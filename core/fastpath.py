@@ -0,0 +1,233 @@
+"""
+Fast read path: serialize rows read with ``QuerySet.values()`` the way a
+``ModelSerializer`` serializes model instances, without building the
+instances nor going through the per field machinery of DRF.
+
+``compile_serializer()`` turns the readable fields of a serializer into
+``(name, column, converter)`` triples once, and the rows are then built
+with a plain loop over them. Only the fields whose output is known to be
+the same are compiled; for any other field it returns ``None`` and the
+caller uses the serializer.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# fields whose to_representation() is a plain cast
+CASTS = {
+    serializers.CharField: str,
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+}
+
+
+class FastSerializer:
+    """
+    Compiled form of a serializer, see ``compile_serializer()``.
+
+    ``fields`` holds ``(name, column, convert)``, where ``column`` is read
+    from the ``values()`` row; ``relations`` holds ``(name, load)``, where
+    ``load(pks)`` returns the field value of each row by PK.
+    """
+
+    def __init__(self, model, fields, relations):
+        self.model = model
+        self.fields = fields
+        self.relations = relations
+
+    @property
+    def columns(self):
+        pk = self.model._meta.pk.attname
+        return [pk] + [column for _, column, _ in self.fields if column not in (pk, None)]
+
+    def values(self, queryset, *extra):
+        """
+        Return ``queryset`` as the ``values()`` rows ``serialize()`` takes,
+        with the ``extra`` columns too (e.g. the pagination keyset).
+        """
+        columns = self.columns
+        return queryset.prefetch_related(None).values(
+            *columns, *[name for name in extra if name not in columns]
+        )
+
+    def serialize(self, rows):
+        rows = list(rows)
+        pk = self.model._meta.pk.attname
+        related = {}
+        if rows and self.relations:
+            pks = [row[pk] for row in rows]
+            related = {name: load(pks) for name, load in self.relations}
+
+        plan = []
+        for name, column, convert in self.fields:
+            if name in related:
+                # the relation values are looked up by row PK, never None
+                column, convert = pk, related[name].__getitem__
+            plan.append((name, column, convert))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in plan:
+                value = row[column]
+                item[name] = None if value is None else convert(value)
+            data.append(item)
+        return data
+
+
+def compile_field(model, field):
+    """
+    Return the ``(column, convert, load)`` of a serializer field, ``load``
+    being ``None`` except for relations, or ``None`` when the field is not
+    supported.
+    """
+    source = field.source
+    if source == '*' or '.' in source:
+        return None
+    try:
+        model_field = model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+    if isinstance(field, serializers.ManyRelatedField):
+        return _compile_many_to_many(model_field, field)
+    if isinstance(field, serializers.ListSerializer):
+        return _compile_reverse_many(model_field, field)
+    if isinstance(field, serializers.BaseSerializer):
+        return None
+    if not model_field.concrete or model_field.many_to_many:
+        return None
+    if isinstance(field, serializers.RelatedField):
+        return _compile_foreign_key(model_field, field)
+    return _compile_scalar(model_field, field)
+
+
+def _compile_many_to_many(model_field, field):
+    child = field.child_relation
+    if not (isinstance(child, serializers.PrimaryKeyRelatedField) and child.pk_field is None
+            and model_field.many_to_many and model_field.concrete):
+        return None
+    return None, None, _many_to_many_loader(model_field)
+
+
+def _compile_reverse_many(model_field, field):
+    # nested serializer of the rows pointing to this one
+    child = compile_serializer(field.child)
+    if child is None or not model_field.one_to_many:
+        return None
+    return None, None, _reverse_many_loader(model_field, child)
+
+
+def _compile_foreign_key(model_field, field):
+    # the PK of a foreign key is read from its column, like DRF does
+    if not (isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None
+            and model_field.many_to_one):
+        return None
+    return model_field.attname, _identity, None
+
+
+def _compile_scalar(model_field, field):
+    if type(field).get_attribute is not serializers.Field.get_attribute or model_field.is_relation:
+        return None
+    for cls, cast in CASTS.items():
+        if isinstance(field, cls) and type(field).to_representation is cls.to_representation:
+            return model_field.attname, cast, None
+    if _is_iso(field, serializers.DateTimeField, api_settings.DATETIME_FORMAT):
+        return model_field.attname, _datetime_converter(field), None
+    if _is_iso(field, serializers.DateField, api_settings.DATE_FORMAT):
+        return model_field.attname, _date_converter(field), None
+    return model_field.attname, field.to_representation, None
+
+
+def compile_serializer(serializer):
+    """
+    Return the ``FastSerializer`` of ``serializer``, a ``ModelSerializer``
+    instance (the child one for ``many=True``), or ``None`` when one of
+    its readable fields cannot be compiled.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return None
+    model = serializer.Meta.model
+
+    fields, relations = [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        compiled = compile_field(model, field)
+        if compiled is None:
+            return None
+        column, convert, load = compiled
+        if load is not None:
+            relations.append((name, load))
+        fields.append((name, column, convert))
+    return FastSerializer(model, fields, relations)
+
+
+def _identity(value):
+    return value
+
+
+def _is_iso(field, cls, default_format):
+    output_format = getattr(field, 'format', default_format)
+    return (isinstance(field, cls) and type(field).to_representation is cls.to_representation
+            and output_format is not None and output_format.lower() == ISO_8601)
+
+
+def _date_converter(field):
+    def convert(value):
+        if isinstance(value, str):
+            return field.to_representation(value)
+        return value.isoformat()
+    return convert
+
+
+def _datetime_converter(field):
+    # DateTimeField.to_representation() with the time zone looked up once
+    if type(field).enforce_timezone is not serializers.DateTimeField.enforce_timezone:
+        return field.to_representation
+    field_timezone = getattr(field, 'timezone', field.default_timezone())
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _many_to_many_loader(model_field):
+    # same join as prefetch_related(), so the PKs come in the same order
+    related_model = model_field.related_model
+    lookup = model_field.related_query_name()
+
+    def load(pks):
+        values = defaultdict(list)
+        rows = related_model._default_manager.filter(**{'%s__in' % lookup: pks})
+        for pk, related_pk in rows.values_list(lookup, 'pk'):
+            values[pk].append(related_pk)
+        return values
+    return load
+
+
+def _reverse_many_loader(model_field, child):
+    related_model = model_field.related_model
+    remote = model_field.field
+
+    def load(pks):
+        values = defaultdict(list)
+        rows = child.values(related_model._default_manager.filter(**{'%s__in' % remote.name: pks}),
+                            remote.attname)
+        rows = list(rows)
+        for row, item in zip(rows, child.serialize(rows)):
+            values[row[remote.attname]].append(item)
+        return values
+    return load
@@ -0,0 +1,196 @@
+"""
+Job queue kept in the database, so it needs no broker: ``enqueue()`` adds
+a ``Job`` row and the workers of the ``run_jobs`` command claim the
+queued jobs one at a time with an ``UPDATE`` that only one of them can
+win, then run the function registered for their task with ``task()``.
+
+A task is called with its job, reports its progress with
+``job.set_progress()`` and returns its result, saved as JSON. The progress
+is saved every ``API_JOB_HEARTBEAT`` seconds by a thread with a connection
+of its own: SQLite refuses the writes of a connection reading a cursor
+opened before another connection wrote, like the one of an export.
+
+A task that raises is run again after ``API_JOB_RETRY_DELAY`` seconds,
+doubled at each attempt, up to ``max_attempts`` attempts; a job whose
+worker died is run again once its heartbeat is ``API_JOB_TIMEOUT`` seconds
+old.
+"""
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# task name -> function(job) returning the result
+TASKS = {}
+
+
+def task(name):
+    """
+    Register the decorated function as the one running the ``name`` jobs.
+    """
+    def register(function):
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(task, params=None, max_attempts=None):
+    if task not in TASKS:
+        raise ValueError('Unknown task %r.' % task)
+    return Job.objects.create(
+        task=task,
+        params=json.dumps(params or {}, cls=DjangoJSONEncoder),
+        max_attempts=max_attempts or settings.API_JOB_MAX_ATTEMPTS,
+    )
+
+
+def enqueue_once(task, params=None, max_attempts=None):
+    """
+    Enqueue a job unless one of ``task`` with the same params is still
+    queued, and return it, or ``None``.
+    """
+    queued = Job.objects.filter(
+        task=task, params=json.dumps(params or {}, cls=DjangoJSONEncoder), status=Job.QUEUED,
+    )
+    if queued.exists():
+        return None
+    return enqueue(task, params, max_attempts)
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def requeue_stale(timeout=None):
+    """
+    Queue again the running jobs whose worker stopped sending heartbeats,
+    or fail them when they have no attempt left. Return their number.
+    """
+    timeout = settings.API_JOB_TIMEOUT if timeout is None else timeout
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - datetime.timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='The worker stopped.', finished_at=now,
+    )
+    return failed + stale.update(status=Job.QUEUED, worker='', run_after=now)
+
+
+def claim(worker):
+    """
+    Mark the next job due as run by ``worker`` and return it, or ``None``
+    when none is due.
+    """
+    while True:
+        now = timezone.now()
+        pk = (Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+              .order_by('run_after', 'pk').values_list('pk', flat=True).first())
+        if pk is None:
+            return None
+        # another worker may have claimed it since
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1,
+            started_at=now, heartbeat_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Save the progress of a running job every ``interval`` seconds, until
+    stopped.
+    """
+
+    def __init__(self, job, interval):
+        super().__init__(name='heartbeat-%s' % job.pk, daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    Job.objects.filter(pk=self.job.pk, status=Job.RUNNING).update(
+                        progress=self.job.progress, total=self.job.total, heartbeat_at=timezone.now(),
+                    )
+                except DatabaseError:
+                    logger.warning('Could not save the progress of job %s', self.job.pk, exc_info=True)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job):
+    """
+    Run a claimed job and save its result, or its error and when it is
+    tried again.
+    """
+    heartbeat = Heartbeat(job, settings.API_JOB_HEARTBEAT)
+    heartbeat.start()
+    try:
+        result = TASKS[job.task](job)
+    except Exception:
+        logger.exception('Job %s failed, attempt %d of %d', job.pk, job.attempts, job.max_attempts)
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = settings.API_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + datetime.timedelta(seconds=delay)
+            fields = ['status', 'error', 'run_after', 'progress', 'total']
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            fields = ['status', 'error', 'finished_at', 'progress', 'total']
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = json.dumps(result, cls=DjangoJSONEncoder)
+        job.error = ''
+        job.finished_at = timezone.now()
+        if job.total is None:
+            job.total = job.progress
+        fields = ['status', 'result', 'error', 'finished_at', 'progress', 'total']
+    finally:
+        heartbeat.stop()
+    Job.objects.filter(pk=job.pk).update(**{name: getattr(job, name) for name in fields})
+    return job
+
+
+def work(burst=False, poll=None, stop=None):
+    """
+    Run the jobs as they are due until ``stop()`` is true, or until none is
+    due when ``burst`` is set. Return the number of jobs run.
+    """
+    poll = settings.API_JOB_POLL_INTERVAL if poll is None else poll
+    worker = worker_name()
+    done = 0
+    while stop is None or not stop():
+        # like at the end of a request, as a worker runs for long
+        close_old_connections()
+        requeue_stale()
+        job = claim(worker)
+        if job is not None:
+            run(job)
+            done += 1
+        elif burst:
+            break
+        else:
+            time.sleep(poll)
+    return done
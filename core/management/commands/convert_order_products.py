@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Order, OrderLine, Product, refresh_order_totals
+
+# the table of Order.products before it went through OrderLine
+LEGACY_TABLE = '%s_products' % Order._meta.db_table
+
+
+class Command(BaseCommand):
+    help = ('Convert the orders of a database created before OrderLine: copy the rows of the old '
+            'Order.products table to order lines of one unit at the current product price, then '
+            'recompute the order totals. Rows already converted are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop the old table once its rows are converted.')
+
+    def handle(self, *args, **options):
+        # migrate cannot add through= to an existing many-to-many field
+        tables = connection.introspection.table_names()
+        if LEGACY_TABLE not in tables:
+            raise CommandError('There is no %s table to convert.' % LEGACY_TABLE)
+
+        if OrderLine._meta.db_table not in tables:
+            # outside of a transaction, as the SQLite schema editor needs
+            with connection.schema_editor() as editor:
+                editor.create_model(OrderLine)
+        quote = connection.ops.quote_name
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT DISTINCT order_id FROM %s' % quote(LEGACY_TABLE))
+                orders = [row[0] for row in cursor.fetchall()]
+                cursor.execute(
+                    'INSERT INTO {line} (order_id, product_id, quantity, unit_price) '
+                    'SELECT legacy.order_id, legacy.product_id, 1, product.price '
+                    'FROM {legacy} legacy JOIN {product} product ON product.id = legacy.product_id '
+                    'WHERE NOT EXISTS (SELECT 1 FROM {line} line '
+                    'WHERE line.order_id = legacy.order_id AND line.product_id = legacy.product_id)'.format(
+                        line=quote(OrderLine._meta.db_table), legacy=quote(LEGACY_TABLE),
+                        product=quote(Product._meta.db_table),
+                    )
+                )
+                converted = cursor.rowcount
+            refresh_order_totals(orders)
+            if options['drop']:
+                with connection.cursor() as cursor:
+                    cursor.execute('DROP TABLE %s' % quote(LEGACY_TABLE))
+        self.stdout.write(self.style.SUCCESS(
+            'Converted %d order products to lines, %d order totals recomputed.' % (converted, len(orders))
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from core.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Create and rebuild the full-text search index of products and clients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database to rebuild the index of.')
+
+    def handle(self, *args, **options):
+        rebuild_search_index(options['database'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index.'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored order totals in chunks, or check them with --check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of orders updated per transaction.')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report the orders whose stored total is wrong.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self.check_totals()
+
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be a positive integer.')
+        updated = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                Order.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Order.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).refresh_totals()
+            last_pk = pks[-1]
+        self.stdout.write(self.style.SUCCESS('Recomputed %d order totals.' % updated))
+
+    def check_totals(self):
+        mismatched = list(
+            Order.objects.all().mismatched_totals()
+            .order_by('pk').values_list('code', 'total', 'computed_total')
+        )
+        for code, total, computed_total in mismatched:
+            self.stdout.write('%s: stored %s, expected %s' % (code, total, computed_total))
+        if mismatched:
+            raise CommandError('%d order totals are inconsistent.' % len(mismatched))
+        self.stdout.write(self.style.SUCCESS('All order totals are consistent.'))
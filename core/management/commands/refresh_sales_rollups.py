@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.analytics import rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Refresh the sales rollups with the orders changed since the last refresh.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute the rollups of all the days from scratch.')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS('Rebuilt the sales rollups.'))
+            return
+        read = refresh_rollups()
+        self.stdout.write(self.style.SUCCESS('Refreshed the sales rollups with %d changes.' % read))
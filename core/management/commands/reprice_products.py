@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Product
+from core.pricing import reprice
+
+
+class Command(BaseCommand):
+    help = 'Change the price of the filtered products by a percentage or an amount.'
+
+    def add_arguments(self, parser):
+        change = parser.add_mutually_exclusive_group(required=True)
+        change.add_argument('--percent', type=float, help='Percentage added to the prices, e.g. -10.')
+        change.add_argument('--amount', type=float, help='Amount added to the prices, e.g. 1.5.')
+        parser.add_argument('--filter', action='append', default=[], metavar='LOOKUP=VALUE',
+                            help='ORM lookup selecting the products, e.g. family=Dairy; repeatable.')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of products updated per transaction.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be a positive integer.')
+        filters = {}
+        for item in options['filter']:
+            lookup, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError('--filter takes LOOKUP=VALUE, not %r.' % item)
+            filters[lookup] = value
+        try:
+            result = reprice(
+                Product.objects.filter(**filters), percent=options['percent'], amount=options['amount'],
+                chunk_size=options['chunk_size'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            'Repriced %d products in %d chunks in %.2fs (%d products/s).' % (
+                result['products'], result['chunks'], result['seconds'],
+                result['products'] / result['seconds'] if result['seconds'] else 0,
+            )
+        ))
@@ -0,0 +1,78 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.jobs import work
+
+
+def work_until_signaled(burst, poll, stopping):
+    # finish the job being run on SIGINT and SIGTERM, then exit
+    def stop(signum, frame):
+        stopping.set()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    work(burst, poll, stop=stopping.is_set)
+
+
+def supervise(workers, burst, poll, on_restart):
+    """
+    Run ``workers`` worker processes until they exit, replacing the ones
+    that crash, after calling ``on_restart(process)``, unless ``burst``.
+    """
+    stopping = multiprocessing.Event()
+    processes = []
+
+    def start():
+        process = multiprocessing.Process(target=work_until_signaled, args=(burst, poll, stopping))
+        process.start()
+        processes.append(process)
+
+    for _ in range(workers):
+        start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    try:
+        while processes:
+            for process in list(processes):
+                process.join(poll)
+                if process.is_alive():
+                    continue
+                processes.remove(process)
+                # a worker that crashed is replaced, its job is run again once stale
+                if process.exitcode and not stopping.is_set() and not burst:
+                    on_restart(process)
+                    start()
+    except KeyboardInterrupt:
+        stopping.set()
+        for process in processes:
+            process.join()
+
+
+class Command(BaseCommand):
+    help = 'Run the queued jobs with a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.API_JOB_WORKERS,
+                            help='Worker processes, 1 to run the jobs in this process.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due instead of waiting for more.')
+        parser.add_argument('--poll', type=float, default=settings.API_JOB_POLL_INTERVAL,
+                            help='Seconds to wait before looking for jobs again when none is due.')
+
+    def handle(self, *args, **options):
+        workers, burst, poll = options['workers'], options['burst'], options['poll']
+        if workers < 1:
+            raise CommandError('At least one worker is needed.')
+        if workers == 1:
+            done = work(burst, poll)
+            self.stdout.write(self.style.SUCCESS('Ran %d jobs.' % done))
+            return
+
+        # the processes open their own connections
+        connections.close_all()
+        supervise(workers, burst, poll, on_restart=lambda process: self.stderr.write(
+            'Worker %s exited with %s, restarting it.' % (process.pid, process.exitcode)
+        ))
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
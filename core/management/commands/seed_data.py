@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seed import seed_data
+
+
+class Command(BaseCommand):
+    help = 'Insert synthetic products, clients and orders, up to the given number of order lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=10000,
+                            help='Number of order lines, from 1k to 10M.')
+        parser.add_argument('--products', type=int,
+                            help='Number of products, one per 200 lines by default.')
+        parser.add_argument('--clients', type=int,
+                            help='Number of clients, one per 50 lines by default.')
+        parser.add_argument('--lines-per-order', type=int, default=5,
+                            help='Average number of lines of an order.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Number of days, up to now, the orders are spread over.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of rows inserted per transaction.')
+        parser.add_argument('--database', default=None, help='Database to insert the rows in.')
+
+    def handle(self, *args, **options):
+        for name in ('lines', 'lines_per_order', 'days', 'batch_size', 'products', 'clients'):
+            if options[name] is not None and options[name] < 1:
+                raise CommandError('--%s must be a positive integer.' % name.replace('_', '-'))
+
+        start = time.perf_counter()
+
+        def progress(lines):
+            if options['verbosity'] > 1:
+                self.stdout.write('%d lines inserted.' % lines)
+
+        counts = seed_data(
+            options['lines'], products=options['products'], clients=options['clients'],
+            lines_per_order=options['lines_per_order'], days=options['days'], seed=options['seed'],
+            batch_size=options['batch_size'], using=options['database'], progress=progress,
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Inserted %(products)d products, %(clients)d clients, %(orders)d orders and %(lines)d lines'
+            % counts + ' in %.1fs (%d lines/s).' % (elapsed, counts['lines'] / elapsed)
+        ))
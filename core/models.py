@@ -1,4 +1,11 @@
+import json
+
 from django.db import models
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce
+from django.utils import timezone
+
+from .sql import insert_select
 
 
 class Product(models.Model):
@@ -7,6 +14,13 @@ class Product(models.Model):
     family = models.CharField(max_length=50, blank=True, default='')
     price = models.FloatField()
     remark = models.CharField(max_length=200, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['family', 'price']),
+            models.Index(fields=['price']),
+        ]
 
     def __str__(self):
         return self.code
@@ -22,19 +36,293 @@ class Client(models.Model):
     mobile_phone2 = models.CharField(max_length=13, blank=True, default='')
     email = models.EmailField(max_length=30, blank=True, default='')
     company = models.CharField(max_length=35, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name']),
+            models.Index(fields=['company']),
+        ]
 
     def __str__(self):
         return self.code
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_price(self):
+        """
+        Annotate each order with ``price``, read from the stored ``total``
+        column so it can be filtered and ordered on without a join.
+        """
+        return self.annotate(price=F('total'))
+
+    def with_computed_total(self):
+        """
+        Annotate each order with ``computed_total``, the sum of its lines
+        amounts, computed by the database in the same query.
+        """
+        amount = F('lines__quantity') * F('lines__unit_price')
+        return self.annotate(
+            computed_total=Coalesce(Sum(amount, output_field=FloatField()), Value(0.0))
+        )
+
+    def refresh_totals(self):
+        """
+        Recompute the stored ``total`` of the selected orders with a single
+        ``UPDATE``, and return the number of updated rows. ``updated_at`` is
+        set and the change recorded too, as ``update()`` sends no signal.
+        """
+        totals = OrderLine.objects.filter(order=OuterRef('pk')).values('order').annotate(
+            total=Sum(F('quantity') * F('unit_price'), output_field=FloatField())
+        ).values('total')
+        pks = list(self.values_list('pk', flat=True))
+        updated = self.model.objects.filter(pk__in=pks).update(
+            total=Coalesce(Subquery(totals, output_field=FloatField()), Value(0.0)),
+            updated_at=timezone.now(),
+        )
+        Change.objects.record(self.model, pks)
+        return updated
+
+    def mismatched_totals(self, tolerance=1e-6):
+        """
+        Return the orders whose stored ``total`` differs from the sum of
+        their lines amounts.
+        """
+        return self.with_computed_total().annotate(
+            drift=Abs(F('total') - F('computed_total'))
+        ).filter(drift__gt=tolerance)
+
+
 class Order(models.Model):
     code = models.CharField(max_length=10, unique=True)
-    date = models.DateTimeField(format('%Y-%m-%d %H:%m'))
+    date = models.DateTimeField(format('%Y-%m-%d %H:%m'), db_index=True)
     client = models.ForeignKey(Client, related_name='client', on_delete=models.DO_NOTHING)
-    products = models.ManyToManyField(Product, related_name='products')
+    products = models.ManyToManyField(Product, related_name='products', through='OrderLine')
+    # denormalized sum of the lines amounts, maintained by core.signals
+    total = models.FloatField(default=0, editable=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'date']),
+        ]
 
     def __str__(self):
         return self.code
 
     def total_price(self):
-        return sum([p.price for p in self.products.all()])
+        # lines.all() is served from the prefetch cache when the caller
+        # used prefetch_related('lines'), so listing orders stays O(1)
+        return sum(line.amount() for line in self.lines.all())
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='order_lines', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    # price of the product when it was ordered, set by core.signals when the
+    # line is added through Order.products
+    unit_price = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='unique_order_product'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'order']),
+        ]
+
+    def __str__(self):
+        return '%s x %s' % (self.quantity, self.product_id)
+
+    def amount(self):
+        return self.quantity * (self.unit_price or 0)
+
+
+def refresh_order_totals(pks, chunk_size=500):
+    """
+    Recompute the stored total of the orders in ``pks``, ``chunk_size`` at a
+    time to stay under the database limit on query parameters.
+    """
+    pks = list(pks)
+    for start in range(0, len(pks), chunk_size):
+        Order.objects.filter(pk__in=pks[start:start + chunk_size]).refresh_totals()
+
+
+class ChangeQuerySet(models.QuerySet):
+    def record(self, model, pks, action='upsert'):
+        """
+        Record that the ``model`` rows with the given ``pks`` were upserted
+        or deleted, with a single ``INSERT``.
+        """
+        return self.bulk_create([
+            Change(model=model._meta.model_name, object_pk=pk, action=action) for pk in pks
+        ])
+
+    def record_rows(self, queryset, action='upsert'):
+        """
+        Record that the rows of ``queryset`` were upserted or deleted, with
+        a single ``INSERT ... SELECT`` so their PKs are not read.
+        """
+        insert_select(Change, queryset.order_by('pk').values(object_pk=F('pk')), using=self.db, values={
+            'model': queryset.model._meta.model_name, 'action': action, 'changed_at': timezone.now(),
+        })
+
+
+class Change(models.Model):
+    """
+    Entry of the change feed: its auto-incremented PK is the sequence
+    number clients resume from, and deleted rows are kept as tombstones.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTIONS = (
+        (UPSERT, 'upsert'),
+        (DELETE, 'delete'),
+    )
+
+    model = models.CharField(max_length=20)
+    object_pk = models.IntegerField()
+    action = models.CharField(max_length=6, choices=ACTIONS)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'id']),
+        ]
+
+    def __str__(self):
+        return '%s %s %s' % (self.action, self.model, self.object_pk)
+
+
+class SalesRollup(models.Model):
+    """
+    Rollup row of the orders of a day, a month or a year, see
+    ``core.analytics``.
+    """
+    DAY = 'day'
+    MONTH = 'month'
+    YEAR = 'year'
+    PERIODS = (
+        (DAY, 'day'),
+        (MONTH, 'month'),
+        (YEAR, 'year'),
+    )
+
+    period = models.CharField(max_length=5, choices=PERIODS)
+    # first day of the period
+    day = models.DateField()
+    revenue = models.FloatField()
+
+    class Meta:
+        abstract = True
+
+
+class ClientSales(SalesRollup):
+    # the rows without client hold the totals of the period
+    client = models.ForeignKey(Client, null=True, related_name='+', on_delete=models.DO_NOTHING,
+                               db_constraint=False)
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'day', 'client'], name='unique_client_sales'),
+        ]
+        indexes = [
+            # also finds the totals, without client
+            models.Index(fields=['client', 'period', 'day']),
+        ]
+
+
+class ProductSales(SalesRollup):
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.DO_NOTHING,
+                                db_constraint=False)
+    quantity = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'day', 'product'], name='unique_product_sales'),
+        ]
+
+
+class RolledUpOrder(models.Model):
+    """
+    Day an order is counted in by the rollups, kept to know which days to
+    refresh once the order moved to another day or was deleted.
+    """
+    order_id = models.IntegerField(primary_key=True)
+    day = models.DateField(db_index=True)
+
+
+class RollupCursor(models.Model):
+    """
+    Last entry of the change feed a rollup was refreshed with.
+    """
+    name = models.CharField(max_length=20, unique=True)
+    seq = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '%s at %s' % (self.name, self.seq)
+
+
+class Job(models.Model):
+    """
+    Task run in the background by the ``run_jobs`` workers, see
+    ``core.jobs``. ``params`` and ``result`` hold JSON, as Django 3.0 has no
+    JSON field on SQLite.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'queued'),
+        (RUNNING, 'running'),
+        (SUCCEEDED, 'succeeded'),
+        (FAILED, 'failed'),
+    )
+
+    task = models.CharField(max_length=50)
+    params = models.TextField(default='{}')
+    status = models.CharField(max_length=9, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    # not claimed before, to wait between the attempts
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True)
+    result = models.TextField(null=True)
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    # saved with the progress, a running job without heartbeat for long lost its worker
+    heartbeat_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return '%s %s %s' % (self.task, self.pk, self.status)
+
+    def get_params(self):
+        return json.loads(self.params)
+
+    def get_result(self):
+        return None if self.result is None else json.loads(self.result)
+
+    def set_progress(self, progress, total=None):
+        """
+        Set the progress, and the total when given, saved by the heartbeat
+        of the worker, see ``core.jobs``.
+        """
+        self.progress = progress
+        if total is not None:
+            self.total = total
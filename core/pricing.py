@@ -0,0 +1,80 @@
+"""
+Repricing: change the price of a filtered set of products by a percentage
+or an amount with one ``UPDATE`` per chunk of ``chunk_size`` products,
+each chunk in its own transaction so no write lock is held for long.
+
+Order lines keep the unit price their product had when it was ordered,
+so the order totals do not depend on the current prices; the lines that
+have no unit price yet get the price from before the change, and the
+totals of their orders are recomputed.
+"""
+import time
+
+from django.db import router, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Round
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Product, OrderLine, Change, refresh_order_totals
+from .signals import snapshot_unit_prices
+
+# sent once the products are repriced, as update() sends no signal, with the
+# PKs of the ``orders`` whose total changed
+products_repriced = Signal()
+
+
+def new_price(percent=None, amount=None):
+    """
+    Return the expression of the new price, rounded to the cent.
+    """
+    if (percent is None) == (amount is None):
+        raise ValueError('Give either a percentage or an amount.')
+    if percent is not None:
+        cents = F('price') * Value(100 + percent)
+    else:
+        cents = (F('price') + Value(amount)) * Value(100)
+    return Round(cents, output_field=FloatField()) / Value(100.0)
+
+
+def reprice(queryset, percent=None, amount=None, chunk_size=10000):
+    """
+    Change the price of the products of ``queryset`` by ``percent`` % or
+    by ``amount``, ``chunk_size`` products at a time in the order of their
+    PKs. Return the number of products repriced, of chunks and of seconds
+    taken. Raise ``ValueError`` when a price would become negative.
+    """
+    start = time.perf_counter()
+    price = new_price(percent, amount)
+    if (percent is not None and percent < -100
+            or amount is not None and queryset.filter(price__lt=-amount).exists()):
+        raise ValueError('The change would make prices negative.')
+
+    using = router.db_for_write(Product)
+    queryset = queryset.using(using).order_by()
+    # lines without unit price are rare, so they are looked for once
+    unpriced = OrderLine.objects.using(using).filter(unit_price__isnull=True, product__in=queryset).exists()
+    last = None
+    repriced = chunks = 0
+    orders = set()
+    while True:
+        rows = queryset if last is None else queryset.filter(pk__gt=last)
+        bound = list(rows.order_by('pk').values_list('pk', flat=True)[chunk_size - 1:chunk_size])
+        chunk = rows.filter(pk__lte=bound[0]) if bound else rows
+        with transaction.atomic(using=using):
+            if unpriced:
+                lines = OrderLine.objects.using(using).filter(unit_price__isnull=True, product__in=chunk)
+                chunk_orders = set(lines.values_list('order_id', flat=True))
+                snapshot_unit_prices(lines)
+                refresh_order_totals(chunk_orders)
+                orders |= chunk_orders
+            # recorded first, as the new prices may not match the filters any more
+            Change.objects.using(using).record_rows(chunk)
+            repriced += chunk.update(price=price, updated_at=timezone.now())
+        chunks += 1
+        if not bound:
+            break
+        last = bound[0]
+
+    products_repriced.send(sender=Product, orders=orders)
+    return {'products': repriced, 'chunks': chunks, 'seconds': time.perf_counter() - start}
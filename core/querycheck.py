@@ -0,0 +1,161 @@
+"""
+Query checks: record the queries run by a block of code with
+``execute_wrapper()``, and find the N+1 patterns, the same query shape run
+again and again with other params, and the slow queries.
+
+A shape is the SQL with its literals, placeholders and lists of values
+replaced, see ``fingerprint()``. ``QueryCheckMixin`` asserts on the
+shapes in tests, and ``api.querycheck.QueryCheckMiddleware`` logs them.
+"""
+import os
+import re
+import sysconfig
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+IN_LIST = re.compile(r'\bIN \(\?(?:, \?)*\)')
+# rows of a bulk insert, in VALUES or UNION ALL form
+ROWS = re.compile(r'(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+')
+UNION_ROWS = re.compile(r'(SELECT \?(?:, \?)*)(?: UNION ALL SELECT \?(?:, \?)*)+')
+SPACES = re.compile(r'\s+')
+
+# transaction control, run around every atomic() block
+TRANSACTION = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT', 'ROLLBACK')
+
+# frames from these directories are not where a query comes from
+LIBRARY_PATHS = tuple({sysconfig.get_paths()[name] for name in ('stdlib', 'purelib', 'platlib')})
+
+
+def fingerprint(sql):
+    """
+    Return the shape of ``sql``: the same for the queries that differ by
+    their values or the length of their ``IN`` lists and inserted rows.
+    """
+    sql = SPACES.sub(' ', sql.strip())
+    sql = PLACEHOLDER.sub('?', NUMBER.sub('?', STRING.sub('?', sql)))
+    return UNION_ROWS.sub(r'\1', ROWS.sub(r'\1', IN_LIST.sub('IN (...)', sql)))
+
+
+def query_origin():
+    """
+    Return ``file:line`` of the innermost frame of the project code that
+    ran the query, the libraries and the ``execute_wrapper()`` excluded.
+    """
+    stack = traceback.extract_stack()
+    # the wrappers are called by the outermost _execute_with_wrappers()
+    calls = [index for index, frame in enumerate(stack) if frame.name == '_execute_with_wrappers']
+    for frame in reversed(stack[:calls[0]] if calls else stack):
+        if not frame.filename.startswith(LIBRARY_PATHS):
+            return '%s:%s' % (os.path.relpath(frame.filename, settings.BASE_DIR), frame.lineno)
+    return None
+
+
+class QueryShape:
+    def __init__(self, fingerprint, sql):
+        self.fingerprint = fingerprint
+        self.sql = sql
+        self.count = 0
+        self.duration = 0.0
+        self.origin = None
+
+    def __str__(self):
+        origin = ' from %s' % self.origin if self.origin else ''
+        return '%d x %.1f ms%s: %s' % (self.count, self.duration * 1000, origin, self.sql)
+
+
+class QueryRecorder:
+    """
+    ``execute_wrapper()`` recording the shapes of the queries. A shape run
+    more than ``repeat_limit`` times is an N+1 pattern, and a query taking
+    more than ``slow_ms`` ms is slow. Either check is skipped when None.
+    """
+
+    def __init__(self, repeat_limit=None, slow_ms=None):
+        self.repeat_limit = repeat_limit
+        self.slow_ms = slow_ms
+        self.count = 0
+        self.shapes = {}
+        # (duration, sql, origin)
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - start)
+
+    def record(self, sql, duration):
+        self.count += 1
+        if sql.lstrip().upper().startswith(TRANSACTION):
+            return
+        key = fingerprint(sql)
+        shape = self.shapes.get(key)
+        if shape is None:
+            shape = self.shapes[key] = QueryShape(key, sql)
+        shape.count += 1
+        shape.duration += duration
+        # the stack is only read for the queries reported
+        if self.repeat_limit is not None and shape.count == self.repeat_limit + 1:
+            shape.origin = query_origin()
+        if self.slow_ms is not None and duration * 1000 > self.slow_ms:
+            self.slow_queries.append((duration, sql, query_origin()))
+
+    @contextmanager
+    def wrap(self):
+        """
+        Record the queries of the block, on every database.
+        """
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def repeated(self):
+        """
+        Return the shapes run more than ``repeat_limit`` times, the most run first.
+        """
+        if self.repeat_limit is None:
+            return []
+        shapes = [shape for shape in self.shapes.values() if shape.count > self.repeat_limit]
+        return sorted(shapes, key=lambda shape: -shape.count)
+
+    def issues(self):
+        """
+        Return the description of the N+1 patterns and slow queries.
+        """
+        return [
+            *('N+1 query, %s' % shape for shape in self.repeated()),
+            *('slow query, %.1f ms%s: %s' % (duration * 1000, ' from %s' % origin if origin else '', sql)
+              for duration, sql, origin in self.slow_queries),
+        ]
+
+
+class QueryCheckMixin:
+    """
+    ``TestCase`` mixin adding ``assertQueryBudget()``.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, queries=None, repeat_limit=1, slow_ms=None):
+        """
+        Fail when the block runs more than ``queries`` queries, a query
+        shape more than ``repeat_limit`` times or a query longer than
+        ``slow_ms`` ms, see ``QueryRecorder``. By default a shape may not be
+        run twice, as test data is small, and the time is not checked.
+        """
+        recorder = QueryRecorder(repeat_limit, slow_ms)
+        with recorder.wrap():
+            yield recorder
+        issues = recorder.issues()
+        if queries is not None and recorder.count > queries:
+            issues.insert(0, '%d queries run, %d expected at most' % (recorder.count, queries))
+        if issues:
+            self.fail('\n'.join(issues))
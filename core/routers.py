@@ -0,0 +1,65 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# the replica the reads of the current request go to, if any, and whether
+# they are pinned to the primary, which wins
+_replica = ContextVar('replica', default=None)
+_primary_reads = ContextVar('primary_reads', default=False)
+
+
+@contextmanager
+def _set(var, value):
+    token = var.set(value)
+    try:
+        yield
+    finally:
+        var.reset(token)
+
+
+def use_replicas():
+    """
+    Send the reads in this context to a replica, the same one for all, unless
+    ``use_primary()`` pins them to the primary.
+    """
+    replicas = settings.DATABASE_REPLICAS
+    return _set(_replica, random.choice(replicas) if replicas else None)
+
+
+def use_primary():
+    """
+    Send the reads in this context to the primary.
+    """
+    return _set(_primary_reads, True)
+
+
+def get_read_replica():
+    """
+    Return the replica the reads in this context go to, or ``None``.
+    """
+    return None if _primary_reads.get() else _replica.get()
+
+
+class ReplicaRouter:
+    """
+    Route the reads to one of the ``DATABASE_REPLICAS`` aliases in the
+    contexts that allow it (see ``use_replicas()``), and the writes to
+    ``default``. Other reads, e.g. the ones checking rows before writing
+    them, are left to the default routing, i.e. the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_read_replica()
+
+    def db_for_write(self, model, **hints):
+        # even for the objects read from a replica
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {'default'} | set(settings.DATABASE_REPLICAS)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
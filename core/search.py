@@ -0,0 +1,105 @@
+"""
+Full-text search over products and clients with SQLite FTS5.
+
+Each model gets an external content FTS5 table indexing some of its
+columns, kept in sync by triggers, so bulk writes and raw updates are
+indexed too. The tables and triggers are created after ``migrate``.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+
+from .models import Product, Client
+
+SEARCH_FIELDS = {
+    Product: ('name', 'remark'),
+    Client: ('first_name', 'last_name', 'company', 'address'),
+}
+
+
+def fts_table(model):
+    return '%s_fts' % model._meta.db_table
+
+
+def _index_statements(model):
+    table = model._meta.db_table
+    fts = fts_table(model)
+    columns = ', '.join(SEARCH_FIELDS[model])
+    new_values = ', '.join('new.%s' % column for column in SEARCH_FIELDS[model])
+    old_values = ', '.join('old.%s' % column for column in SEARCH_FIELDS[model])
+    delete = "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES('delete', old.id, {old_values});"
+    insert = "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        "{columns}, content='{table}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN " + insert + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN " + delete + " END",
+        # recreated, as it fired on the updates of any column before
+        "DROP TRIGGER IF EXISTS {fts}_au",
+        # not on the updates of the other columns, like a price or updated_at
+        "CREATE TRIGGER {fts}_au AFTER UPDATE OF {columns} ON {table} BEGIN " + delete + insert + " END",
+    ]
+    return [
+        statement.format(fts=fts, table=table, columns=columns,
+                         new_values=new_values, old_values=old_values)
+        for statement in statements
+    ]
+
+
+def install_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Create the FTS5 tables and their triggers if they do not exist.
+    """
+    if connections[using].vendor != 'sqlite':
+        return
+    with connections[using].cursor() as cursor:
+        for model in SEARCH_FIELDS:
+            for statement in _index_statements(model):
+                cursor.execute(statement)
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Rebuild the FTS5 tables from the content of the indexed tables.
+    """
+    install_search_index(using)
+    with connections[using].cursor() as cursor:
+        for model in SEARCH_FIELDS:
+            fts = fts_table(model)
+            cursor.execute("INSERT INTO {fts}({fts}) VALUES('rebuild')".format(fts=fts))
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query matching every word as a prefix.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def search(model, query, limit):
+    """
+    Return up to ``limit`` objects of ``model`` matching every word of
+    ``query`` as a prefix, best ``bm25`` rank first.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if connection.vendor != 'sqlite':
+        condition = Q()
+        for word in re.findall(r'\w+', query):
+            condition &= Q(*[('%s__icontains' % field, word) for field in SEARCH_FIELDS[model]],
+                           _connector=Q.OR)
+        return list(model.objects.filter(condition)[:limit])
+
+    fts = fts_table(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM {fts} WHERE {fts} MATCH %s ORDER BY rank LIMIT %s'.format(fts=fts),
+            [expression, limit],
+        )
+        pks = [row[0] for row in cursor.fetchall()]
+    objects = model.objects.in_bulk(pks)
+    return [objects[pk] for pk in pks if pk in objects]
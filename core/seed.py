@@ -0,0 +1,171 @@
+"""
+Synthetic data: products, clients and orders that look like real ones,
+inserted with ``bulk_create()`` at any scale, for benchmarks and local
+databases.
+
+The rows get explicit PKs following the existing ones, so the lines of a
+batch of orders are built without reading the orders back, and the order
+totals are computed before the orders are inserted. Some products and
+clients are much more popular than others, the orders of a client are
+spread over ``days`` days and their PKs follow their dates.
+
+The rows are not recorded in the change feed: the sales rollups are
+rebuilt with ``refresh_sales_rollups --full``.
+"""
+import datetime
+import random
+
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import Client, Order, OrderLine, Product
+
+FAMILIES = {
+    'Beverages': ('Orange Juice', 'Mineral Water', 'Green Tea', 'Coffee Beans', 'Lemonade'),
+    'Dairy': ('Milk', 'Yogurt', 'Butter', 'Cheddar', 'Cream'),
+    'Bakery': ('Baguette', 'Croissant', 'Rye Bread', 'Muffin', 'Bagel'),
+    'Produce': ('Apples', 'Tomatoes', 'Potatoes', 'Dates', 'Olives'),
+    'Pantry': ('Olive Oil', 'Couscous', 'Rice', 'Lentils', 'Honey'),
+    'Household': ('Dish Soap', 'Sponges', 'Bleach', 'Trash Bags', 'Paper Towels'),
+    'Personal care': ('Shampoo', 'Toothpaste', 'Soap Bar', 'Deodorant', 'Razor'),
+    'Electronics': ('USB Cable', 'Headphones', 'Power Bank', 'Charger', 'Keyboard'),
+    'Stationery': ('Notebook', 'Pencils', 'Stapler', 'Printer Paper', 'Markers'),
+    'Hardware': ('Screwdriver', 'Hammer', 'Tape Measure', 'Drill Bits', 'Pliers'),
+}
+# family -> median price
+PRICES = {
+    'Beverages': 3, 'Dairy': 4, 'Bakery': 2, 'Produce': 3, 'Pantry': 6, 'Household': 5,
+    'Personal care': 7, 'Electronics': 30, 'Stationery': 5, 'Hardware': 18,
+}
+BRANDS = ('Acme', 'Atlas', 'Sahara', 'Nova', 'Oasis', 'Zenith', 'Cedar', 'Delta', 'Kasbah', 'Polar')
+SIZES = ('', 'Small', 'Large', 'Family Pack', 'x2', 'x6', 'Eco', 'Premium')
+
+FIRST_NAMES = (
+    'Amine', 'Yacine', 'Sofia', 'Lina', 'Karim', 'Nadia', 'Omar', 'Sara', 'Walid', 'Meriem',
+    'Adam', 'Ines', 'Rayan', 'Amel', 'Samir', 'Lea', 'Hugo', 'Emma', 'Noah', 'Chloe',
+)
+LAST_NAMES = (
+    'Mahamdi', 'Benali', 'Haddad', 'Bouzid', 'Kaci', 'Saidi', 'Mansouri', 'Cherif', 'Brahimi',
+    'Martin', 'Bernard', 'Dubois', 'Moreau', 'Laurent', 'Garcia', 'Smith', 'Khelifi', 'Ziani',
+)
+STREETS = ('Didouche Mourad', 'Larbi Ben Mhidi', 'Hassiba Ben Bouali', 'des Oliviers',
+           'de la Liberte', 'des Martyrs', 'Emir Abdelkader', 'du 1er Novembre')
+CITIES = ('Algiers', 'Oran', 'Constantine', 'Annaba', 'Blida', 'Setif', 'Tlemcen', 'Bejaia')
+COMPANIES = ('Sonatrach', 'Cevital', 'Condor', 'Djezzy', 'Ooredoo', 'Air Algerie', 'Biopharm',
+             'Hamoud Boualem', 'NCA Rouiba', 'Saidal')
+DOMAINS = ('gmail.com', 'yahoo.fr', 'outlook.com', 'mail.dz')
+
+# quantity of a line -> weight
+QUANTITIES = {1: 50, 2: 20, 3: 12, 4: 8, 5: 6, 10: 4}
+
+
+def popular(rng, count):
+    """
+    Return an index below ``count``, the first ones being the most likely.
+    """
+    return int(count * rng.random() ** 2)
+
+
+def next_pk(model, using):
+    return (model.objects.using(using).order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+
+
+def build_products(rng, first, count):
+    products = []
+    families = list(FAMILIES)
+    for pk in range(first, first + count):
+        family = rng.choice(families)
+        name = ' '.join(filter(None, (rng.choice(BRANDS), rng.choice(FAMILIES[family]), rng.choice(SIZES))))
+        products.append(Product(
+            pk=pk, code='P%09d' % pk, name=name, family=family,
+            price=max(0.5, round(rng.lognormvariate(0, 0.5) * PRICES[family], 2)),
+            remark='' if rng.random() < 0.8 else 'Seasonal',
+        ))
+    return products
+
+
+def build_clients(rng, first, count):
+    clients = []
+    today = datetime.date.today()
+    for pk in range(first, first + count):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = '%s.%s%d@%s' % (first_name, last_name, pk, rng.choice(DOMAINS))
+        clients.append(Client(
+            pk=pk, code='C%09d' % pk, first_name=first_name, last_name=last_name,
+            address='%d rue %s, %s' % (rng.randint(1, 200), rng.choice(STREETS), rng.choice(CITIES)),
+            date_of_birth=today - datetime.timedelta(days=rng.randint(18 * 365, 80 * 365)),
+            mobile_phone1='+2135%08d' % rng.randrange(10 ** 8),
+            mobile_phone2='' if rng.random() < 0.7 else '+2136%08d' % rng.randrange(10 ** 8),
+            email=email.lower() if len(email) <= 30 else 'client%d@example.com' % pk,
+            company='' if rng.random() < 0.6 else rng.choice(COMPANIES),
+        ))
+    return clients
+
+
+def seed_data(lines, products=None, clients=None, lines_per_order=5, days=365, seed=0,
+              batch_size=5000, using=None, progress=None):
+    """
+    Insert ``products`` products, ``clients`` clients and orders of
+    ``lines_per_order`` lines on average over the last ``days`` days, up
+    to ``lines`` lines, ``batch_size`` orders at a time; by default there
+    is a product for 200 lines and a client for 50 lines. ``progress(lines)``
+    is called after each batch. Return the number of rows of each model.
+    """
+    if products is None:
+        products = min(50000, max(10, lines // 200))
+    if clients is None:
+        clients = min(100000, max(10, lines // 50))
+    using = using or router.db_for_write(Order)
+    rng = random.Random(seed)
+
+    first_product, first_client = next_pk(Product, using), next_pk(Client, using)
+    for first in range(0, products, batch_size):
+        Product.objects.using(using).bulk_create(
+            build_products(rng, first_product + first, min(batch_size, products - first))
+        )
+    for first in range(0, clients, batch_size):
+        Client.objects.using(using).bulk_create(
+            build_clients(rng, first_client + first, min(batch_size, clients - first))
+        )
+    prices = dict(Product.objects.using(using).filter(pk__gte=first_product).values_list('pk', 'price'))
+
+    quantities, weights = list(QUANTITIES), list(QUANTITIES.values())
+    span = datetime.timedelta(days=days)
+    start = timezone.now() - span
+    pk = next_pk(Order, using)
+    done = orders = 0
+    while done < lines:
+        batch, batch_lines = [], []
+        while done < lines and len(batch) < batch_size:
+            count = min(lines - done, products, rng.randint(1, 2 * lines_per_order - 1))
+            picked = set()
+            while len(picked) < count:
+                picked.add(first_product + popular(rng, products))
+            order_lines = [
+                OrderLine(order_id=pk, product_id=product, unit_price=prices[product],
+                          quantity=rng.choices(quantities, weights)[0])
+                for product in sorted(picked)
+            ]
+            batch.append(Order(
+                pk=pk, code='O%09d' % pk, client_id=first_client + popular(rng, clients),
+                # as far in the days as the lines are in the lines
+                date=start + span * ((done + rng.random() * count) / lines),
+                total=sum(line.amount() for line in order_lines),
+            ))
+            batch_lines.extend(order_lines)
+            pk += 1
+            orders += 1
+            done += count
+        with transaction.atomic(using=using):
+            Order.objects.using(using).bulk_create(batch)
+            OrderLine.objects.using(using).bulk_create(batch_lines)
+        if progress is not None:
+            progress(done)
+
+    # the sequences of the databases having some are behind the explicit PKs
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Product, Client, Order]):
+            cursor.execute(sql)
+    return {'products': products, 'clients': clients, 'orders': orders, 'lines': done}
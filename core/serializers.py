@@ -1,26 +1,363 @@
+import functools
+import itertools
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.reverse import reverse
+from rest_framework.validators import UniqueValidator
+
+from .bulk import build_lines
+from .models import Product, Client, Order, OrderLine, Job
+
+
+def query_param_set(request, name):
+    """
+    Return the names of a comma separated query param as a set, or ``None``
+    when the param is missing.
+    """
+    value = request.query_params.get(name) if request is not None else None
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    On reads, keep only the fields listed in the ``fields`` query param and
+    inline the relations listed in ``expand`` (see ``expandable_fields``).
+
+    Only the top level serializer is affected, not the nested ones.
+    """
+    # field name -> (serializer class, kwargs) used to inline it
+    expandable_fields = {}
+
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def is_read(self):
+        # the other views, e.g. the exports, serialize all the fields
+        request = self.context.get('request')
+        action = getattr(self.context.get('view'), 'action', None)
+        return request is not None and request.method in SAFE_METHODS and action in (None, 'list', 'retrieve')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_read() or not self.is_root():
+            return fields
+        request = self.context['request']
+
+        for name in query_param_set(request, 'expand') or ():
+            if name in self.expandable_fields:
+                serializer_class, kwargs = self.expandable_fields[name]
+                fields[name] = serializer_class(read_only=True, **kwargs)
+        only = query_param_set(request, 'fields')
+        if only:
+            fields = OrderedDict((name, field) for name, field in fields.items() if name in only)
+        return fields
+
+
+def resolve_related(field, values):
+    """
+    Return ``values`` with the PKs of the rows of ``field``, a
+    ``BulkPrimaryKeyRelatedField``, replaced by the rows, read with one
+    ``IN`` query. Invalid and unknown PKs are left for the field to report.
+    """
+    if field.pk_field is not None:
+        return list(values)
+    queryset = field.get_queryset()
+    pk_field = queryset.model._meta.pk
+    keys = []
+    for value in values:
+        try:
+            keys.append(pk_field.to_python(value))
+        except (TypeError, DjangoValidationError):
+            keys.append(None)
+    instances = queryset.in_bulk({key for key in keys if key is not None})
+    return [instances.get(key, value) for key, value in zip(keys, values)]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return [
+            self.child_relation.to_internal_value(item)
+            for item in resolve_related(self.child_relation, data)
+        ]
 
-from .models import Product, Client, Order
 
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    ``PrimaryKeyRelatedField`` validating lists of PKs with one query
+    rather than one per PK: with ``many=True``, or in a list serializer
+    passing it the rows ``resolve_related()`` read.
+    """
 
-class ProductSerializer(serializers.ModelSerializer):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, self.get_queryset().model):
+            # read by resolve_related()
+            return data
+        return super().to_internal_value(data)
+
+
+def resolve_items(serializer, items):
+    """
+    Return a copy of ``items``, data for ``serializer``, with the PKs of its
+    ``BulkPrimaryKeyRelatedField`` relations, nested ones included, replaced
+    by the rows, read with one query per relation for all the items.
+    """
+    items = [dict(item) if isinstance(item, Mapping) else item for item in items]
+    for name, field in serializer.fields.items():
+        if field.read_only:
+            continue
+        # (item, value) of the items having the field, a list for the many ones
+        values = [(item, item[name]) for item in items if isinstance(item, Mapping) and name in item]
+        if isinstance(field, BulkPrimaryKeyRelatedField):
+            for (item, _), value in zip(values, resolve_related(field, [value for _, value in values])):
+                item[name] = value
+            continue
+        if isinstance(field, BulkManyRelatedField):
+            resolve = functools.partial(resolve_related, field.child_relation)
+        elif isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.Serializer):
+            resolve = functools.partial(resolve_items, field.child)
+        else:
+            continue
+        values = [(item, value) for item, value in values if isinstance(value, list)]
+        resolved = iter(resolve([element for _, value in values for element in value]))
+        for item, value in values:
+            item[name] = list(itertools.islice(resolved, len(value)))
+    return items
+
+
+def set_prefetched(instance, name, objects):
+    """
+    Fill the prefetch cache of the ``name`` relation of ``instance`` with
+    ``objects``, like ``prefetch_related()`` does, so reading it takes no
+    query.
+    """
+    cache = instance.__dict__.setdefault('_prefetched_objects_cache', {})
+    cache.pop(name, None)
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    cache[name] = queryset
+
+
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = '__all__'
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    price = serializers.SerializerMethodField('get_price')
+class OrderLineListSerializer(serializers.ListSerializer):
+    """
+    Read the products of all the lines with one query.
+    """
 
-    def get_price(self, obj):
-        return obj.total_price()
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            field = self.child.fields['product']
+            indexes = [i for i, item in enumerate(data) if isinstance(item, Mapping) and 'product' in item]
+            products = resolve_related(field, [data[i]['product'] for i in indexes])
+            data = list(data)
+            for i, product in zip(indexes, products):
+                data[i] = dict(data[i], product=product)
+        return super().to_internal_value(data)
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    product = BulkPrimaryKeyRelatedField(queryset=Product.objects.all())
+
+    class Meta:
+        model = OrderLine
+        list_serializer_class = OrderLineListSerializer
+        fields = ('product', 'quantity', 'unit_price')
+        read_only_fields = ('unit_price',)
+        extra_kwargs = {'quantity': {'min_value': 1}}
+
+
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'client': (ClientSerializer, {}),
+        'products': (ProductSerializer, {'many': True}),
+    }
+
+    # declared to be read for all the orders of a bulk write at once
+    client = BulkPrimaryKeyRelatedField(queryset=Client.objects.all())
+    # declared, as DRF makes relations with a ``through`` model read only
+    products = BulkPrimaryKeyRelatedField(many=True, queryset=Product.objects.all(), required=False)
+    lines = OrderLineSerializer(many=True, required=False)
+    price = serializers.FloatField(source='total', read_only=True)
+
+    def validate(self, attrs):
+        # the lines of an order are set from either ``lines`` or ``products``
+        if not self.partial and 'lines' not in attrs and 'products' not in attrs:
+            raise serializers.ValidationError({'products': [self.error_messages['required']]})
+        return attrs
+
+    def create(self, validated_data):
+        lines = build_lines(None, validated_data)
+        with transaction.atomic():
+            order = Order(**self.order_data(validated_data))
+            self.save_lines(order, lines)
+        return order
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            for attr, value in self.order_data(validated_data).items():
+                setattr(instance, attr, value)
+            if 'lines' not in validated_data and 'products' not in validated_data:
+                instance.save()
+                return instance
+
+            # products already in the order keep the price they were ordered
+            # at; the lines usually come from the prefetch cache of the view
+            unit_prices = {line.product_id: line.unit_price for line in instance.lines.all()}
+            OrderLine.objects.filter(order=instance).delete()
+            self.save_lines(instance, build_lines(instance.pk, validated_data, unit_prices))
+        return instance
+
+    def order_data(self, validated_data):
+        return {k: v for k, v in validated_data.items() if k not in ('lines', 'products')}
+
+    def save_lines(self, order, lines):
+        """
+        Save ``order`` with the total of ``lines``, then insert the lines
+        with one query. Both are kept in the prefetch cache of the order,
+        so serializing it takes no query.
+        """
+        order.total = sum(line.amount() for line in lines)
+        order.save()
+        for line in lines:
+            line.order = order
+        OrderLine.objects.bulk_create(lines)
+        set_prefetched(order, 'lines', lines)
+        set_prefetched(order, 'products', [line.product for line in lines])
 
     class Meta:
         model = Order
-        fields = ('code', 'client', 'products', 'date', 'price')
+        fields = ('code', 'client', 'products', 'lines', 'date', 'price')
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Validate every item on its own: invalid items are set to ``None`` in
+    ``validated_data`` and their errors kept in ``item_errors``, instead of
+    failing the whole list. The relations of all the items are read with
+    one query each, see ``resolve_items()``.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(input_type=type(data).__name__)
+            raise serializers.ValidationError({'non_field_errors': [message]}, code='not_a_list')
+        if not data and not self.allow_empty:
+            message = self.error_messages['empty']
+            raise serializers.ValidationError({'non_field_errors': [message]}, code='empty')
+
+        validated = []
+        self.item_errors = []
+        seen = set()
+        for item in resolve_items(self.child, data):
+            try:
+                attrs = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                validated.append(None)
+                self.item_errors.append(exc.detail)
+                continue
+            if attrs['code'] in seen:
+                validated.append(None)
+                self.item_errors.append({'code': ['Duplicate code in this request.']})
+                continue
+            seen.add(attrs['code'])
+            validated.append(attrs)
+            self.item_errors.append({})
+        return validated
+
+
+class RepriceSerializer(serializers.Serializer):
+    percent = serializers.FloatField(required=False, min_value=-100)
+    amount = serializers.FloatField(required=False)
+
+    def validate(self, attrs):
+        if len(attrs) != 1:
+            raise serializers.ValidationError('Give either a percent or an amount.')
+        return attrs
+
+
+class JobSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='job-detail')
+    result = serializers.SerializerMethodField()
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'url', 'task', 'status', 'progress', 'total', 'attempts', 'max_attempts',
+            'result', 'error', 'created_at', 'run_after', 'started_at', 'finished_at',
+        )
+
+    def get_result(self, job):
+        result = job.get_result()
+        if job.task == 'export' and result is not None:
+            # the exported file is downloaded from its own route
+            result['url'] = reverse('job-result', kwargs={'pk': job.pk}, request=self.context.get('request'))
+        return result
+
+    def get_error(self, job):
+        # the last line of the traceback, the whole one is for the logs
+        lines = job.error.strip().splitlines()
+        return lines[-1] if lines else None
+
+
+class UpsertSerializerMixin:
+    """
+    Accept an existing ``code``: bulk writes update the row that has it.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['code'].validators = [
+            validator for validator in fields['code'].validators
+            if not isinstance(validator, UniqueValidator)
+        ]
+        return fields
+
+
+class ProductBulkSerializer(UpsertSerializerMixin, ProductSerializer):
+    class Meta(ProductSerializer.Meta):
+        list_serializer_class = BulkListSerializer
+
+
+class ClientBulkSerializer(UpsertSerializerMixin, ClientSerializer):
+    class Meta(ClientSerializer.Meta):
+        list_serializer_class = BulkListSerializer
+
+
+class OrderBulkSerializer(UpsertSerializerMixin, OrderSerializer):
+    class Meta(OrderSerializer.Meta):
+        list_serializer_class = BulkListSerializer
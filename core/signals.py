@@ -0,0 +1,61 @@
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Product, Client, Order, OrderLine, Change, refresh_order_totals
+
+
+def snapshot_unit_prices(lines):
+    """
+    Copy the current product price to the ``lines`` that have no unit price
+    yet, with a single ``UPDATE``.
+    """
+    price = Product.objects.filter(pk=OuterRef('product_id')).values('price')
+    lines.filter(unit_price__isnull=True).update(unit_price=Subquery(price))
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def order_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # the orders of a product are unknown once its rows are cleared
+        instance._cleared_order_pks = list(instance.products.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        if action == 'post_add':
+            snapshot_unit_prices(OrderLine.objects.filter(order=instance))
+        Order.objects.filter(pk=instance.pk).refresh_totals()
+        instance.refresh_from_db(fields=['total'])
+    elif action == 'post_clear':
+        # left on the instance for the cache invalidation of api.signals
+        refresh_order_totals(instance._cleared_order_pks)
+    else:
+        if action == 'post_add':
+            snapshot_unit_prices(OrderLine.objects.filter(product=instance))
+        refresh_order_totals(pk_set)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    instance._deleted_order_pks = list(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # left on the instance for the cache invalidation of api.signals
+    refresh_order_totals(instance._deleted_order_pks)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Order)
+def object_saved(sender, instance, **kwargs):
+    Change.objects.record(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Order)
+def object_deleted(sender, instance, **kwargs):
+    Change.objects.record(sender, [instance.pk], Change.DELETE)
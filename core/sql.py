@@ -0,0 +1,25 @@
+from django.db import connections, router
+
+
+def insert_select(model, queryset, columns=None, values=None, using=None):
+    """
+    Insert the rows of ``queryset``, a ``values()`` one whose names are the
+    fields of ``model`` or are renamed to them by ``columns``, with one
+    ``INSERT ... SELECT`` so the rows never leave the database. ``values``
+    holds the constant values of the other fields.
+    """
+    using = using or router.db_for_write(model)
+    values = values or {}
+    connection = connections[using]
+    query = queryset.query
+    columns = columns or {}
+    names = [columns.get(name, name) for name in (*query.values_select, *query.annotation_select)]
+    sql, params = query.get_compiler(using).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute('INSERT INTO %s (%s) SELECT selected.*%s FROM (%s) selected' % (
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(model._meta.get_field(name).column)
+                      for name in [*names, *values]),
+            ''.join(', %s' for _ in values),
+            sql,
+        ), (*values.values(), *params))